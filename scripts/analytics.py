@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from scripts.models.models_api import ShowProgress
+
+MS_PER_DAY = 24 * 3600 * 1000
+
+# Shows need this many watched episodes before a pace, and so a finish date, is estimated
+MIN_EPISODES_FOR_PACE = 2
+
+@dataclass
+class ProgressArrays:
+    """
+    The progress of many shows flattened into columnar arrays: one entry per show, and one per episode
+    for the episode arrays, with episode_show holding the index of the episode's show.
+    Timestamps are milliseconds since the epoch, NaT where the API returned none.
+    """
+    trakt_ids: np.ndarray
+    aired: np.ndarray
+    completed: np.ndarray
+    last_watched_at: np.ndarray  # datetime64[ms]
+    next_season: np.ndarray  # -1 when there is no next episode
+    next_number: np.ndarray
+    episode_show: np.ndarray
+    episode_watched_at: np.ndarray  # datetime64[ms]
+
+def parse_timestamps(timestamps: List[Optional[str]]) -> np.ndarray:
+    """
+    Parses Trakt's ISO 8601 UTC timestamps (2015-03-21T19:03:58.000Z) in one call, NaT for missing ones.
+    """
+    # numpy parses the timestamps as UTC already, it only warns about the explicit Z
+    return np.array([timestamp.rstrip('Z') if timestamp else 'NaT' for timestamp in timestamps], dtype='datetime64[ms]')
+
+def flatten_progress(progress: Dict[int, ShowProgress]) -> ProgressArrays:
+    """
+    Flattens the progress of every show, keyed by Trakt id, into arrays in a single pass over the episodes.
+    """
+    shows = list(progress.values())
+    episode_counts = [sum(len(season.episodes) for season in show.seasons) for show in shows]
+
+    return ProgressArrays(
+        trakt_ids=np.fromiter(progress.keys(), dtype=np.int64, count=len(shows)),
+        aired=np.fromiter((show.aired for show in shows), dtype=np.int64, count=len(shows)),
+        completed=np.fromiter((show.completed for show in shows), dtype=np.int64, count=len(shows)),
+        last_watched_at=parse_timestamps([show.last_watched_at for show in shows]),
+        next_season=np.fromiter((show.next_episode.season if show.next_episode else -1 for show in shows), dtype=np.int64, count=len(shows)),
+        next_number=np.fromiter((show.next_episode.number if show.next_episode else -1 for show in shows), dtype=np.int64, count=len(shows)),
+        episode_show=np.repeat(np.arange(len(shows), dtype=np.int64), episode_counts),
+        episode_watched_at=parse_timestamps([
+            episode.last_watched_at if episode.completed else None
+            for show in shows for season in show.seasons for episode in season.episodes
+        ])
+    )
+
+def compute_progress_analytics(arrays: ProgressArrays, now: datetime) -> Dict[str, np.ndarray]:
+    """
+    Computes the progress columns of every show at once. Missing values are NaN (NaT for the finish date).
+
+    The finish date assumes the show keeps being watched at its pace so far: the watched episodes spread
+    over the days between the first and the last one watched (at least a day).
+    """
+    now_ms = np.datetime64(now.astimezone(timezone.utc).replace(tzinfo=None), 'ms')
+    show_count = len(arrays.trakt_ids)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        completion_ratio = np.where(arrays.aired > 0, arrays.completed / arrays.aired, np.nan)
+    remaining = np.maximum(arrays.aired - arrays.completed, 0)
+
+    last_watched = arrays.last_watched_at.astype(np.int64).astype(np.float64)
+    last_watched[np.isnat(arrays.last_watched_at)] = np.nan
+    days_since_last_watched = (now_ms.astype(np.int64) - last_watched) / MS_PER_DAY
+
+    # First and last watch of each show's episodes, reduced per show without looping over the episodes
+    watched = ~np.isnat(arrays.episode_watched_at)
+    episode_show = arrays.episode_show[watched]
+    episode_ms = arrays.episode_watched_at[watched].astype(np.int64)
+    first = np.full(show_count, np.iinfo(np.int64).max, dtype=np.int64)
+    last = np.full(show_count, np.iinfo(np.int64).min, dtype=np.int64)
+    np.minimum.at(first, episode_show, episode_ms)
+    np.maximum.at(last, episode_show, episode_ms)
+    watched_count = np.bincount(episode_show, minlength=show_count)
+
+    has_pace = (watched_count >= MIN_EPISODES_FOR_PACE) & (remaining > 0)
+    span_days = np.where(has_pace, np.maximum((last - first) / MS_PER_DAY, 1.0), 1.0)
+    episodes_per_day = watched_count / span_days
+    finish_in_ms = np.where(has_pace, remaining / np.where(has_pace, episodes_per_day, 1.0) * MS_PER_DAY, 0)
+    estimated_finish = np.where(has_pace, now_ms + finish_in_ms.astype('timedelta64[ms]'), np.datetime64('NaT', 'ms'))
+
+    return {
+        'completion_ratio': completion_ratio,
+        'episodes_remaining': remaining,
+        'days_since_last_watched': days_since_last_watched,
+        'estimated_finish_date': estimated_finish.astype('datetime64[D]')
+    }
+
+def get_progress_columns(progress: Dict[int, ShowProgress], now: Optional[datetime] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Returns the progress columns of the show rows (see ShowCSV) keyed by Trakt id, for the shows in progress.
+    """
+    if not progress:
+        return {}
+
+    arrays = flatten_progress(progress)
+    columns = compute_progress_analytics(arrays, now or datetime.now(timezone.utc))
+
+    completion_ratio = np.round(columns['completion_ratio'], 4).tolist()
+    days_since_last_watched = np.round(columns['days_since_last_watched'], 1).tolist()
+    estimated_finish = np.datetime_as_string(columns['estimated_finish_date']).tolist()
+    next_episodes = np.char.add(
+        np.char.add('S', np.char.zfill(arrays.next_season.astype(str), 2)),
+        np.char.add('E', np.char.zfill(arrays.next_number.astype(str), 2))
+    ).tolist()
+
+    return {
+        trakt_id: {
+            'completion_ratio': None if np.isnan(completion_ratio[index]) else completion_ratio[index],
+            'episodes_remaining': remaining,
+            'next_episode': next_episodes[index] if arrays.next_season[index] >= 0 else None,
+            'days_since_last_watched': None if np.isnan(days_since_last_watched[index]) else days_since_last_watched[index],
+            'estimated_finish_date': None if estimated_finish[index] == 'NaT' else estimated_finish[index]
+        }
+        for index, (trakt_id, remaining) in enumerate(zip(arrays.trakt_ids.tolist(), columns['episodes_remaining'].tolist()))
+    }
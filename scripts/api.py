@@ -1,27 +1,59 @@
-from dataclasses import fields
-from typing import List, Optional, Type, Union
-import requests
+from contextvars import ContextVar
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Mapping, Optional, Tuple, Type, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import hashlib
 import logging
 import os
+import re
+import sqlite3
+import threading
 import time
-from requests.exceptions import SSLError, Timeout, RequestException
 
-from scripts.models.models_api import ShowProgress, ShowDetails, Ratings, MovieProgress, WatchedMovie, WatchedShow, WatchlistMovie, WatchlistShow
-from scripts.urls import MOVIE_RATINGS_URL, WATCHED_PROGRESS_URL, SHOW_RATINGS_URL, WATCHED_MOVIES_URL, SHOW_DETAILS_URL, WATCHED_SHOWS_URL, WATCHLIST_MOVIES_URL, WATCHLIST_SHOWS_URL
+# requests is imported where it is used so importing this module stays cheap
+if TYPE_CHECKING:
+    import requests
 
-CLIENT_ID = os.getenv('TRAKT_CLIENT_ID')
-ACCESS_TOKEN = os.getenv('TRAKT_ACCESS_TOKEN')
+from scripts.cache import CacheLookup, ResponseCache
+from scripts.catalog import CatalogStore
+from scripts.coalescing import RequestCoalescer
+from scripts.decoding import decode_response
+from scripts.metrics import metrics
+from scripts.rate_limit import RateLimiter, retry_backoff
+from scripts.transport import SERVER_RETRIES, TIMEOUT, get_retry_reason, get_server_retry_backoff, get_session
+from scripts.models.parsers import get_decoder
+from scripts.models.models_api import HistoryItem, LastActivities, ShowProgress, ShowDetails, Ratings, MovieProgress, WatchedMovie, WatchedShow, WatchlistMovie, WatchlistShow
+from scripts.urls import LAST_ACTIVITIES_URL, MOVIE_RATINGS_URL, SYNC_HISTORY_URL, WATCHED_PROGRESS_URL, SHOW_RATINGS_URL, WATCHED_MOVIES_URL, SHOW_DETAILS_URL, WATCHED_SHOWS_URL, WATCHLIST_MOVIES_URL, WATCHLIST_SHOWS_URL
 
-if not CLIENT_ID or not ACCESS_TOKEN:
-    logging.critical("TRAKT_CLIENT_ID or TRAKT_ACCESS_TOKEN is missing from the environment variables.")
-    raise EnvironmentError("Missing Trakt API credentials.")
+class MissingCredentialsError(EnvironmentError):
+    pass
 
-headers = {
-    'Content-Type': 'application/json',
-    'Authorization': f'Bearer {ACCESS_TOKEN}',
-    'trakt-api-version': '2',
-    'trakt-api-key': CLIENT_ID
-}
+# Access token of the account being exported, set per account by the batch export (scripts/batch.py)
+account_access_token: ContextVar[Optional[str]] = ContextVar('account_access_token', default=None)
+
+def get_credentials() -> Tuple[str, str]:
+    """
+    Returns the Trakt client id and access token from the environment, read when a request is made
+    rather than at import time so the .env file can be loaded first. A batch export's account token
+    takes precedence over TRAKT_ACCESS_TOKEN.
+    """
+    client_id = os.getenv('TRAKT_CLIENT_ID')
+    access_token = account_access_token.get() or os.getenv('TRAKT_ACCESS_TOKEN')
+
+    if not client_id or not access_token:
+        logging.critical("TRAKT_CLIENT_ID or TRAKT_ACCESS_TOKEN is missing from the environment variables.")
+        raise MissingCredentialsError("Missing Trakt API credentials.")
+
+    return client_id, access_token
+
+def get_headers() -> Dict[str, str]:
+    client_id, access_token = get_credentials()
+    return {
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {access_token}',
+        'trakt-api-version': '2',
+        'trakt-api-key': client_id
+    }
 
 url_to_type_map = {
     WATCHED_SHOWS_URL: WatchedShow,
@@ -31,57 +63,359 @@ url_to_type_map = {
     SHOW_RATINGS_URL: Ratings,
     MOVIE_RATINGS_URL: Ratings,
     WATCHED_PROGRESS_URL: ShowProgress,
-    SHOW_DETAILS_URL: ShowDetails
+    SHOW_DETAILS_URL: ShowDetails,
+    LAST_ACTIVITIES_URL: LastActivities,
+    SYNC_HISTORY_URL: HistoryItem
+}
+
+# Endpoint class of each URL, used to pick how long a cached response stays fresh
+url_to_endpoint_class_map = {
+    WATCHED_SHOWS_URL: 'sync',
+    WATCHLIST_SHOWS_URL: 'sync',
+    WATCHED_MOVIES_URL: 'sync',
+    WATCHLIST_MOVIES_URL: 'sync',
+    SHOW_RATINGS_URL: 'ratings',
+    MOVIE_RATINGS_URL: 'ratings',
+    WATCHED_PROGRESS_URL: 'progress',
+    SHOW_DETAILS_URL: 'details',
+    LAST_ACTIVITIES_URL: 'activities',
+    SYNC_HISTORY_URL: 'history'
 }
 
+# Endpoint classes whose responses are the same for every account
+GLOBAL_ENDPOINT_CLASSES = {'ratings', 'details'}
+
+CACHE_ENABLED = os.getenv('TRAKT_CACHE', '1') != '0'
+CACHE_PATH = os.getenv('TRAKT_CACHE_PATH', '.trakt_cache.sqlite')
+CACHE_MAX_BYTES = int(os.getenv('TRAKT_CACHE_MAX_MB', 256)) * 1024 * 1024
+
+# Seconds a cached response is used without asking the API, per endpoint class
+CACHE_TTLS = {
+    'ratings': int(os.getenv('TRAKT_CACHE_TTL_RATINGS', 7 * 24 * 3600)),
+    'details': int(os.getenv('TRAKT_CACHE_TTL_DETAILS', 7 * 24 * 3600)),
+    'progress': int(os.getenv('TRAKT_CACHE_TTL_PROGRESS', 3600)),
+    'sync': int(os.getenv('TRAKT_CACHE_TTL_SYNC', 900)),
+    'activities': 0,  # Always revalidated, it is what decides whether anything else has changed
+    'history': 0
+}
+
+# Endpoint classes whose responses are never cached. A long history would fill the cache and evict the ratings
+# and progress it is there for, and the history export keeps its own progress (scripts/history.py)
+UNCACHED_ENDPOINT_CLASSES = {'history'}
+
 def get_return_type_for_url(url: str) -> Optional[Type]:
     """
     Returns the corresponding model type for the given Trakt API URL.
     """
     return url_to_type_map.get(url)
 
-def handle_rate_limit(response):
-    retry_after = int(response.headers.get('Retry-After', 10))
+def url_template_pattern(template: str) -> re.Pattern:
+    """
+    Compiles a URL template such as SHOW_RATINGS_URL into a regex matching any formatted URL.
+    """
+    parts = re.split(r'\{[^}]+\}', template)
+    # Extra query parameters (such as page and limit) are allowed after the template
+    return re.compile('[^/?]+'.join(re.escape(part) for part in parts) + r'([?&].*)?$')
+
+url_template_patterns = [(url_template_pattern(template), template) for template in url_to_type_map]
+
+def get_url_template(url: str) -> Optional[str]:
+    """
+    Returns the URL template a formatted Trakt API URL was built from.
+    """
+    for pattern, template in url_template_patterns:
+        if pattern.match(url):
+            return template
+    return None
+
+def get_endpoint_label(url: str) -> str:
+    """
+    Returns the endpoint template path of a formatted Trakt API URL for metrics, e.g. /shows/{id}/ratings.
+    """
+    template = get_url_template(url)
+    if template is None:
+        return 'other'
+    return urlsplit(template).path
+
+def get_endpoint_class(url: str) -> str:
+    """
+    Returns the endpoint class (ratings, progress, sync or details) of a formatted Trakt API URL.
+    """
+    return url_to_endpoint_class_map.get(get_url_template(url), 'other')
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Returns the shared on-disk response cache, opening it on first use. None when caching is disabled.
+    """
+    global _response_cache
+    if not CACHE_ENABLED:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(CACHE_PATH, CACHE_MAX_BYTES)
+        return _response_cache
+
+def get_account_key() -> str:
+    """
+    Returns a hash of the access token that identifies the account in the cache and the run journal without storing the token.
+    """
+    _, access_token = get_credentials()
+    return hashlib.sha256(access_token.encode('utf-8')).hexdigest()[:16]
+
+def get_cache_key(url: str, endpoint_class: str) -> str:
+    """
+    Builds the cache key for a request. Account specific endpoints are keyed by a hash of the access token.
+    """
+    if endpoint_class not in GLOBAL_ENDPOINT_CLASSES:
+        return f"{get_account_key()}:{url}"
+    return url
+
+def lookup_cache(url: str) -> CacheLookup:
+    """
+    Looks up the cached response for a Trakt API URL. A cache that cannot be read is skipped, the request
+    then goes to the API. Responses of UNCACHED_ENDPOINT_CLASSES are neither looked up nor stored.
+    """
+    endpoint_class = get_endpoint_class(url)
+    cache_key = get_cache_key(url, endpoint_class)
+    cache = cached = None
+    if endpoint_class in UNCACHED_ENDPOINT_CLASSES:
+        return CacheLookup(None, cache_key, endpoint_class, 0, None)
+    try:
+        cache = get_response_cache()
+        cached = cache.get(cache_key) if cache else None
+    except sqlite3.Error as e:
+        logging.warning(f"Could not read the cached response for GET {url}: {e}")
+    return CacheLookup(cache, cache_key, endpoint_class, CACHE_TTLS.get(endpoint_class, 0), cached)
+
+def expire_cached_response(url: str):
+    """
+    Forces the next request for url to be revalidated with the API even if its cached response is still fresh.
+    """
+    cache_key = get_cache_key(url, get_endpoint_class(url))
+    try:
+        cache = get_response_cache()
+        if cache:
+            cache.expire(cache_key)
+    except sqlite3.Error as e:
+        logging.warning(f"Could not expire the cached response for GET {url}: {e}")
+    get_request_coalescer().forget(cache_key)
+
+# Parsed responses kept in memory for the rest of a run, so repeated requests for the same URL are not sent again
+MEMO_MAX_ENTRIES = int(os.getenv('TRAKT_MEMO_MAX_ENTRIES', 2048))
+
+# Endpoint classes with small per-title responses, the only ones memoized. Sync lists and their pages can be
+# as large as the library, keeping them would undo the bounded memory of the iter_* generators
+MEMOIZED_ENDPOINT_CLASSES = {'ratings', 'progress', 'details'}
+
+_request_coalescer = RequestCoalescer(MEMO_MAX_ENTRIES)
+
+def get_request_coalescer() -> RequestCoalescer:
+    """
+    Returns the single-flight layer shared by every thread and the async client.
+    """
+    return _request_coalescer
+
+def is_memoized(endpoint_class: str) -> bool:
+    """
+    Only per-title responses are memoized. Lists, list pages and the endpoints that are always revalidated
+    (last activities, history pages) are only shared while in flight.
+    """
+    return endpoint_class in MEMOIZED_ENDPOINT_CLASSES and CACHE_TTLS.get(endpoint_class, 0) > 0
+
+CATALOG_ENABLED = os.getenv('TRAKT_CATALOG', '1') != '0'
+CATALOG_PATH = os.getenv('TRAKT_CATALOG_PATH', '.trakt_catalog.sqlite')
+
+# Catalog entries are refetched after the same TTL as cached responses of their endpoint class
+CATALOG_TTLS = {
+    'show_ratings': CACHE_TTLS['ratings'],
+    'movie_ratings': CACHE_TTLS['ratings'],
+    'show_details': CACHE_TTLS['details']
+}
+
+_catalog_store: Optional[CatalogStore] = None
+_catalog_store_lock = threading.Lock()
+
+def get_catalog_store() -> Optional[CatalogStore]:
+    """
+    Returns the catalog of global metadata shared by every account, opening it on first use. None when disabled.
+    """
+    global _catalog_store
+    if not CATALOG_ENABLED:
+        return None
+    with _catalog_store_lock:
+        if _catalog_store is None:
+            _catalog_store = CatalogStore(CATALOG_PATH)
+        return _catalog_store
+
+def lookup_catalog(url: str, kind: str, item_id: str, model_type: Type) -> Optional[Any]:
+    """
+    Returns the catalog entry for a title parsed into model_type if it is fresh, or None if it has to be fetched.
+    """
+    catalog = get_catalog_store()
+    if catalog is None:
+        return None
+
+    try:
+        data = catalog.get_fresh(kind, item_id, CATALOG_TTLS[kind])
+    except sqlite3.Error as e:
+        logging.warning(f"Could not read {kind} of {item_id} from the catalog: {e}")
+        return None
+
+    if data is None:
+        return None
+    logging.debug(f"Catalog hit for GET {url}")
+    metrics.record_cache_hit(get_endpoint_label(url))
+    return parse_dataclass(model_type, data)
+
+def store_catalog(kind: str, item_id: str, item: Optional[Any]):
+    """
+    Saves a title's freshly fetched metadata in the catalog for every other account and process.
+    """
+    catalog = get_catalog_store()
+    if catalog is None or item is None:
+        return
+
+    try:
+        catalog.put(kind, item_id, asdict(item))
+    except sqlite3.Error as e:
+        logging.warning(f"Could not store {kind} of {item_id} in the catalog: {e}")
+
+# Trakt allows 1000 GET calls per 5 minutes, the limiter is corrected from the X-Ratelimit header
+RATE_LIMIT_CALLS = int(os.getenv('TRAKT_RATE_LIMIT_CALLS', 1000))
+RATE_LIMIT_PERIOD = float(os.getenv('TRAKT_RATE_LIMIT_PERIOD', 300))
+RATE_LIMIT_HEADROOM = float(os.getenv('TRAKT_RATE_LIMIT_HEADROOM', 0.95))
+
+# The export never reads WatchedShow.seasons, so unless asked for they are not requested (extended=noseasons)
+WATCHED_SHOWS_SEASONS = os.getenv('TRAKT_WATCHED_SHOWS_SEASONS', '0') == '1'
+
+# Request the sync lists with extended=full, which inlines every title's rating and votes so the export
+# only needs a ratings request for titles without one
+INLINE_RATINGS = os.getenv('TRAKT_INLINE_RATINGS', '1') == '1'
+
+# Number of items requested per page by the iter_* list generators
+PAGE_LIMIT = int(os.getenv('TRAKT_PAGE_LIMIT', 250))
+
+# Number of times a rate limited request is retried before it is given up on
+MAX_RETRIES = int(os.getenv('TRAKT_MAX_RETRIES', 5))
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_CAP = 60.0
+
+# Shared between worker threads and the async client so every caller is paced by the same bucket
+rate_limiter = RateLimiter(RATE_LIMIT_CALLS, RATE_LIMIT_PERIOD, RATE_LIMIT_HEADROOM)
+
+def get_rate_limit_delay() -> float:
+    """
+    Reserves a request from the shared rate limiter and returns the seconds to wait before sending it.
+    """
+    return rate_limiter.reserve()
+
+def wait_for_rate_limit() -> float:
+    """
+    Blocks until the shared rate limiter allows another request and returns the seconds waited.
+    """
+    delay = get_rate_limit_delay()
+    if delay > 0:
+        time.sleep(delay)
+    return delay
+
+def register_rate_limit(response_headers) -> int:
+    """
+    Pauses every caller for the Retry-After period of a rate limited response and returns it in seconds.
+    """
+    retry_after = int(response_headers.get('Retry-After', 10))
     logging.warning(f"Rate limit reached. Retrying after {retry_after} seconds...")
-    time.sleep(retry_after)
+    rate_limiter.pause(retry_after)
+    return retry_after
+
+def get_retry_backoff(attempt: int) -> float:
+    """
+    Returns the extra jittered delay before retrying a rate limited request, so waiting callers do not retry in lockstep.
+    """
+    return retry_backoff(attempt, RETRY_BACKOFF_BASE, RETRY_BACKOFF_CAP)
+
+def handle_rate_limit(response):
+    register_rate_limit(response.headers)
+
+def get_with_retries(url: str, request_headers: dict) -> 'requests.Response':
+    """
+    Sends a GET request over the pooled session (scripts.transport), paced by the shared rate limiter.
+    Rate limited requests are retried with jittered backoff up to MAX_RETRIES times, server errors and
+    dropped connections up to SERVER_RETRIES times. Returns the last response, or raises the last error.
+    """
+    endpoint = get_endpoint_label(url)
+    session = get_session()
+    rate_limited = server_errors = 0
+    while True:
+        metrics.record_rate_limit_wait(endpoint, wait_for_rate_limit())
+        start = time.perf_counter()
+        try:
+            response = session.get(url, headers=request_headers, timeout=TIMEOUT)
+        except Exception as e:
+            reason = get_retry_reason('GET', error=e)
+            if reason is None or server_errors >= SERVER_RETRIES:
+                raise
+        else:
+            metrics.record_request(endpoint, response.status_code, time.perf_counter() - start, len(response.content))
+            rate_limiter.update(response.headers)
+
+            if response.status_code == 429:
+                handle_rate_limit(response)
+                if rate_limited >= MAX_RETRIES:
+                    return response
+                backoff = get_retry_backoff(rate_limited)
+                rate_limited += 1
+                metrics.record_rate_limit_wait(endpoint, backoff)
+                time.sleep(backoff)
+                metrics.record_retry(endpoint)
+                continue
+
+            reason = get_retry_reason('GET', response=response)
+            if reason is None or server_errors >= SERVER_RETRIES:
+                return response
+
+        backoff = get_server_retry_backoff(server_errors)
+        server_errors += 1
+        logging.warning(f"GET {url} failed ({reason}), retrying in {backoff:.1f} seconds...")
+        time.sleep(backoff)
+        metrics.record_retry(endpoint)
+
+def redact_headers(request_headers: Mapping[str, str]) -> Dict[str, str]:
+    """
+    Returns a copy of request headers that is safe to log, without the access token.
+    """
+    return {name: '<redacted>' if name.lower() == 'authorization' else value for name, value in request_headers.items()}
 
 def log_error(response):
-    status_code = response.status_code
+    log_error_status(response.status_code, response.text)
+    logging.debug(f"Request Headers: {redact_headers(response.request.headers)}")
+
+def log_error_status(status_code: int, text: str):
     if status_code == 400:
-        logging.error(f"Bad Request: {response.text}")
+        logging.error(f"Bad Request: {text}")
     elif status_code == 401:
-        logging.error(f"Unauthorized: Check your API credentials. {response.text}")
+        logging.error(f"Unauthorized: Check your API credentials. {text}")
     elif status_code == 404:
-        logging.error(f"Not Found: The requested resource could not be found. {response.text}")
+        logging.error(f"Not Found: The requested resource could not be found. {text}")
     elif status_code == 500:
-        logging.error(f"Server Error: There was an issue on the server. {response.text}")
+        logging.error(f"Server Error: There was an issue on the server. {text}")
     else:
-        logging.error(f"Unexpected Error: {status_code} - {response.text}")
-    logging.debug(f"Full Response: {response.text}")
-    logging.debug(f"Request Headers: {response.request.headers}")
+        logging.error(f"Unexpected Error: {status_code} - {text}")
+    logging.debug(f"Full Response: {text}")
 
 def parse_dataclass(model_type: Type, data: Union[dict, list]) -> any:
     """
-    Recursively parses a dictionary or list into the corresponding dataclass.
+    Parses a dictionary or list into the corresponding dataclass, including nested dataclasses,
+    List and Optional fields. Uses the compiled decoder cached for the model type.
     """
+    decoder = get_decoder(model_type)
+
     if isinstance(data, list):
-        return [parse_dataclass(model_type, item) for item in data]
-
-    if isinstance(data, dict):
-        # Parse each field in the dataclass
-        fieldtypes = {f.name: f.type for f in fields(model_type)}
-        parsed_data = {}
-        
-        for key, value in data.items():
-            if key in fieldtypes and is_dataclass_type(fieldtypes[key]):
-                # Recursively parse if it's another dataclass
-                parsed_data[key] = parse_dataclass(fieldtypes[key], value)
-            else:
-                parsed_data[key] = value
-
-        return model_type(**parsed_data)
+        return [decoder(item) for item in data]
 
-    return data
+    return decoder(data)
 
 def is_dataclass_type(tp: Type) -> bool:
     """
@@ -89,87 +423,239 @@ def is_dataclass_type(tp: Type) -> bool:
     """
     return hasattr(tp, '__dataclass_fields__')
 
+def is_request_exception(error: Exception) -> bool:
+    """
+    Checks whether an error was raised by requests (including SSL errors and timeouts), without importing it up front.
+    """
+    from requests.exceptions import RequestException
+    return isinstance(error, RequestException)
+
 def fetch_trakt_data(url: str, model_type: Type) -> Optional[Union[WatchedShow, ShowProgress, ShowDetails, Ratings, MovieProgress]]:
     """
     Fetches data from the Trakt API and parses it into the appropriate model type.
+    Responses are served from the on-disk cache while fresh and revalidated with a conditional GET once stale.
+    """
+    data, _ = fetch_trakt_data_with_headers(url, model_type)
+    return data
+
+def fetch_trakt_data_with_headers(url: str, model_type: Type) -> Tuple[Optional[Any], Mapping[str, str]]:
+    """
+    Same as fetch_trakt_data, but also returns the response headers (such as X-Pagination-*).
+    The headers are empty when the request failed.
+
+    Requests for the same URL and account share one fetch while it is in flight, per-title responses are
+    also memoized for the rest of the run, see is_memoized.
+    """
+    endpoint_class = get_endpoint_class(url)
+    (data, headers), saved = get_request_coalescer().fetch(
+        get_cache_key(url, endpoint_class),
+        lambda: request_trakt_data(url, model_type),
+        lambda result: result[0] is not None and is_memoized(endpoint_class)
+    )
+    if saved:
+        logging.debug(f"Coalesced GET {url}")
+        metrics.record_coalesced(get_endpoint_label(url))
+    return data, headers
+
+def request_trakt_data(url: str, model_type: Type) -> Tuple[Optional[Any], Mapping[str, str]]:
+    """
+    Fetches url from the response cache or the API, without coalescing it with other requests.
     """
     try:
+        lookup = lookup_cache(url)
+        body = lookup.fresh_body()
+        if body is not None:
+            logging.debug(f"Cache hit for GET {url}")
+            metrics.record_cache_hit(get_endpoint_label(url))
+            return decode_response(model_type, body), lookup.cached_headers()
+
         logging.debug(f"Fetching data from GET {url}")
-        logging.debug(f"Request Headers: {headers}")
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
+        response = get_with_retries(url, lookup.request_headers(get_headers()))
+
+        if response.status_code == 304:
+            body = lookup.not_modified_body()
+            if body is not None:
+                logging.debug(f"Cached response for GET {url} is still valid")
+                return decode_response(model_type, body), lookup.cached_headers()
 
-            # If the data is a list, parse each item in the list into the model type
-            if isinstance(data, list):
-                return parse_dataclass(model_type, data)
-            else:
-                return parse_dataclass(model_type, data)  # Parse single object
+        lookup.record_miss()
+
+        if response.status_code == 200:
+            data = decode_response(model_type, response.content)  # A list for list endpoints, a single object otherwise
+            lookup.store(response.text, response.headers)
+            return data, response.headers
 
         elif response.status_code == 429:
-            handle_rate_limit(response)
+            logging.error(f"Rate limit still exceeded for {url} after {MAX_RETRIES} retries.")
         else:
             log_error(response)
     
-    except (SSLError, Timeout, RequestException) as e:
-        logging.error(f"Error occurred while fetching data from {url}: {e}")
+    except MissingCredentialsError:
+        raise
     except TypeError as e:
         logging.error(f"Error parsing data into {model_type.__name__}: {e}")
     except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
+        if is_request_exception(e):
+            logging.error(f"Error occurred while fetching data from {url}: {e}")
+        else:
+            logging.error(f"An unexpected error occurred: {e}")
 
-    return None
+    return None, {}
+
+def with_query(url: str, **params) -> str:
+    """
+    Adds query parameters to a Trakt API URL, keeping any it already has.
+    """
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    query_params = parse_qsl(query, keep_blank_values=True)
+    query_params.extend((key, str(value)) for key, value in params.items())
+    return urlunsplit((scheme, netloc, path, urlencode(query_params, safe=','), fragment))
+
+def iter_trakt_pages(url: str, model_type: Type, limit: int = PAGE_LIMIT) -> Iterator[List[Any]]:
+    """
+    Fetches a list endpoint page by page using the page/limit parameters, yielding each page of parsed items
+    as soon as it arrives. Stops after the last page reported by X-Pagination-Page-Count. Endpoints that do not
+    paginate return everything in the first page without pagination headers.
+    """
+    for _, _, items in iter_numbered_pages(url, model_type, limit):
+        yield items
+
+def iter_numbered_pages(url: str, model_type: Type, limit: int = PAGE_LIMIT, first_page: int = 1) -> Iterator[Tuple[int, int, List[Any]]]:
+    """
+    Same as iter_trakt_pages, starting at first_page and yielding (page, page_count, items) tuples, so a caller
+    can tell a finished listing (page >= page_count) from one that stopped early on a failed request.
+    """
+    page = first_page
+    while True:
+        items, response_headers = fetch_trakt_data_with_headers(with_query(url, page=page, limit=limit), model_type)
+        if items is None:
+            logging.warning(f"Stopped paging {url} at page {page}, the remaining items are missing.")
+            return
+
+        page_count = int(response_headers.get('X-Pagination-Page-Count') or 0)
+        yield page, page_count, items
+
+        if page >= page_count:
+            return
+        page += 1
+
+def get_list_url(url: str, *extended: str) -> str:
+    """
+    Returns a sync list URL asking for the given extended levels, plus full when INLINE_RATINGS is set.
+    """
+    levels = (['full'] if INLINE_RATINGS else []) + list(extended)
+    if not levels:
+        return url
+    return with_query(url, extended=','.join(levels))
 
-def fetch_watched_shows() -> List[WatchedShow]:
-    watched_shows = fetch_trakt_data(WATCHED_SHOWS_URL, WatchedShow)
+def get_watched_shows_url(include_seasons: bool = WATCHED_SHOWS_SEASONS) -> str:
+    """
+    Returns the watched shows URL, asking Trakt to leave out the per-episode seasons unless include_seasons is set.
+    """
+    if include_seasons:
+        return get_list_url(WATCHED_SHOWS_URL)
+    return get_list_url(WATCHED_SHOWS_URL, 'noseasons')
+
+def fetch_watched_shows(include_seasons: bool = WATCHED_SHOWS_SEASONS) -> List[WatchedShow]:
+    watched_shows = fetch_trakt_data(get_watched_shows_url(include_seasons), WatchedShow)
     if watched_shows is None:
         return []
     else:
         return watched_shows
 
 def fetch_watchlist_shows() -> List[WatchlistShow]:
-    watchlist_shows = fetch_trakt_data(WATCHLIST_SHOWS_URL, WatchlistShow)
+    watchlist_shows = fetch_trakt_data(get_list_url(WATCHLIST_SHOWS_URL), WatchlistShow)
     if watchlist_shows is None:
         return []
     else:
         return watchlist_shows
 
 def fetch_watched_movies() -> List[WatchedMovie]:
-    watched_movies = fetch_trakt_data(WATCHED_MOVIES_URL, WatchedMovie)
+    watched_movies = fetch_trakt_data(get_list_url(WATCHED_MOVIES_URL), WatchedMovie)
     if watched_movies is None:
         return []
     else:
         return watched_movies
 
 def fetch_watchlist_movies() -> List[WatchlistMovie]:
-    watchlist_movies = fetch_trakt_data(WATCHLIST_MOVIES_URL, WatchlistMovie)
+    watchlist_movies = fetch_trakt_data(get_list_url(WATCHLIST_MOVIES_URL), WatchlistMovie)
     if watchlist_movies is None:
         return []
     else:
         return watchlist_movies
 
+def fetch_last_activities() -> Optional[LastActivities]:
+    """
+    Fetches the timestamps of the user's latest activity per category, used to find what changed since the last export.
+    """
+    return fetch_trakt_data(LAST_ACTIVITIES_URL, LastActivities)
+
 def fetch_show_progress(show_id: str) -> Optional[ShowProgress]:
     """
     Fetches the completed progress of a show using the Trakt API and parses it into the ShowProgress object.
     """
     return fetch_trakt_data(WATCHED_PROGRESS_URL.format(id=show_id), ShowProgress)
 
+def fetch_catalog_item(url: str, kind: str, item_id: str, model_type: Type) -> Optional[Any]:
+    """
+    Fetches global metadata of a title, reading the shared catalog before the API and saving what was fetched to it.
+    """
+    item = lookup_catalog(url, kind, item_id, model_type)
+    if item is None:
+        item = fetch_trakt_data(url, model_type)
+        store_catalog(kind, item_id, item)
+    return item
+
 def fetch_show_details(show_id: str) -> Optional[ShowDetails]:
     """
     Fetches the details of a show using the Trakt API and parses it into the ShowDetails object.
     """
-    return fetch_trakt_data(SHOW_DETAILS_URL.format(id=show_id), ShowDetails)
+    return fetch_catalog_item(SHOW_DETAILS_URL.format(id=show_id), 'show_details', show_id, ShowDetails)
 
 def fetch_show_ratings(show_id: str) -> Optional[Ratings]:
     """
     Fetches the ratings of a show using the Trakt API and parses it into the Ratings object.
     """
-    return fetch_trakt_data(SHOW_RATINGS_URL.format(id=show_id), Ratings)
+    return fetch_catalog_item(SHOW_RATINGS_URL.format(id=show_id), 'show_ratings', show_id, Ratings)
 
 def fetch_movie_ratings(movie_id: str) -> Optional[Ratings]:
     """
     Fetches the ratings of a movie using the Trakt API and parses it into the Ratings object.
     """
-    return fetch_trakt_data(MOVIE_RATINGS_URL.format(movie_id=movie_id), Ratings)
+    return fetch_catalog_item(MOVIE_RATINGS_URL.format(movie_id=movie_id), 'movie_ratings', movie_id, Ratings)
+
+def iter_watched_shows(limit: int = PAGE_LIMIT, include_seasons: bool = WATCHED_SHOWS_SEASONS) -> Iterator[WatchedShow]:
+    """
+    Yields the user's watched shows page by page, see iter_trakt_pages.
+    """
+    for page in iter_trakt_pages(get_watched_shows_url(include_seasons), WatchedShow, limit):
+        yield from page
+
+def iter_watchlist_shows(limit: int = PAGE_LIMIT) -> Iterator[WatchlistShow]:
+    """
+    Yields the user's watchlist shows page by page, see iter_trakt_pages.
+    """
+    for page in iter_trakt_pages(get_list_url(WATCHLIST_SHOWS_URL), WatchlistShow, limit):
+        yield from page
+
+def iter_watched_movies(limit: int = PAGE_LIMIT) -> Iterator[WatchedMovie]:
+    """
+    Yields the user's watched movies page by page, see iter_trakt_pages.
+    """
+    for page in iter_trakt_pages(get_list_url(WATCHED_MOVIES_URL), WatchedMovie, limit):
+        yield from page
+
+def iter_watchlist_movies(limit: int = PAGE_LIMIT) -> Iterator[WatchlistMovie]:
+    """
+    Yields the user's watchlist movies page by page, see iter_trakt_pages.
+    """
+    for page in iter_trakt_pages(get_list_url(WATCHLIST_MOVIES_URL), WatchlistMovie, limit):
+        yield from page
+
+def iter_history_pages(end_at: Optional[str] = None, first_page: int = 1, limit: int = PAGE_LIMIT) -> Iterator[Tuple[int, int, List[HistoryItem]]]:
+    """
+    Yields the user's episode and movie plays from /sync/history page by page, newest first, as (page, page_count, items).
+    Fixing end_at keeps the pages stable while new plays are scrobbled, so a listing can be resumed at first_page.
+    """
+    url = with_query(SYNC_HISTORY_URL, end_at=end_at) if end_at else SYNC_HISTORY_URL
+    yield from iter_numbered_pages(url, HistoryItem, limit, first_page)
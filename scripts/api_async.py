@@ -0,0 +1,301 @@
+from typing import Any, AsyncIterator, List, Mapping, Optional, Tuple, Type, Union
+import aiohttp
+import asyncio
+import logging
+import os
+import time
+
+from scripts.api import MAX_RETRIES, PAGE_LIMIT, MissingCredentialsError, WATCHED_SHOWS_SEASONS, get_cache_key, get_endpoint_class, get_endpoint_label, get_list_url, get_request_coalescer, is_memoized, get_watched_shows_url, lookup_catalog, store_catalog, get_rate_limit_delay, get_headers, get_retry_backoff, log_error_status, lookup_cache, rate_limiter, register_rate_limit, with_query
+from scripts.decoding import decode_response
+from scripts.metrics import metrics
+from scripts.transport import CONNECT_TIMEOUT, READ_TIMEOUT, RETRY_STATUSES, SERVER_RETRIES, get_server_retry_backoff
+from scripts.models.models_api import HistoryItem, LastActivities, ShowProgress, ShowDetails, Ratings, MovieProgress, WatchedMovie, WatchedShow, WatchlistMovie, WatchlistShow
+from scripts.urls import LAST_ACTIVITIES_URL, MOVIE_RATINGS_URL, SYNC_HISTORY_URL, WATCHED_PROGRESS_URL, SHOW_RATINGS_URL, WATCHED_MOVIES_URL, SHOW_DETAILS_URL, WATCHLIST_MOVIES_URL, WATCHLIST_SHOWS_URL
+
+# Maximum number of requests in flight at once on the event loop
+MAX_CONCURRENCY = int(os.getenv('TRAKT_MAX_CONCURRENCY', 32))
+
+# The session and semaphore belong to the event loop they were created on, see get_session
+_session: Optional[aiohttp.ClientSession] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Returns the shared client session for the running event loop, creating it on first use.
+    """
+    global _session, _semaphore
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+        _session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT))
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _session
+
+async def close_session():
+    """
+    Closes the shared client session. Call once the pipeline has finished with the event loop.
+    """
+    global _session, _semaphore
+    if _session is not None:
+        await _session.close()
+    _session = None
+    _semaphore = None
+
+async def wait_for_rate_limit() -> float:
+    """
+    Waits, without blocking the event loop, until the shared rate limiter allows another request.
+    Returns the seconds waited.
+    """
+    delay = get_rate_limit_delay()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return delay
+
+async def get_with_retries(url: str, request_headers: dict) -> Tuple[int, Mapping[str, str], str]:
+    """
+    Async version of scripts.api.get_with_retries, returning the status code, headers and body of the last response.
+    """
+    session = get_session()
+    endpoint = get_endpoint_label(url)
+    rate_limited = server_errors = 0
+    while True:
+        try:
+            async with _semaphore:
+                metrics.record_rate_limit_wait(endpoint, await wait_for_rate_limit())
+                start = time.perf_counter()
+                async with session.get(url, headers=request_headers) as response:
+                    status_code = response.status
+                    response_headers = response.headers
+                    body = await response.read()
+                    text = body.decode(response.get_encoding())
+                metrics.record_request(endpoint, status_code, time.perf_counter() - start, len(body))
+        except aiohttp.ClientSSLError:
+            raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            # Refused and reset connections, and timeouts, are retried like scripts.transport does
+            if server_errors >= SERVER_RETRIES:
+                raise
+            reason = type(e).__name__
+        else:
+            rate_limiter.update(response_headers)
+
+            if status_code == 429:
+                register_rate_limit(response_headers)
+                if rate_limited >= MAX_RETRIES:
+                    return status_code, response_headers, text
+                backoff = get_retry_backoff(rate_limited)
+                rate_limited += 1
+                metrics.record_rate_limit_wait(endpoint, backoff)
+                await asyncio.sleep(backoff)
+                metrics.record_retry(endpoint)
+                continue
+
+            if status_code not in RETRY_STATUSES or server_errors >= SERVER_RETRIES:
+                return status_code, response_headers, text
+            reason = f"HTTP {status_code}"
+
+        backoff = get_server_retry_backoff(server_errors)
+        server_errors += 1
+        logging.warning(f"GET {url} failed ({reason}), retrying in {backoff:.1f} seconds...")
+        await asyncio.sleep(backoff)
+        metrics.record_retry(endpoint)
+
+async def fetch_trakt_data(url: str, model_type: Type) -> Optional[Union[WatchedShow, ShowProgress, ShowDetails, Ratings, MovieProgress]]:
+    """
+    Fetches data from the Trakt API and parses it into the appropriate model type.
+    Shares the response cache, rate limit pauses and memoized results with the synchronous client in scripts.api.
+    """
+    data, _ = await fetch_trakt_data_with_headers(url, model_type)
+    return data
+
+async def fetch_trakt_data_with_headers(url: str, model_type: Type) -> Tuple[Optional[Any], Mapping[str, str]]:
+    """
+    Async version of scripts.api.fetch_trakt_data_with_headers, also returning the response headers.
+    """
+    endpoint_class = get_endpoint_class(url)
+    (data, headers), saved = await get_request_coalescer().fetch_async(
+        get_cache_key(url, endpoint_class),
+        lambda: request_trakt_data(url, model_type),
+        lambda result: result[0] is not None and is_memoized(endpoint_class)
+    )
+    if saved:
+        logging.debug(f"Coalesced GET {url}")
+        metrics.record_coalesced(get_endpoint_label(url))
+    return data, headers
+
+async def request_trakt_data(url: str, model_type: Type) -> Tuple[Optional[Any], Mapping[str, str]]:
+    """
+    Fetches url from the response cache or the API, without coalescing it with other requests. The response
+    cache (SQLite) and the decoders block, so they run on worker threads and leave the event loop to the requests.
+    """
+    try:
+        lookup = await asyncio.to_thread(lookup_cache, url)
+        body = lookup.fresh_body()
+        if body is not None:
+            logging.debug(f"Cache hit for GET {url}")
+            metrics.record_cache_hit(get_endpoint_label(url))
+            return await asyncio.to_thread(decode_response, model_type, body), lookup.cached_headers()
+
+        logging.debug(f"Fetching data from GET {url}")
+        status_code, response_headers, text = await get_with_retries(url, lookup.request_headers(get_headers()))
+
+        if status_code == 304:
+            body = await asyncio.to_thread(lookup.not_modified_body)
+            if body is not None:
+                logging.debug(f"Cached response for GET {url} is still valid")
+                return await asyncio.to_thread(decode_response, model_type, body), lookup.cached_headers()
+
+        lookup.record_miss()
+
+        if status_code == 200:
+            data = await asyncio.to_thread(decode_response, model_type, text)
+            await asyncio.to_thread(lookup.store, text, response_headers)
+            return data, response_headers
+
+        elif status_code == 429:
+            logging.error(f"Rate limit still exceeded for {url} after {MAX_RETRIES} retries.")
+        else:
+            log_error_status(status_code, text)
+
+    except MissingCredentialsError:
+        raise
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.error(f"Error occurred while fetching data from {url}: {e}")
+    except TypeError as e:
+        logging.error(f"Error parsing data into {model_type.__name__}: {e}")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {e}")
+
+    return None, {}
+
+async def iter_trakt_pages(url: str, model_type: Type, limit: int = PAGE_LIMIT) -> AsyncIterator[List[Any]]:
+    """
+    Async version of scripts.api.iter_trakt_pages, yielding each page of parsed items as soon as it arrives.
+    """
+    async for _, _, items in iter_numbered_pages(url, model_type, limit):
+        yield items
+
+async def iter_numbered_pages(url: str, model_type: Type, limit: int = PAGE_LIMIT, first_page: int = 1) -> AsyncIterator[Tuple[int, int, List[Any]]]:
+    """
+    Async version of scripts.api.iter_numbered_pages, yielding (page, page_count, items) tuples.
+    """
+    page = first_page
+    while True:
+        items, response_headers = await fetch_trakt_data_with_headers(with_query(url, page=page, limit=limit), model_type)
+        if items is None:
+            logging.warning(f"Stopped paging {url} at page {page}, the remaining items are missing.")
+            return
+
+        page_count = int(response_headers.get('X-Pagination-Page-Count') or 0)
+        yield page, page_count, items
+
+        if page >= page_count:
+            return
+        page += 1
+
+async def fetch_watched_shows(include_seasons: bool = WATCHED_SHOWS_SEASONS) -> List[WatchedShow]:
+    watched_shows = await fetch_trakt_data(get_watched_shows_url(include_seasons), WatchedShow)
+    if watched_shows is None:
+        return []
+    else:
+        return watched_shows
+
+async def fetch_watchlist_shows() -> List[WatchlistShow]:
+    watchlist_shows = await fetch_trakt_data(get_list_url(WATCHLIST_SHOWS_URL), WatchlistShow)
+    if watchlist_shows is None:
+        return []
+    else:
+        return watchlist_shows
+
+async def fetch_watched_movies() -> List[WatchedMovie]:
+    watched_movies = await fetch_trakt_data(get_list_url(WATCHED_MOVIES_URL), WatchedMovie)
+    if watched_movies is None:
+        return []
+    else:
+        return watched_movies
+
+async def fetch_watchlist_movies() -> List[WatchlistMovie]:
+    watchlist_movies = await fetch_trakt_data(get_list_url(WATCHLIST_MOVIES_URL), WatchlistMovie)
+    if watchlist_movies is None:
+        return []
+    else:
+        return watchlist_movies
+
+async def fetch_last_activities() -> Optional[LastActivities]:
+    """
+    Fetches the timestamps of the user's latest activity per category, used to find what changed since the last export.
+    """
+    return await fetch_trakt_data(LAST_ACTIVITIES_URL, LastActivities)
+
+async def fetch_show_progress(show_id: str) -> Optional[ShowProgress]:
+    """
+    Fetches the completed progress of a show using the Trakt API and parses it into the ShowProgress object.
+    """
+    return await fetch_trakt_data(WATCHED_PROGRESS_URL.format(id=show_id), ShowProgress)
+
+async def fetch_catalog_item(url: str, kind: str, item_id: str, model_type: Type) -> Optional[Any]:
+    """
+    Async version of scripts.api.fetch_catalog_item, reading the shared catalog before the API.
+    """
+    item = await asyncio.to_thread(lookup_catalog, url, kind, item_id, model_type)
+    if item is None:
+        item = await fetch_trakt_data(url, model_type)
+        await asyncio.to_thread(store_catalog, kind, item_id, item)
+    return item
+
+async def fetch_show_details(show_id: str) -> Optional[ShowDetails]:
+    """
+    Fetches the details of a show using the Trakt API and parses it into the ShowDetails object.
+    """
+    return await fetch_catalog_item(SHOW_DETAILS_URL.format(id=show_id), 'show_details', show_id, ShowDetails)
+
+async def fetch_show_ratings(show_id: str) -> Optional[Ratings]:
+    """
+    Fetches the ratings of a show using the Trakt API and parses it into the Ratings object.
+    """
+    return await fetch_catalog_item(SHOW_RATINGS_URL.format(id=show_id), 'show_ratings', show_id, Ratings)
+
+async def fetch_movie_ratings(movie_id: str) -> Optional[Ratings]:
+    """
+    Fetches the ratings of a movie using the Trakt API and parses it into the Ratings object.
+    """
+    return await fetch_catalog_item(MOVIE_RATINGS_URL.format(movie_id=movie_id), 'movie_ratings', movie_id, Ratings)
+
+async def iter_watched_shows(limit: int = PAGE_LIMIT, include_seasons: bool = WATCHED_SHOWS_SEASONS) -> AsyncIterator[WatchedShow]:
+    """
+    Yields the user's watched shows page by page, see iter_trakt_pages.
+    """
+    async for page in iter_trakt_pages(get_watched_shows_url(include_seasons), WatchedShow, limit):
+        for item in page:
+            yield item
+
+async def iter_watchlist_shows(limit: int = PAGE_LIMIT) -> AsyncIterator[WatchlistShow]:
+    """
+    Yields the user's watchlist shows page by page, see iter_trakt_pages.
+    """
+    async for page in iter_trakt_pages(get_list_url(WATCHLIST_SHOWS_URL), WatchlistShow, limit):
+        for item in page:
+            yield item
+
+async def iter_watched_movies(limit: int = PAGE_LIMIT) -> AsyncIterator[WatchedMovie]:
+    """
+    Yields the user's watched movies page by page, see iter_trakt_pages.
+    """
+    async for page in iter_trakt_pages(get_list_url(WATCHED_MOVIES_URL), WatchedMovie, limit):
+        for item in page:
+            yield item
+
+async def iter_watchlist_movies(limit: int = PAGE_LIMIT) -> AsyncIterator[WatchlistMovie]:
+    """
+    Yields the user's watchlist movies page by page, see iter_trakt_pages.
+    """
+    async for page in iter_trakt_pages(get_list_url(WATCHLIST_MOVIES_URL), WatchlistMovie, limit):
+        for item in page:
+            yield item
+
+async def iter_history_pages(end_at: Optional[str] = None, first_page: int = 1, limit: int = PAGE_LIMIT) -> AsyncIterator[Tuple[int, int, List[HistoryItem]]]:
+    """
+    Async version of scripts.api.iter_history_pages, yielding the user's plays newest first as (page, page_count, items).
+    """
+    url = with_query(SYNC_HISTORY_URL, end_at=end_at) if end_at else SYNC_HISTORY_URL
+    async for page in iter_numbered_pages(url, HistoryItem, limit, first_page):
+        yield page
@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+import contextvars
+import json
+import logging
+import os
+import time
+
+from scripts.trakt import export_movies, export_shows, output_dir, report_run
+from scripts.api import account_access_token, fetch_last_activities
+
+# Number of accounts exported at the same time. They share the rate limiter, the response cache and the catalog,
+# so running more at once does not send more requests than the rate limit allows
+BATCH_CONCURRENCY = int(os.getenv('TRAKT_BATCH_CONCURRENCY', 4))
+
+class AccountError(Exception):
+    pass
+
+@dataclass
+class Account:
+    name: str
+    access_token: str
+    output_dir: str
+
+@dataclass
+class AccountResult:
+    name: str
+    succeeded: bool
+    seconds: float
+    error: Optional[str] = None
+
+def load_accounts(path: str) -> List[Account]:
+    """
+    Loads the accounts to export from a JSON file holding a list of accounts, e.g.
+
+        [{"name": "alice", "access_token_env": "ALICE_TRAKT_TOKEN", "output_dir": "exports/alice"},
+         {"name": "bob", "access_token": "...", "output_dir": "exports/bob"}]
+
+    The token is given directly or as the name of an environment variable (which can live in the .env file).
+    output_dir defaults to the account name. Raises ValueError when the file is not a valid account list.
+    """
+    with open(path, encoding='utf-8') as accounts_file:
+        entries = json.load(accounts_file)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path} should contain a list of accounts")
+
+    accounts: List[Account] = []
+    for position, entry in enumerate(entries, start=1):
+        name = entry.get('name') if isinstance(entry, dict) else None
+        if not name:
+            raise ValueError(f"Account {position} in {path} has no name")
+
+        access_token = entry.get('access_token')
+        if not access_token and entry.get('access_token_env'):
+            access_token = os.getenv(entry['access_token_env'])
+        if not access_token:
+            raise ValueError(f"Account {name} in {path} has no access_token, or its access_token_env is not set")
+
+        accounts.append(Account(name, access_token, entry.get('output_dir') or name))
+
+    for attribute in ('name', 'output_dir'):
+        values = [os.path.normpath(getattr(account, attribute)) for account in accounts]
+        if len(set(values)) != len(values):
+            raise ValueError(f"Every account in {path} needs its own {attribute}")
+
+    return accounts
+
+def export_account(account: Account, shows: bool = True, movies: bool = True) -> AccountResult:
+    """
+    Exports one account's CSVs into its output directory. Any failure is logged and returned instead of raised,
+    so it does not affect the other accounts. Has to run in its own context, see run_batch.
+    """
+    account_access_token.set(account.access_token)
+    output_dir.set(account.output_dir)
+
+    start = time.perf_counter()
+    try:
+        os.makedirs(account.output_dir, exist_ok=True)
+
+        # A revoked or mistyped token would otherwise produce empty CSVs, check it before writing anything
+        if fetch_last_activities() is None:
+            raise AccountError("could not fetch the account's last activities, check its access token")
+
+        if shows:
+            export_shows()
+        if movies:
+            export_movies()
+
+    except Exception as e:
+        logging.error(f"Export of account {account.name} failed: {e}")
+        return AccountResult(account.name, False, time.perf_counter() - start, str(e))
+
+    logging.info(f"Exported account {account.name} to {account.output_dir}")
+    return AccountResult(account.name, True, time.perf_counter() - start)
+
+def run_batch(accounts: List[Account], shows: bool = True, movies: bool = True, concurrency: int = BATCH_CONCURRENCY) -> List[AccountResult]:
+    """
+    Exports several accounts concurrently in one process. Every request of every account goes through the same
+    rate limiter, and ratings fetched for one account are served to the others from the shared catalog.
+    """
+    if not accounts:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(accounts)))) as executor:
+        # Each account runs in a fresh copy of the context, so setting its token and output directory
+        # does not leak into the other accounts sharing the worker threads
+        futures = [executor.submit(contextvars.copy_context().run, export_account, account, shows, movies) for account in accounts]
+        results = [future.result() for future in futures]
+
+    report_run()
+    for result in results:
+        status = 'exported' if result.succeeded else f"failed ({result.error})"
+        logging.info(f"Account {result.name}: {status} in {result.seconds:.1f}s")
+    return results
@@ -0,0 +1,61 @@
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Tuple, Type
+import argparse
+import json
+
+from scripts.benchmarks.library import SyntheticLibrary
+from scripts.benchmarks.parse_dataclass import best_of, make_watched_shows
+from scripts.decoding import BACKENDS, DecodeBackend
+from scripts.models.models_api import HistoryItem, WatchedShow
+
+def make_fixtures(shows: int) -> List[Tuple[str, Type, bytes]]:
+    """
+    Response bodies of a few megabytes each: watched shows with and without their seasons, and history pages.
+    """
+    with_seasons = make_watched_shows(show_count=shows, season_count=8, episode_count=20)
+    without_seasons = [{key: value for key, value in item.items() if key != 'seasons'} for item in make_watched_shows(show_count=shows * 10, season_count=0, episode_count=0)]
+    library = SyntheticLibrary(shows, 0)
+    history = [library.history_item(index) for index in range(shows * 10)]
+    return [
+        ('watched shows', WatchedShow, json.dumps(with_seasons).encode()),
+        ('watched shows, noseasons', WatchedShow, json.dumps(without_seasons).encode()),
+        ('history', HistoryItem, json.dumps(history).encode())
+    ]
+
+def load_backends() -> Dict[str, DecodeBackend]:
+    backends = {}
+    for name, backend_type in BACKENDS.items():
+        try:
+            backends[name] = backend_type()
+        except ImportError:
+            print(f"{name}: not installed, skipped")
+    return backends
+
+def check_same_result(backends: Dict[str, DecodeBackend], model_type: Type, body: bytes):
+    """
+    Every backend has to decode the body into the same objects as the stdlib json one.
+    """
+    expected = [asdict(item) for item in DecodeBackend().decode(model_type, body)]
+    for name, backend in backends.items():
+        assert [asdict(item) for item in backend.decode(model_type, body)] == expected, f"{name} decoded {model_type.__name__} differently"
+
+def run(shows: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    backends = load_backends()
+    results = {}
+    for label, model_type, body in make_fixtures(shows):
+        check_same_result(backends, model_type, body)
+        decode: Callable[[DecodeBackend], Callable[[], Any]] = lambda backend: lambda: backend.decode(model_type, body)
+        timings = {name: best_of(repeat, decode(backend)) for name, backend in backends.items()}
+        results[label] = timings
+
+        print(f"{label}: {len(body) / 1024 / 1024:.1f} MB")
+        for name, elapsed in timings.items():
+            print(f"  {name:8} {elapsed * 1000:8.1f} ms  {len(body) / 1024 / 1024 / elapsed:6.1f} MB/s  ({timings['json'] / elapsed:.1f}x json)")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the decode backends of the API responses (see scripts/decoding.py).")
+    parser.add_argument('--shows', type=int, default=2000, help="Shows in the watched shows fixture, the other fixtures scale with it")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.shows, args.repeat)
@@ -0,0 +1,160 @@
+from typing import Any, Dict
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from scripts.benchmarks.stub_server import STATS_PATH
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+OUTPUT_FILES = ['watchlist_shows.csv', 'watched_shows.csv', 'watched_movies.csv', 'watchlist_movies.csv']
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def count_rows(filename: str) -> int:
+    if not os.path.exists(filename):
+        return 0
+    with open(filename, newline='', encoding='utf-8') as csv_file:
+        return max(0, sum(1 for _ in csv.reader(csv_file)) - 1)
+
+def run_pipeline(use_async: bool, log_level: str) -> Dict[str, Any]:
+    """
+    Runs the full export in the current directory against the stub server in TRAKT_API_URL.
+    The environment has to be set up before the export modules are imported, see run_size.
+    """
+    logging.basicConfig(filename='trakt_api.log', level=getattr(logging, log_level), format='%(asctime)s %(levelname)s:%(message)s')
+
+    start = time.perf_counter()
+    if use_async:
+        from scripts.trakt_async import main
+        asyncio.run(main())
+    else:
+        from scripts.trakt import run_export
+        run_export()
+    wall = time.perf_counter() - start
+
+    # Stage timings and request latencies as recorded by the export itself
+    from scripts.metrics import metrics
+    summary = metrics.summary()
+
+    with urllib.request.urlopen(os.environ['TRAKT_API_URL'] + STATS_PATH) as response:
+        server_stats = json.load(response)
+
+    return {
+        'wall_s': round(wall, 3),
+        'requests': server_stats['requests'],
+        'requests_per_s': round(server_stats['requests'] / wall, 1) if wall else None,
+        'rate_limited': server_stats['rate_limited'],
+        'connections': server_stats['connections'],  # Fewer than requests when connections are kept alive
+        'status_counts': server_stats['status_counts'],
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'stages_s': summary['stages'],
+        'endpoints': {
+            endpoint: dict(
+                {key: endpoint_summary[key] for key in ('requests', 'retries', 'rate_limited_seconds', 'bytes_received', 'coalesced')},
+                mean_latency_s=endpoint_summary['latency_seconds']['mean']
+            )
+            for endpoint, endpoint_summary in summary['endpoints'].items()
+        },
+        'rows': {filename: count_rows(filename) for filename in OUTPUT_FILES}
+    }
+
+def run_size(size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Serves a library of size shows and size movies from a stub server process and runs the export against it
+    in a fresh interpreter, so the peak memory is the pipeline's own and the server does not share its GIL.
+    """
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'scripts.benchmarks.stub_server', '--shows', str(size), '--movies', str(size),
+         '--latency-ms', str(args.latency_ms), '--rate-limit-every', str(args.rate_limit_every), '--retry-after', str(args.retry_after),
+         '--error-every', str(args.error_every)],
+        stdout=subprocess.PIPE, text=True
+    )
+    try:
+        server_url = server.stdout.readline().strip()
+        env = dict(
+            os.environ,
+            TRAKT_API_URL=server_url,
+            TRAKT_CLIENT_ID='benchmark',
+            TRAKT_ACCESS_TOKEN='benchmark',
+            TRAKT_CACHE='0',  # Every run starts cold
+            TRAKT_RATE_LIMIT_CALLS=str(args.client_rate_limit),
+            PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')]))
+        )
+        if args.workers:
+            env['TRAKT_MAX_WORKERS'] = str(args.workers)
+
+        with tempfile.TemporaryDirectory() as directory:
+            command = [sys.executable, '-m', 'scripts.benchmarks.export_pipeline', '--run', '--log-level', args.log_level]
+            if args.use_async:
+                command.append('--async')
+            result = subprocess.run(command, cwd=directory, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Benchmark run for {size} titles failed:\n{result.stderr}")
+        return {'size': size, **json.loads(result.stdout.splitlines()[-1])}
+    finally:
+        server.terminate()
+        server.wait()
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Benchmark the full export against a local stub Trakt server.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000], help='shows and movies in each synthetic library (100 to 50000)')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='delay added to every stub response')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='answer every Nth request with 429, 0 never does')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with a 429')
+    parser.add_argument('--error-every', type=int, default=0, help='answer every Nth request with 503, 0 never does')
+    parser.add_argument('--client-rate-limit', type=int, default=1_000_000, help='TRAKT_RATE_LIMIT_CALLS for the export, high so only the stub limits it')
+    parser.add_argument('--workers', type=int, default=0, help='TRAKT_MAX_WORKERS for the export, 0 keeps the default')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='benchmark the asyncio pipeline')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], help='log level of the export, the CLI logs at INFO unless TRAKT_LOG_LEVEL is set')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)  # Child process mode, see run_size
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    if args.run:
+        print(json.dumps(run_pipeline(args.use_async, args.log_level)))
+        sys.exit(0)
+
+    report = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'config': {
+            'latency_ms': args.latency_ms,
+            'rate_limit_every': args.rate_limit_every,
+            'retry_after': args.retry_after,
+            'error_every': args.error_every,
+            'workers': args.workers or None,
+            'async': args.use_async,
+            'log_level': args.log_level
+        },
+        'results': []
+    }
+    for size in args.sizes:
+        report['results'].append(run_size(size, args))
+        print(json.dumps(report['results'][-1]), file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(output + '\n')
@@ -0,0 +1,210 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import random
+
+TIMESTAMP = "2014-10-11T17:00:54.000Z"
+
+class SyntheticLibrary:
+    """
+    A deterministic Trakt library of show_count shows and movie_count movies, served by the stub server.
+
+    The watched and watchlist lists are built up front. Per-title responses (progress, ratings, details)
+    are generated from the title's index on request, so a 50,000 title library stays small in memory.
+    """
+
+    def __init__(self, show_count: int, movie_count: int, watchlist_share: float = 0.2, seed: int = 0):
+        self.show_count = show_count
+        self.movie_count = movie_count
+        self.seed = seed
+        # The first titles are watched, the rest are on the watchlist
+        self.watched_show_count = show_count - int(show_count * watchlist_share)
+        self.watched_movie_count = movie_count - int(movie_count * watchlist_share)
+
+    def _random(self, kind: str, index: int) -> random.Random:
+        return random.Random(f"{self.seed}:{kind}:{index}")
+
+    @staticmethod
+    def show_slug(index: int) -> str:
+        return f"synthetic-show-{index}"
+
+    @staticmethod
+    def movie_slug(index: int) -> str:
+        return f"synthetic-movie-{index}"
+
+    @staticmethod
+    def parse_slug(slug: str, kind: str) -> Optional[int]:
+        """
+        Returns the index of a title from its slug, or None if the slug is not one of ours.
+        """
+        prefix = f"synthetic-{kind}-"
+        if not slug.startswith(prefix) or not slug[len(prefix):].isdigit():
+            return None
+        return int(slug[len(prefix):])
+
+    def show(self, index: int, full: bool = False) -> Dict[str, Any]:
+        show = {
+            "title": f"Synthetic Show {index}",
+            "year": 1990 + index % 35,
+            "ids": {"trakt": index + 1, "slug": self.show_slug(index), "tvdb": 100000 + index, "imdb": f"tt{index:07d}", "tmdb": 200000 + index, "tvrage": None}
+        }
+        return self.add_full_fields(show, 'show', index) if full else show
+
+    def movie(self, index: int, full: bool = False) -> Dict[str, Any]:
+        movie = {
+            "title": f"Synthetic Movie {index}",
+            "year": 1970 + index % 55,
+            "ids": {"trakt": index + 1, "slug": self.movie_slug(index), "imdb": f"tt{5000000 + index:07d}", "tmdb": 300000 + index}
+        }
+        return self.add_full_fields(movie, 'movie', index) if full else movie
+
+    def add_full_fields(self, item: Dict[str, Any], kind: str, index: int) -> Dict[str, Any]:
+        """
+        Adds the fields returned with ?extended=full. Titles without ratings are listed without a rating,
+        so the export has to fall back to the ratings endpoint for them.
+        """
+        item.update({"overview": f"Overview of {item['title']}.", "runtime": 30 + index % 3 * 15, "genres": ["drama"], "language": "en"})
+        ratings = self.ratings(kind, index)
+        if ratings is not None:
+            item.update({"rating": ratings["rating"], "votes": ratings["votes"]})
+        return item
+
+    def aired_episodes(self, index: int) -> int:
+        return 6 + index % 60
+
+    def completed_episodes(self, index: int) -> int:
+        # Every third show has unwatched aired episodes and lands in watchlist_shows.csv
+        aired = self.aired_episodes(index)
+        return aired - 1 - index % 5 if index % 3 == 0 else aired
+
+    def watched_shows(self, include_seasons: bool, full: bool = False) -> List[Dict[str, Any]]:
+        """
+        The /sync/watched/shows response, without the seasons array for ?extended=noseasons
+        and with the extended show fields for ?extended=full.
+        """
+        watched_shows = []
+        for index in range(self.watched_show_count):
+            watched_show = {
+                "plays": self.completed_episodes(index),
+                "last_watched_at": TIMESTAMP,
+                "last_updated_at": TIMESTAMP,
+                "reset_at": None,
+                "show": self.show(index, full)
+            }
+            if include_seasons:
+                watched_show["seasons"] = [
+                    {"number": season["number"], "episodes": [
+                        {"number": episode["number"], "plays": 1, "last_watched_at": TIMESTAMP}
+                        for episode in season["episodes"] if episode["completed"]
+                    ]}
+                    for season in self.seasons(index)
+                ]
+            watched_shows.append(watched_show)
+        return watched_shows
+
+    def watchlist_shows(self, full: bool = False) -> List[Dict[str, Any]]:
+        return [
+            {"rank": rank, "id": 1000 + rank, "listed_at": TIMESTAMP, "notes": None, "type": "show", "show": self.show(index, full)}
+            for rank, index in enumerate(range(self.watched_show_count, self.show_count), start=1)
+        ]
+
+    def watched_movies(self, full: bool = False) -> List[Dict[str, Any]]:
+        return [
+            {"plays": 1 + index % 3, "last_watched_at": TIMESTAMP, "last_updated_at": TIMESTAMP, "movie": self.movie(index, full)}
+            for index in range(self.watched_movie_count)
+        ]
+
+    def watchlist_movies(self, full: bool = False) -> List[Dict[str, Any]]:
+        return [
+            {"rank": rank, "id": 2000 + rank, "listed_at": TIMESTAMP, "notes": None, "type": "movie", "movie": self.movie(index, full)}
+            for rank, index in enumerate(range(self.watched_movie_count, self.movie_count), start=1)
+        ]
+
+    def seasons(self, index: int) -> List[Dict[str, Any]]:
+        """
+        The seasons of a show's progress, ten episodes a season, with the completed episodes first.
+        """
+        aired = self.aired_episodes(index)
+        completed = self.completed_episodes(index)
+        seasons = []
+        for season_start in range(0, aired, 10):
+            episodes = [
+                {"number": number - season_start + 1, "completed": number < completed, "last_watched_at": TIMESTAMP if number < completed else None}
+                for number in range(season_start, min(season_start + 10, aired))
+            ]
+            seasons.append({
+                "number": season_start // 10 + 1,
+                "title": f"Season {season_start // 10 + 1}",
+                "aired": len(episodes),
+                "completed": sum(episode["completed"] for episode in episodes),
+                "episodes": episodes
+            })
+        return seasons
+
+    def show_progress(self, index: int) -> Dict[str, Any]:
+        aired = self.aired_episodes(index)
+        completed = self.completed_episodes(index)
+        return {
+            "aired": aired,
+            "completed": completed,
+            "last_watched_at": TIMESTAMP,
+            "reset_at": None,
+            "seasons": self.seasons(index),
+            "hidden_seasons": [],
+            "next_episode": None if completed == aired else {"season": completed // 10 + 1, "number": completed % 10 + 1, "title": None, "ids": {"trakt": None}},
+            "last_episode": {"season": (completed - 1) // 10 + 1, "number": (completed - 1) % 10 + 1, "title": None, "ids": {"trakt": None}}
+        }
+
+    def ratings(self, kind: str, index: int) -> Optional[Dict[str, Any]]:
+        """
+        The ratings of a show or movie. Every 50th title has none (the API answers 404) to exercise the missing rating path.
+        """
+        if index % 50 == 49:
+            return None
+        rng = self._random(f"{kind}-ratings", index)
+        distribution = {str(score): rng.randint(0, 5000) for score in range(1, 11)}
+        votes = sum(distribution.values())
+        rating = sum(int(score) * count for score, count in distribution.items()) / votes if votes else 0
+        return {"rating": round(rating, 5), "votes": votes, "distribution": distribution}
+
+    def show_details(self, index: int) -> Dict[str, Any]:
+        show = self.show(index)
+        return {
+            **show,
+            "overview": f"Overview of {show['title']}.",
+            "status": "ended" if self.completed_episodes(index) == self.aired_episodes(index) else "returning series",
+            "aired_episodes": self.aired_episodes(index),
+            "runtime": 30 + index % 3 * 15,
+            "genres": ["drama"],
+            "first_aired": TIMESTAMP,
+            "language": "en"
+        }
+
+    @property
+    def history_count(self) -> int:
+        # Ten episode plays for every watched show and one play for every watched movie
+        return self.watched_show_count * 10 + self.watched_movie_count
+
+    def history_item(self, index: int) -> Dict[str, Any]:
+        """
+        The play at index in /sync/history, newest first, generated on request like the other per-title responses.
+        """
+        watched_at = (datetime(2024, 1, 1, tzinfo=timezone.utc) - timedelta(minutes=index)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        item = {"id": 10_000_000 - index, "watched_at": watched_at, "action": ("scrobble", "checkin", "watch")[index % 3]}
+        if index < self.watched_show_count * 10:
+            show_index, episode = divmod(index, 10)
+            item.update({
+                "type": "episode",
+                "episode": {"season": 1, "number": episode + 1, "title": f"Episode {episode + 1}", "ids": {"trakt": show_index * 100 + episode, "tvdb": None, "imdb": None, "tmdb": None}},
+                "show": self.show(show_index)
+            })
+        else:
+            item.update({"type": "movie", "movie": self.movie(index - self.watched_show_count * 10)})
+        return item
+
+    def last_activities(self) -> Dict[str, Any]:
+        return {
+            "all": TIMESTAMP,
+            "movies": {"watched_at": TIMESTAMP, "watchlisted_at": TIMESTAMP},
+            "episodes": {"watched_at": TIMESTAMP, "watchlisted_at": TIMESTAMP},
+            "shows": {"watchlisted_at": TIMESTAMP}
+        }
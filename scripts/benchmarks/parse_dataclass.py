@@ -0,0 +1,76 @@
+from dataclasses import fields, is_dataclass
+from typing import Any, Dict, List, Union, get_args, get_origin
+import time
+
+from scripts.models.models_api import WatchedShow
+from scripts.models.parsers import get_decoder
+
+def make_watched_shows(show_count: int, season_count: int, episode_count: int) -> List[Dict[str, Any]]:
+    """
+    Builds a /sync/watched/shows payload (see scripts/urls.py) for a heavy watcher.
+    """
+    return [
+        {
+            "plays": season_count * episode_count,
+            "last_watched_at": "2014-10-11T17:00:54.000Z",
+            "last_updated_at": "2014-10-11T17:00:54.000Z",
+            "reset_at": None,
+            "show": {
+                "title": f"Show {i}",
+                "year": 2000 + i % 25,
+                "ids": {"trakt": i, "slug": f"show-{i}", "tvdb": i, "imdb": f"tt{i:07d}", "tmdb": i, "tvrage": None}
+            },
+            "seasons": [
+                {
+                    "number": season,
+                    "episodes": [
+                        {"number": episode, "plays": 1, "last_watched_at": "2014-10-11T17:00:54.000Z"}
+                        for episode in range(1, episode_count + 1)
+                    ]
+                }
+                for season in range(1, season_count + 1)
+            ]
+        }
+        for i in range(show_count)
+    ]
+
+def parse_dataclass_reflection(model_type: Any, data: Any) -> Any:
+    """
+    Baseline: the per-object reflection approach parse_dataclass used before the compiled decoders,
+    extended to handle List and Optional fields so both parsers build exactly the same objects.
+    """
+    origin = get_origin(model_type)
+    if origin is Union:
+        members = [arg for arg in get_args(model_type) if arg is not type(None)]
+        return None if data is None else parse_dataclass_reflection(members[0], data)
+    if origin is list:
+        return [parse_dataclass_reflection(get_args(model_type)[0], item) for item in data]
+
+    if isinstance(data, dict) and is_dataclass(model_type):
+        fieldtypes = {f.name: f.type for f in fields(model_type)}
+        parsed_data = {}
+        for key, value in data.items():
+            if key in fieldtypes:
+                parsed_data[key] = parse_dataclass_reflection(fieldtypes[key], value)
+        return model_type(**parsed_data)
+
+    return data
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+    payload = make_watched_shows(show_count=2000, season_count=5, episode_count=20)
+    decoder = get_decoder(WatchedShow)
+
+    print(f"WatchedShow payload: {len(payload)} shows, {len(payload) * 5 * 20} episodes")
+
+    reflection = best_of(3, lambda: [parse_dataclass_reflection(WatchedShow, item) for item in payload])
+    compiled = best_of(3, lambda: [decoder(item) for item in payload])
+    print(f"reflection parser: {reflection * 1000:8.1f} ms")
+    print(f"compiled decoder:  {compiled * 1000:8.1f} ms ({reflection / compiled:.1f}x faster)")
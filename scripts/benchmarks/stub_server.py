@@ -0,0 +1,255 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+
+from scripts.benchmarks.library import SyntheticLibrary
+
+# Benchmark counters, not part of the Trakt API
+STATS_PATH = '/__benchmark/stats'
+
+class StubTraktServer(ThreadingHTTPServer):
+    """
+    Local HTTP server answering the Trakt endpoints in scripts/urls.py from a SyntheticLibrary.
+
+    Every response is delayed by latency seconds. With rate_limit_every set, every Nth request is answered
+    with 429 and a Retry-After header, and with error_every set every Nth request with 503. Requests made with one of the rejected_tokens are answered with 401.
+    List endpoints are paginated when the request asks for a page or limit, with the same X-Pagination-*
+    headers as Trakt. Successful responses carry an ETag, a request sending it back in If-None-Match is
+    answered with 304 Not Modified.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, library: SyntheticLibrary, address: Tuple[str, int] = ('127.0.0.1', 0), latency: float = 0.0,
+                 rate_limit_every: int = 0, retry_after: int = 1, rejected_tokens: Iterable[str] = (), error_every: int = 0):
+        super().__init__(address, StubTraktHandler)
+        self.library = library
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.rejected_tokens = set(rejected_tokens)
+        self.error_every = error_every
+        self.requests = 0
+        self.rate_limited = 0
+        self.connections = 0  # Clients that keep their connections alive open few of them
+        self.status_counts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._list_cache: Dict[Tuple[str, bool, bool], list] = {}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def count_request(self) -> Optional[int]:
+        """
+        Counts a request and returns the error status it should be answered with, if any.
+        """
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit_every > 0 and self.requests % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return 429
+            if self.error_every > 0 and self.requests % self.error_every == 0:
+                return 503
+            return None
+
+    def count_status(self, status: int):
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'requests': self.requests, 'rate_limited': self.rate_limited, 'connections': self.connections, 'status_counts': dict(self.status_counts)}
+
+    def get_list(self, name: str, include_seasons: bool = False, full: bool = False) -> list:
+        """
+        Returns a list endpoint's items, built once and reused by every request.
+        """
+        key = (name, include_seasons, full)
+        with self._lock:
+            if key not in self._list_cache:
+                if name == 'watched_shows':
+                    self._list_cache[key] = self.library.watched_shows(include_seasons, full)
+                else:
+                    self._list_cache[key] = getattr(self.library, name)(full)
+            return self._list_cache[key]
+
+class StubTraktHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+    server: StubTraktServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, data: Any, extra_headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data).encode('utf-8')
+        if status == 200:
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            extra_headers = dict(extra_headers or {}, ETag=etag)
+            if self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+        # Counted before anything is sent, a client that has the response may look at the counts right away
+        self.server.count_status(status)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        if url.path == STATS_PATH:
+            self.send_json(200, self.server.stats())
+            return
+
+        error_status = self.server.count_request()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if error_status == 429:
+            self.send_json(429, {'error': 'rate limited'}, {'Retry-After': str(self.server.retry_after)})
+            return
+        if error_status == 503:
+            self.send_json(503, {'error': 'service unavailable'})
+            return
+        if self.headers.get('Authorization', '').replace('Bearer ', '', 1) in self.server.rejected_tokens:
+            self.send_json(401, {'error': 'invalid_grant'})
+            return
+
+        for pattern, handler in ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                handler(self, query, *match.groups())
+                return
+        self.send_json(404, {'error': 'not found'})
+
+    def send_list(self, items: list, query: Dict[str, str]):
+        if 'page' not in query and 'limit' not in query:
+            self.send_json(200, items)
+            return
+
+        page = max(1, int(query.get('page', 1)))
+        limit = max(1, int(query.get('limit', 10)))
+        headers = {
+            'X-Pagination-Page': str(page),
+            'X-Pagination-Limit': str(limit),
+            'X-Pagination-Page-Count': str(max(1, math.ceil(len(items) / limit))),
+            'X-Pagination-Item-Count': str(len(items))
+        }
+        self.send_json(200, items[(page - 1) * limit:page * limit], headers)
+
+    def watched_shows(self, query: Dict[str, str]):
+        extended = query.get('extended', '').split(',')
+        self.send_list(self.server.get_list('watched_shows', 'noseasons' not in extended, 'full' in extended), query)
+
+    def watchlist_shows(self, query: Dict[str, str]):
+        self.send_list(self.server.get_list('watchlist_shows', full=is_full(query)), query)
+
+    def watched_movies(self, query: Dict[str, str]):
+        self.send_list(self.server.get_list('watched_movies', full=is_full(query)), query)
+
+    def watchlist_movies(self, query: Dict[str, str]):
+        self.send_list(self.server.get_list('watchlist_movies', full=is_full(query)), query)
+
+    def history(self, query: Dict[str, str]):
+        # Paginated like the list endpoints, but only the requested page is generated
+        library = self.server.library
+        page = max(1, int(query.get('page', 1)))
+        limit = max(1, int(query.get('limit', 10)))
+        headers = {
+            'X-Pagination-Page': str(page),
+            'X-Pagination-Limit': str(limit),
+            'X-Pagination-Page-Count': str(max(1, math.ceil(library.history_count / limit))),
+            'X-Pagination-Item-Count': str(library.history_count)
+        }
+        indexes = range((page - 1) * limit, min(page * limit, library.history_count))
+        self.send_json(200, [library.history_item(index) for index in indexes], headers)
+
+    def last_activities(self, query: Dict[str, str]):
+        self.send_json(200, self.server.library.last_activities())
+
+    def send_title(self, slug: str, kind: str, build: Callable[[int], Optional[Any]]):
+        library = self.server.library
+        index = library.parse_slug(slug, kind)
+        count = library.show_count if kind == 'show' else library.movie_count
+        data = build(index) if index is not None and index < count else None
+        if data is None:
+            self.send_json(404, {'error': 'not found'})
+        else:
+            self.send_json(200, data)
+
+    def show_progress(self, query: Dict[str, str], slug: str):
+        self.send_title(slug, 'show', self.server.library.show_progress)
+
+    def show_ratings(self, query: Dict[str, str], slug: str):
+        self.send_title(slug, 'show', lambda index: self.server.library.ratings('show', index))
+
+    def movie_ratings(self, query: Dict[str, str], slug: str):
+        self.send_title(slug, 'movie', lambda index: self.server.library.ratings('movie', index))
+
+    def show_details(self, query: Dict[str, str], slug: str):
+        self.send_title(slug, 'show', self.server.library.show_details)
+
+def is_full(query: Dict[str, str]) -> bool:
+    return 'full' in query.get('extended', '').split(',')
+
+ROUTES = [
+    (re.compile(r'^/sync/watched/shows$'), StubTraktHandler.watched_shows),
+    (re.compile(r'^/sync/watchlist/shows$'), StubTraktHandler.watchlist_shows),
+    (re.compile(r'^/sync/watched/movies$'), StubTraktHandler.watched_movies),
+    (re.compile(r'^/sync/watchlist/movies$'), StubTraktHandler.watchlist_movies),
+    (re.compile(r'^/sync/last_activities$'), StubTraktHandler.last_activities),
+    (re.compile(r'^/sync/history$'), StubTraktHandler.history),
+    (re.compile(r'^/shows/([^/]+)/progress/watched$'), StubTraktHandler.show_progress),
+    (re.compile(r'^/shows/([^/]+)/ratings$'), StubTraktHandler.show_ratings),
+    (re.compile(r'^/movies/([^/]+)/ratings$'), StubTraktHandler.movie_ratings),
+    (re.compile(r'^/shows/([^/]+)$'), StubTraktHandler.show_details)
+]
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Serve a synthetic Trakt library on localhost.')
+    parser.add_argument('--shows', type=int, default=1000, help='number of shows in the library')
+    parser.add_argument('--movies', type=int, default=1000, help='number of movies in the library')
+    parser.add_argument('--port', type=int, default=0, help='port to listen on, 0 picks a free one')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='delay added to every response')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='answer every Nth request with 429, 0 never does')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with a 429')
+    parser.add_argument('--error-every', type=int, default=0, help='answer every Nth request with 503, 0 never does')
+    parser.add_argument('--reject-token', action='append', default=[], help='answer requests made with this access token with 401')
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    server = StubTraktServer(
+        SyntheticLibrary(args.shows, args.movies),
+        ('127.0.0.1', args.port),
+        latency=args.latency_ms / 1000,
+        rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after,
+        rejected_tokens=args.reject_token,
+        error_every=args.error_every
+    )
+    # The first line of output is the URL to point TRAKT_API_URL at
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
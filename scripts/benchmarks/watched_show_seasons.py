@@ -0,0 +1,68 @@
+from typing import Dict
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from scripts.benchmarks.parse_dataclass import make_watched_shows
+from scripts.models.models_api import WatchedShow
+from scripts.models.parsers import get_decoder
+
+def measure(fixture_path: str) -> Dict[str, float]:
+    """
+    Decodes a /sync/watched/shows response body from disk and reports the parse time and memory used.
+    """
+    with open(fixture_path, 'rb') as fixture_file:
+        body = fixture_file.read()
+
+    start = time.perf_counter()
+    decoder = get_decoder(WatchedShow)
+    watched_shows = [decoder(item) for item in json.loads(body)]
+    elapsed = time.perf_counter() - start
+
+    return {
+        'shows': len(watched_shows),
+        'body_mb': len(body) / 1024 / 1024,
+        'parse_ms': elapsed * 1000,
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    }
+
+def write_fixture(path: str, include_seasons: bool):
+    payload = make_watched_shows(show_count=3000, season_count=8, episode_count=20)
+    if not include_seasons:
+        # What Trakt returns for ?extended=noseasons
+        for item in payload:
+            del item['seasons']
+    with open(path, 'w', encoding='utf-8') as fixture_file:
+        json.dump(payload, fixture_file)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--measure':
+        print(json.dumps(measure(sys.argv[2])))
+        sys.exit(0)
+    if len(sys.argv) == 4 and sys.argv[1] == '--write':
+        write_fixture(sys.argv[2], sys.argv[3] == 'seasons')
+        sys.exit(0)
+
+    # Fixtures are written and measured in fresh interpreters, a child process starts with
+    # the peak RSS of its parent so this process has to stay small
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, include_seasons in (('with seasons', True), ('extended=noseasons', False)):
+            fixture_path = os.path.join(directory, f"watched_shows_{include_seasons}.json")
+            subprocess.run(
+                [sys.executable, '-m', 'scripts.benchmarks.watched_show_seasons', '--write', fixture_path,
+                 'seasons' if include_seasons else 'noseasons'],
+                check=True
+            )
+            output = subprocess.run(
+                [sys.executable, '-m', 'scripts.benchmarks.watched_show_seasons', '--measure', fixture_path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output)
+            print(f"{mode:>20}: {result['shows']} shows, body {result['body_mb']:.1f} MB, "
+                  f"parse {result['parse_ms']:.0f} ms, "
+                  f"peak RSS {result['peak_rss_mb']:.1f} MB")
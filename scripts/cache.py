@@ -0,0 +1,217 @@
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+# Bumped whenever the responses table changes, older cache files are rebuilt from scratch
+SCHEMA_VERSION = 2
+
+# Seconds a process waits for another process to finish writing before giving up
+BUSY_TIMEOUT = 30
+
+# Hits only move a response's last access time forward once it is older than this many seconds,
+# so reading from the cache rarely has to write to it
+ACCESS_RESOLUTION = 60
+
+# Response headers kept alongside the body, the rest are not needed to replay a response
+STORED_HEADERS = ('X-Pagination-Page', 'X-Pagination-Limit', 'X-Pagination-Page-Count', 'X-Pagination-Item-Count')
+
+@dataclass
+class CachedResponse:
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float  # Unix timestamp of the last time the response was fetched or revalidated
+    headers: Dict[str, str]
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.stored_at < ttl
+
+@dataclass
+class CacheStats:
+    hits: int = 0  # Served straight from the cache without a request
+    revalidated: int = 0  # Served from the cache after a 304 Not Modified
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    def __str__(self) -> str:
+        return (f"hits={self.hits} revalidated={self.revalidated} misses={self.misses} "
+                f"stores={self.stores} evictions={self.evictions}")
+
+class ResponseCache:
+    """
+    SQLite backed store of raw Trakt API responses keyed by request, with size based LRU eviction.
+    Like the catalog it runs in WAL mode, so several exports can share one cache file.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        if self._connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._connection.execute("DROP TABLE IF EXISTS responses")
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                headers TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._connection.commit()
+
+    def record(self, stat: str):
+        """
+        Increments one of the CacheStats counters, safe to call from worker threads.
+        """
+        with self._lock:
+            setattr(self.stats, stat, getattr(self.stats, stat) + 1)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """
+        Returns the cached response for key, or None if nothing is stored.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, etag, last_modified, stored_at, headers, accessed_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[5] >= ACCESS_RESOLUTION:
+                self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self._connection.commit()
+        body, etag, last_modified, stored_at, headers, _ = row
+        return CachedResponse(body, etag, last_modified, stored_at, json.loads(headers))
+
+    def put(self, key: str, endpoint: str, body: str, headers: Mapping[str, str]):
+        """
+        Stores a response body with its validators and replayable headers,
+        then evicts the least recently used entries if over budget.
+        """
+        now = time.time()
+        size = len(body.encode('utf-8'))
+        stored_headers = {name: headers[name] for name in STORED_HEADERS if name in headers}
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body, headers.get('ETag'), headers.get('Last-Modified'), json.dumps(stored_headers), size, now, now)
+            )
+            self.stats.stores += 1
+            self._evict()
+            self._connection.commit()
+
+    def touch(self, key: str):
+        """
+        Marks a cached response as fresh again after the server confirmed it is unchanged.
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+            self._connection.commit()
+
+    def expire(self, key: str):
+        """
+        Marks a cached response as stale so the next request revalidates it with a conditional GET.
+        """
+        with self._lock:
+            self._connection.execute("UPDATE responses SET stored_at = 0 WHERE key = ?", (key,))
+            self._connection.commit()
+
+    def _evict(self):
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        evicted: List[str] = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append(key)
+            total -= size
+
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in evicted])
+        self.stats.evictions += len(evicted)
+        logging.debug(f"Evicted {len(evicted)} cached responses to stay under {self.max_bytes} bytes")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+@dataclass
+class CacheLookup:
+    """
+    The cache state of a single request, shared by the synchronous and asynchronous clients.
+    """
+    cache: Optional[ResponseCache]
+    key: str
+    endpoint: str
+    ttl: float
+    cached: Optional[CachedResponse]
+
+    def fresh_body(self) -> Optional[str]:
+        """
+        Returns the cached body if it can be used without asking the API.
+        """
+        if self.cached and self.cached.is_fresh(self.ttl):
+            self.cache.record('hits')
+            return self.cached.body
+        return None
+
+    def request_headers(self, headers: Mapping[str, str]) -> Dict[str, str]:
+        """
+        Returns headers with the validators needed to make a conditional GET for a stale cached response.
+        """
+        request_headers = dict(headers)
+        if self.cached and self.cached.etag:
+            request_headers['If-None-Match'] = self.cached.etag
+        if self.cached and self.cached.last_modified:
+            request_headers['If-Modified-Since'] = self.cached.last_modified
+        return request_headers
+
+    def not_modified_body(self) -> Optional[str]:
+        """
+        Returns the cached body after the API answered 304 Not Modified, marking it fresh again.
+        """
+        if not self.cached:
+            return None
+        self.cache.record('revalidated')
+        try:
+            self.cache.touch(self.key)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not mark the cached response for {self.key} as fresh: {e}")
+        return self.cached.body
+
+    def record_miss(self):
+        if self.cache:
+            self.cache.record('misses')
+
+    def cached_headers(self) -> Dict[str, str]:
+        return self.cached.headers if self.cached else {}
+
+    def store(self, body: str, headers: Mapping[str, str]):
+        """
+        Caches a fetched response. A cache that cannot be written to only costs the next run a request.
+        """
+        if not self.cache:
+            return
+        try:
+            self.cache.put(self.key, self.endpoint, body, headers)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not store the response for {self.key} in the cache: {e}")
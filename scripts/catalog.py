@@ -0,0 +1,125 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+import json
+import sqlite3
+import threading
+import time
+
+# Bumped whenever the catalog table changes, older catalog files are rebuilt from scratch
+SCHEMA_VERSION = 1
+
+# Seconds a process waits for another process to finish writing before giving up
+BUSY_TIMEOUT = 30
+
+@dataclass
+class CatalogEntry:
+    data: Any  # The API response as JSON data
+    fetched_at: float  # Unix timestamp of when the data was fetched from the API
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+@dataclass
+class CatalogStats:
+    hits: int = 0  # Fresh entries used instead of a request
+    stale: int = 0  # Entries found but too old to use
+    misses: int = 0
+    stores: int = 0
+
+    def __str__(self) -> str:
+        return f"hits={self.hits} stale={self.stale} misses={self.misses} stores={self.stores}"
+
+class CatalogStore:
+    """
+    SQLite backed store of global Trakt metadata (ratings and show details), shared by every account.
+
+    Entries are keyed by kind (show_ratings, movie_ratings, show_details) and the Trakt id or slug used in
+    the request URL. The database runs in WAL mode so any number of export processes can read while one
+    writes, and writers wait for each other instead of failing. Unlike the response cache nothing is evicted,
+    an entry is refetched once it is older than the TTL the caller asks for.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stats = CatalogStats()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        with self._transaction():
+            if self._connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS catalog")
+                self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS catalog (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (kind, id)
+                )
+            """)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """
+        Runs the block as one write transaction. BEGIN IMMEDIATE takes the write lock up front, so concurrent
+        writers queue on the busy timeout instead of failing when a read lock cannot be upgraded.
+        """
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def record(self, stat: str):
+        with self._lock:
+            setattr(self.stats, stat, getattr(self.stats, stat) + 1)
+
+    def get(self, kind: str, item_id: str) -> Optional[CatalogEntry]:
+        """
+        Returns the stored entry, however old, or None if there is none.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT data, fetched_at FROM catalog WHERE kind = ? AND id = ?", (kind, item_id)).fetchone()
+        if row is None:
+            return None
+        data, fetched_at = row
+        return CatalogEntry(json.loads(data), fetched_at)
+
+    def get_fresh(self, kind: str, item_id: str, ttl: float) -> Optional[Any]:
+        """
+        Returns the stored data if it was fetched less than ttl seconds ago, recording a hit, stale entry or miss.
+        """
+        entry = self.get(kind, item_id)
+        if entry is None:
+            self.record('misses')
+            return None
+        if not entry.is_fresh(ttl):
+            self.record('stale')
+            return None
+        self.record('hits')
+        return entry.data
+
+    def put(self, kind: str, item_id: str, data: Any, fetched_at: Optional[float] = None):
+        """
+        Stores data fetched from the API. When two processes store the same entry the most recently fetched one wins.
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self._lock, self._transaction():
+            self._connection.execute(
+                """
+                INSERT INTO catalog (kind, id, data, fetched_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (kind, id) DO UPDATE SET data = excluded.data, fetched_at = excluded.fetched_at
+                WHERE excluded.fetched_at >= catalog.fetched_at
+                """,
+                (kind, item_id, json.dumps(data), fetched_at)
+            )
+            self.stats.stores += 1
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,109 @@
+from typing import List, Optional
+import argparse
+import logging
+import os
+import sys
+
+# Only the standard library is imported up front so --help and argument errors stay instant.
+# The export modules (and pandas, requests, aiohttp) are imported once a command actually runs.
+
+def bootstrap():
+    """
+    Loads the .env file and sets up logging. Has to run before the export modules are imported,
+    they read their settings from the environment at import time.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # Per-request lines are logged at DEBUG, set TRAKT_LOG_LEVEL=DEBUG to see them
+    logging.basicConfig(
+        filename='trakt_api.log',
+        level=getattr(logging, os.getenv('TRAKT_LOG_LEVEL', 'INFO').upper(), logging.INFO),
+        format='%(asctime)s %(levelname)s:%(message)s'
+    )
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m scripts', description='Export your Trakt shows and movies to CSV files.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    commands = {
+        'shows': 'export watchlist_shows.csv and watched_shows.csv',
+        'movies': 'export watchlist_movies.csv and watched_movies.csv',
+        'all': 'export all four CSV files'
+    }
+    for command, help_text in commands.items():
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument('--async', dest='use_async', action='store_true', help='run the export on an asyncio event loop')
+        subparser.add_argument('--resume', action='store_true', help='continue an export that stopped early from its run journal')
+        subparser.add_argument('--timings', action='store_true', help='print the time of every pipeline stage and the critical path')
+
+    subparsers.add_parser('incremental', help='update all four CSV files, refetching only what changed since the last run')
+
+    history = subparsers.add_parser('history', help='export every episode and movie play to sync_history.csv, resuming an unfinished export')
+    history.add_argument('--restart', action='store_true', help='start over instead of resuming an unfinished export')
+
+    batch = subparsers.add_parser('batch', help='export several accounts at once, each into its own directory')
+    batch.add_argument('accounts', help='JSON file listing the accounts, see scripts/batch.py')
+    batch.add_argument('--concurrency', type=int, help='accounts exported at the same time (default TRAKT_BATCH_CONCURRENCY or 4)')
+    return parser
+
+def run_batch(args: argparse.Namespace) -> int:
+    from scripts.batch import BATCH_CONCURRENCY, load_accounts, run_batch as run_accounts
+
+    try:
+        accounts = load_accounts(args.accounts)
+    except (OSError, ValueError) as e:
+        print(f"Could not load accounts: {e}", file=sys.stderr)
+        return 1
+
+    results = run_accounts(accounts, concurrency=args.concurrency or BATCH_CONCURRENCY)
+    for result in results:
+        status = 'ok' if result.succeeded else f"failed: {result.error}"
+        print(f"{result.name}: {status}", file=sys.stdout if result.succeeded else sys.stderr)
+    return 0 if all(result.succeeded for result in results) else 1
+
+def run(args: argparse.Namespace) -> int:
+    if args.command == 'batch':
+        return run_batch(args)
+
+    if args.command == 'incremental':
+        from scripts.incremental import run_incremental
+        run_incremental()
+        return 0
+
+    if args.command == 'history':
+        from scripts.history import export_history
+        from scripts.trakt import report_run
+        state = export_history(restart=args.restart)
+        report_run()
+        return 0 if state.complete else 1
+
+    shows = args.command in ('shows', 'all')
+    movies = args.command in ('movies', 'all')
+
+    if args.use_async:
+        import asyncio
+        from scripts.trakt_async import main as run_async_export
+        asyncio.run(run_async_export(shows=shows, movies=movies, resume=args.resume))
+    else:
+        from scripts.trakt import run_export
+        run_export(shows=shows, movies=movies, resume=args.resume, print_timings=args.timings)
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    bootstrap()
+
+    # Batch exports take their access tokens from the accounts file
+    if args.command == 'batch' and not os.getenv('TRAKT_CLIENT_ID'):
+        print("Missing Trakt API credentials. Set TRAKT_CLIENT_ID in the .env file.", file=sys.stderr)
+        return 1
+    if args.command != 'batch':
+        from scripts.api import MissingCredentialsError, get_credentials
+        try:
+            get_credentials()
+        except MissingCredentialsError as e:
+            print(f"{e} Set TRAKT_CLIENT_ID and TRAKT_ACCESS_TOKEN in the .env file.", file=sys.stderr)
+            return 1
+
+    return run(args)
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import asyncio
+import threading
+
+# Marks keys with nothing memoized for them
+MISSING = object()
+
+@dataclass
+class CoalescingStats:
+    fetched: int = 0  # Went on to the response cache or the API
+    joined: int = 0  # Waited for the same request already in flight
+    memo_hits: int = 0  # Served from the results of earlier requests in this run
+    evictions: int = 0
+
+    @property
+    def saved(self) -> int:
+        return self.joined + self.memo_hits
+
+    def __str__(self) -> str:
+        return (f"fetched={self.fetched} joined={self.joined} memo_hits={self.memo_hits} "
+                f"saved={self.saved} evictions={self.evictions}")
+
+class RequestCoalescer:
+    """
+    Single-flight layer in front of the API client. Callers asking for a key (a URL, scoped to the account for
+    account specific endpoints) while a request for it is in flight wait for that request and share its parsed
+    result instead of sending their own. Results are then kept in a bounded LRU for the rest of the run.
+
+    The parsed objects are shared between the callers, which treat them as read-only.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.stats = CoalescingStats()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._in_flight_async: Dict[Hashable, asyncio.Future] = {}  # Requests in flight on the running event loop
+        self._memo: 'OrderedDict[Hashable, Any]' = OrderedDict()
+
+    def _lookup(self, key: Hashable) -> Any:
+        if key not in self._memo:
+            return MISSING
+        self._memo.move_to_end(key)
+        self.stats.memo_hits += 1
+        return self._memo[key]
+
+    def _remember(self, key: Hashable, result: Any):
+        if self.max_entries <= 0:
+            return
+        self._memo[key] = result
+        self._memo.move_to_end(key)
+        while len(self._memo) > self.max_entries:
+            self._memo.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _join(self, key: Hashable, in_flight: Dict[Hashable, Any], new_future: Callable[[], Any]) -> Tuple[Any, Any, bool]:
+        """
+        Returns the memoized result for key (or MISSING), and otherwise the future of the request in flight for it,
+        registering a new one when there is none. Also returns whether the caller has to make that request.
+        """
+        result = self._lookup(key)
+        if result is not MISSING:
+            return result, None, False
+        future = in_flight.get(key)
+        if future is not None:
+            self.stats.joined += 1
+            return MISSING, future, False
+        future = in_flight[key] = new_future()
+        self.stats.fetched += 1
+        return MISSING, future, True
+
+    def _finish(self, key: Hashable, in_flight: Dict[Hashable, Any], result: Any, memoize: Callable[[Any], bool]):
+        with self._lock:
+            del in_flight[key]
+            if memoize(result):
+                self._remember(key, result)
+
+    def forget(self, key: Hashable):
+        """
+        Drops the memoized result for key, so the next caller fetches it again.
+        """
+        with self._lock:
+            self._memo.pop(key, None)
+
+    def fetch(self, key: Hashable, fetch_fn: Callable[[], Any], memoize: Callable[[Any], bool]) -> Tuple[Any, bool]:
+        """
+        Returns fetch_fn(), run once for every caller asking for key at the same time, or the memoized result.
+        The result is memoized when memoize(result) is true. Also returns whether a request was saved.
+        """
+        with self._lock:
+            result, future, leader = self._join(key, self._in_flight, Future)
+        if result is not MISSING:
+            return result, True
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fetch_fn()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        self._finish(key, self._in_flight, result, memoize)
+        future.set_result(result)
+        return result, False
+
+    async def fetch_async(self, key: Hashable, fetch_fn: Callable[[], Awaitable[Any]], memoize: Callable[[Any], bool]) -> Tuple[Any, bool]:
+        """
+        Async version of fetch, sharing requests in flight between the tasks of the running event loop.
+        """
+        with self._lock:
+            result, future, leader = self._join(key, self._in_flight_async, asyncio.get_running_loop().create_future)
+        if result is not MISSING:
+            return result, True
+        if not leader:
+            # A waiter being cancelled does not cancel the request the other waiters share
+            return await asyncio.shield(future), True
+
+        try:
+            result = await fetch_fn()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight_async[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Marks the error as retrieved when no other task was waiting for it
+            raise
+
+        self._finish(key, self._in_flight_async, result, memoize)
+        future.set_result(result)
+        return result, False
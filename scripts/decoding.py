@@ -0,0 +1,106 @@
+from typing import Any, Dict, List, Optional, Type, Union
+import json
+import logging
+import os
+import threading
+
+from scripts.models.parsers import get_decoder
+
+# Decoder of the API responses: msgspec, orjson or json. auto picks the fastest one installed
+DECODE_BACKEND = os.getenv('TRAKT_DECODE_BACKEND', 'auto')
+
+# The backends auto tries, fastest first as measured by scripts/benchmarks/decode_backends.py. orjson is left out:
+# it only wins on the nested responses and is slower than json on the flat lists the export asks for by default
+AUTO_BACKENDS = ['msgspec', 'json']
+
+Body = Union[bytes, str]
+
+class DecodeBackend:
+    """
+    Turns a raw response body into the model type (or a list of it for list endpoints). The json and orjson
+    backends parse into dicts and lists first and then run the compiled decoders from scripts.models.parsers.
+    """
+
+    name = 'json'
+
+    def loads(self, body: Body) -> Any:
+        return json.loads(body)
+
+    def decode(self, model_type: Type, body: Body) -> Any:
+        data = self.loads(body)
+        decoder = get_decoder(model_type)
+        if isinstance(data, list):
+            return [decoder(item) for item in data]
+        return decoder(data)
+
+class OrjsonBackend(DecodeBackend):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self.loads = orjson.loads
+
+class MsgspecBackend(DecodeBackend):
+    """
+    Decodes the body straight into the model dataclasses in a single pass, without building the intermediate dicts.
+
+    msgspec checks every value against its annotation, while the compiled decoders (and the API, e.g. a numeric
+    tvrage id) are lenient. A body that does not fit the annotations goes through the stdlib path, so the result
+    and the errors stay the same.
+    """
+
+    name = 'msgspec'
+
+    def __init__(self):
+        import msgspec
+        self.msgspec = msgspec
+        self._decoders: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    def get_decoder(self, tp: Any) -> Any:
+        with self._lock:
+            if tp not in self._decoders:
+                self._decoders[tp] = self.msgspec.json.Decoder(tp)
+            return self._decoders[tp]
+
+    def decode(self, model_type: Type, body: Body) -> Any:
+        # List endpoints are decoded as lists of the model, detected from the first character like json would
+        is_list = body.lstrip()[:1] in (b'[', '[')
+        try:
+            return self.get_decoder(List[model_type] if is_list else model_type).decode(body)
+        except self.msgspec.ValidationError as e:
+            logging.debug(f"Decoding {model_type.__name__} with msgspec failed ({e}), using json")
+            return super().decode(model_type, body)
+
+BACKENDS = {'msgspec': MsgspecBackend, 'orjson': OrjsonBackend, 'json': DecodeBackend}
+
+def load_backend(name: str = DECODE_BACKEND) -> DecodeBackend:
+    """
+    Returns the named decode backend. auto, or a backend whose package is not installed, falls back to the fastest available one.
+    """
+    if name not in BACKENDS and name != 'auto':
+        logging.warning(f"Unknown decode backend {name}, expected msgspec, orjson, json or auto")
+    for candidate in ([name] if name in BACKENDS else []) + AUTO_BACKENDS:
+        try:
+            return BACKENDS[candidate]()
+        except ImportError:
+            if candidate == name:
+                logging.warning(f"Decode backend {name} is not installed, falling back")
+    return DecodeBackend()
+
+_backend: Optional[DecodeBackend] = None
+_backend_lock = threading.Lock()
+
+def get_backend() -> DecodeBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = load_backend()
+    return _backend
+
+def decode_response(model_type: Type, body: Body) -> Any:
+    """
+    Decodes a Trakt API response body (bytes or text) into model_type, or a list of it for a JSON array.
+    """
+    return get_backend().decode(model_type, body)
@@ -0,0 +1,127 @@
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+import csv
+import json
+import logging
+import os
+
+from scripts.metrics import metrics
+from scripts.api import PAGE_LIMIT, iter_history_pages
+from scripts.models.models_api import HistoryItem
+from scripts.writers import atomic_path, format_value
+
+HISTORY_PATH = os.getenv('TRAKT_HISTORY_PATH', 'sync_history.csv')
+
+HISTORY_COLUMNS = [
+    'id', 'watched_at', 'action', 'type', 'title', 'year', 'trakt_id', 'slug', 'imdb', 'tmdb',
+    'season', 'episode', 'episode_title', 'episode_trakt_id'
+]
+
+@dataclass
+class HistoryState:
+    """
+    Progress of a history export, saved next to the CSV after every page so an interrupted export can be resumed.
+    """
+    end_at: str  # Plays after this timestamp are left out, so new plays do not shift the pages being resumed
+    limit: int  # Items per page, resuming with another limit would skip or repeat rows
+    pages: int = 0  # Pages written
+    rows: int = 0
+    size: int = 0  # Bytes of the CSV up to the last written page
+    complete: bool = False
+
+def get_state_path(path: str) -> str:
+    return f"{path}.state.json"
+
+def load_state(path: str) -> Optional[HistoryState]:
+    """
+    Loads the saved progress of an unfinished export to path, or None when there is nothing to resume.
+    """
+    state_path = get_state_path(path)
+    if not os.path.exists(state_path) or not os.path.exists(path):
+        return None
+
+    try:
+        with open(state_path, encoding='utf-8') as state_file:
+            state = HistoryState(**json.load(state_file))
+    except (OSError, ValueError, TypeError) as e:
+        logging.warning(f"Ignoring unreadable history state {state_path}: {e}")
+        return None
+
+    if state.complete or os.path.getsize(path) < state.size:
+        return None
+    return state
+
+def save_state(state: HistoryState, path: str):
+    with atomic_path(get_state_path(path)) as temp_path:
+        with open(temp_path, 'w', encoding='utf-8') as state_file:
+            json.dump(asdict(state), state_file)
+
+def history_row(item: HistoryItem) -> List[Any]:
+    """
+    Flattens a play into a CSV row, with the show in the title columns for episodes.
+    """
+    title = item.movie if item.type == 'movie' else item.show
+    episode = item.episode if item.type == 'episode' else None
+    return [
+        item.id, item.watched_at, item.action, item.type,
+        title.title if title else None,
+        title.year if title else None,
+        title.ids.trakt if title else None,
+        title.ids.slug if title else None,
+        title.ids.imdb if title else None,
+        title.ids.tmdb if title else None,
+        episode.season if episode else None,
+        episode.number if episode else None,
+        episode.title if episode else None,
+        episode.ids.get('trakt') if episode else None
+    ]
+
+def export_history(path: str = HISTORY_PATH, restart: bool = False, limit: int = PAGE_LIMIT) -> HistoryState:
+    """
+    Streams every play in /sync/history to a CSV, one page at a time, so memory does not grow with the history.
+
+    After each page the CSV is flushed to disk and the progress saved. A run that stops early (a failed request,
+    a crash) resumes after the last written page, unless restart is set. Anything written after that page is
+    cut off first, so resumed and uninterrupted exports produce the same file.
+    """
+    state = None if restart else load_state(path)
+    if state is not None and state.limit != limit:
+        logging.info(f"History export to {path} was started with limit={state.limit}, starting over.")
+        state = None
+
+    if state is None:
+        end_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        state = HistoryState(end_at, limit)
+        mode = 'w'
+    else:
+        logging.info(f"Resuming the history export to {path} after page {state.pages} ({state.rows} rows).")
+        mode = 'r+'
+
+    with open(path, mode, newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file, lineterminator=os.linesep)
+        if mode == 'w':
+            writer.writerow(HISTORY_COLUMNS)
+        else:
+            csv_file.seek(state.size)
+            csv_file.truncate()
+
+        with metrics.stage('history'):
+            for page, page_count, items in iter_history_pages(state.end_at, state.pages + 1, limit):
+                for item in items:
+                    writer.writerow([format_value(value) for value in history_row(item)])
+                csv_file.flush()
+                os.fsync(csv_file.fileno())
+
+                state.pages = page
+                state.rows += len(items)
+                state.size = csv_file.tell()
+                state.complete = page >= page_count
+                save_state(state, path)
+                logging.debug(f"Wrote history page {page} of {page_count} to {path}")
+
+    if state.complete:
+        logging.info(f"History export to {path} finished: {state.rows} plays.")
+    else:
+        logging.error(f"History export to {path} stopped after page {state.pages} ({state.rows} plays), run it again to resume.")
+    return state
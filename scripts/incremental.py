@@ -0,0 +1,178 @@
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional
+import json
+import logging
+import os
+
+from scripts.trakt import ShowClassification, add_progress_analytics, classify_shows, process_movies_data, process_shows_data, report_run, save_export
+from scripts.metrics import metrics
+from scripts.api import expire_cached_response, fetch_last_activities, fetch_trakt_data, get_list_url, get_watched_shows_url, parse_dataclass
+from scripts.models.models_api import LastActivities, ShowProgress, WatchedMovie, WatchedShow, WatchlistMovie, WatchlistShow
+from scripts.models.models_csv import MovieCSV, ShowCSV
+from scripts.urls import WATCHED_MOVIES_URL, WATCHLIST_MOVIES_URL, WATCHLIST_SHOWS_URL
+from scripts.util import combine_unique_shows, get_list_fields, get_movies_from_watched_movies, get_movies_from_watchlist_movies, get_shows_from_watched_shows
+
+SNAPSHOT_PATH = os.getenv('TRAKT_SNAPSHOT_PATH', '.trakt_snapshot.json')
+
+# Bumped whenever the snapshot layout changes, older snapshots trigger a full export
+SNAPSHOT_VERSION = 3
+
+# Each synced category: the last activity timestamp that moves when it changes, its URL and model
+CATEGORIES = {
+    'watched_shows': (('episodes', 'watched_at'), get_watched_shows_url(), WatchedShow),
+    'watchlist_shows': (('shows', 'watchlisted_at'), get_list_url(WATCHLIST_SHOWS_URL), WatchlistShow),
+    'watched_movies': (('movies', 'watched_at'), get_list_url(WATCHED_MOVIES_URL), WatchedMovie),
+    'watchlist_movies': (('movies', 'watchlisted_at'), get_list_url(WATCHLIST_MOVIES_URL), WatchlistMovie)
+}
+
+# The categories each CSV is built from
+OUTPUTS = {
+    'watchlist_shows.csv': ('watched_shows', 'watchlist_shows'),
+    'watched_shows.csv': ('watched_shows',),
+    'watched_movies.csv': ('watched_movies',),
+    'watchlist_movies.csv': ('watchlist_movies',)
+}
+
+def load_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Loads the snapshot written by the previous incremental run, or None if there is no usable snapshot.
+    """
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        logging.info(f"Snapshot {path} is from a different version, running a full export.")
+        return None
+
+    return snapshot
+
+def save_snapshot(snapshot: Dict[str, Any], path: str):
+    """
+    Writes the snapshot next to its final location first so an interrupted run never leaves a truncated file.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    os.replace(temp_path, path)
+
+def get_activity_timestamp(activities: LastActivities, category: str) -> Optional[str]:
+    group, key = CATEGORIES[category][0]
+    return getattr(activities, group).get(key)
+
+def get_changed_categories(activities: LastActivities, snapshot: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    Returns the categories whose last activity timestamp moved since the snapshot was taken.
+    """
+    if snapshot is None:
+        return list(CATEGORIES)
+
+    previous = parse_dataclass(LastActivities, snapshot['last_activities'])
+    return [
+        category for category in CATEGORIES
+        if get_activity_timestamp(activities, category) != get_activity_timestamp(previous, category)
+    ]
+
+def build_outputs(lists: Dict[str, list], classification: ShowClassification, names: List[str]) -> Dict[str, list]:
+    """
+    Builds the CSV rows of the named outputs from the merged category lists.
+    """
+    show_fields = get_list_fields(lists['watched_shows'], lists['watchlist_shows'])
+    add_progress_analytics(show_fields, lists['watched_shows'], classification)
+    movie_fields = get_list_fields(lists['watched_movies'], lists['watchlist_movies'])
+    builders: Dict[str, Callable[[], list]] = {
+        'watchlist_shows.csv': lambda: process_shows_data(combine_unique_shows(classification.in_progress, lists['watchlist_shows']), show_fields),
+        'watched_shows.csv': lambda: process_shows_data(get_shows_from_watched_shows(classification.completed), show_fields),
+        'watched_movies.csv': lambda: process_movies_data(get_movies_from_watched_movies(lists['watched_movies']), movie_fields),
+        'watchlist_movies.csv': lambda: process_movies_data(get_movies_from_watchlist_movies(lists['watchlist_movies']), movie_fields)
+    }
+    return {name: builders[name]() for name in names}
+
+def restore_classification(watched_shows: List[WatchedShow], snapshot: Dict[str, Any]) -> ShowClassification:
+    """
+    Rebuilds the in-progress and completed buckets from the show slugs stored in the snapshot, along with
+    the progress they were classified by, which the progress analytics columns are computed from.
+    """
+    in_progress = set(snapshot['in_progress_shows'])
+    completed = set(snapshot['completed_shows'])
+    classification = ShowClassification()
+    classification.progress = {slug: parse_dataclass(ShowProgress, progress) for slug, progress in snapshot['show_progress'].items()}
+    for watched_show in watched_shows:
+        if watched_show.show.ids.slug in in_progress:
+            classification.in_progress.append(watched_show)
+        elif watched_show.show.ids.slug in completed:
+            classification.completed.append(watched_show)
+        else:
+            classification.unknown.append(watched_show)
+    return classification
+
+def run_incremental(snapshot_path: str = SNAPSHOT_PATH):
+    """
+    Updates the four CSVs, refetching only the categories whose /sync/last_activities timestamps moved since
+    the previous run. Unchanged categories and CSV rows are taken from the snapshot, so a run where nothing
+    changed makes a single API call.
+
+    Shows only move from completed to in-progress when the user watches something, a new episode airing
+    does not change last_activities. Run the full export now and then to pick those up.
+    """
+    with metrics.stage('fetch_activities'):
+        activities = fetch_last_activities()
+    if activities is None:
+        logging.error("Could not fetch last activities, the incremental export was not run.")
+        return
+
+    snapshot = load_snapshot(snapshot_path)
+    changed = get_changed_categories(activities, snapshot)
+    logging.info(f"Changed categories since the last export: {changed or 'none'}")
+
+    lists: Dict[str, list] = {}
+    with metrics.stage('fetch_lists'):
+        for category, (_, url, model_type) in CATEGORIES.items():
+            if category in changed:
+                # The cached list may predate the change, make sure it is revalidated
+                expire_cached_response(url)
+                items = fetch_trakt_data(url, model_type)
+                if items is None:
+                    # Keep the previous snapshot so the category is retried on the next run
+                    logging.error(f"Could not fetch {category}, the incremental export was not run.")
+                    return
+                lists[category] = items
+            else:
+                lists[category] = parse_dataclass(model_type, snapshot[category])
+
+    with metrics.stage('classify_shows'):
+        if 'watched_shows' in changed:
+            classification = classify_shows(lists['watched_shows'])
+        else:
+            classification = restore_classification(lists['watched_shows'], snapshot)
+
+    stale_outputs = [name for name, categories in OUTPUTS.items() if any(category in changed for category in categories)]
+    with metrics.stage('ratings'):
+        outputs = build_outputs(lists, classification, stale_outputs)
+
+    with metrics.stage('write_csv'):
+        for name in OUTPUTS:
+            if name not in outputs:
+                row_type = ShowCSV if 'shows' in name else MovieCSV
+                outputs[name] = [row_type(**row) for row in snapshot['outputs'][name]]
+            save_export(outputs[name], os.path.splitext(name)[0])
+
+    new_snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'last_activities': asdict(activities),
+        'in_progress_shows': [watched_show.show.ids.slug for watched_show in classification.in_progress],
+        'completed_shows': [watched_show.show.ids.slug for watched_show in classification.completed],
+        'show_progress': {slug: asdict(progress) for slug, progress in classification.progress.items()},
+        'outputs': {name: [asdict(row) for row in rows] for name, rows in outputs.items()}
+    }
+    for category, items in lists.items():
+        new_snapshot[category] = [asdict(item) for item in items]
+    save_snapshot(new_snapshot, snapshot_path)
+
+    report_run()
@@ -0,0 +1,179 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Type, TypeVar
+import json
+import logging
+import os
+import threading
+import time
+
+from scripts.models.parsers import get_decoder
+
+# Where a run logs the units of work it finished, in the output directory. Empty disables the journal
+JOURNAL_PATH = os.getenv('TRAKT_JOURNAL_PATH', '.trakt_journal.jsonl')
+
+# Seconds between fsyncs of the journal. Every unit is flushed as it finishes, so a killed run loses
+# nothing, a crash of the whole machine at most the units of the last interval
+JOURNAL_SYNC_INTERVAL = float(os.getenv('TRAKT_JOURNAL_SYNC_INTERVAL', 1.0))
+
+JOURNAL_VERSION = 1
+
+T = TypeVar('T')
+
+class RunJournal:
+    """
+    Append-only log of the units of work (a list fetch, one show's progress, one title's ratings) finished by an
+    export run, one JSON line each with the unit's parsed response.
+
+    A resumed run reads the units back instead of fetching them again. The lists come from the journal too, so
+    the titles it goes on to fetch, and the exported rows, are the same as if the first run had not stopped.
+    Units that failed (None) are not logged and are fetched again.
+    """
+
+    def __init__(self, path: str, settings: Dict[str, Any], resume: bool = False):
+        self.path = path
+        self.settings = settings
+        self.resumed = 0  # Units read back from the journal instead of fetched
+        self._units: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._synced_at = time.monotonic()
+
+        size = self._load() if resume else None
+        if size is None:
+            self._file = open(path, 'w', encoding='utf-8')
+            self._append({'journal': JOURNAL_VERSION, 'settings': settings})
+        else:
+            self._file = open(path, 'r+', encoding='utf-8')
+            # Drops a line cut short by the interrupted run
+            self._file.seek(size)
+            self._file.truncate()
+
+    def _load(self) -> Optional[int]:
+        """
+        Reads the units logged by an earlier run with the same settings and returns the size of its complete lines,
+        or None when there is nothing to resume.
+        """
+        if not os.path.exists(self.path):
+            logging.info(f"No run journal at {self.path}, starting a new export.")
+            return None
+
+        size = 0
+        with open(self.path, 'rb') as journal_file:
+            for line_number, line in enumerate(journal_file):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                if line_number == 0 and (record.get('journal') != JOURNAL_VERSION or record.get('settings') != self.settings):
+                    logging.warning(f"Run journal {self.path} was written with other settings, starting a new export.")
+                    return None
+                if line_number > 0:
+                    self._units[record['unit']] = record['data']
+                size += len(line)
+
+        if size == 0:
+            return None
+        logging.info(f"Resuming the export from {self.path}: {len(self._units)} units already done.")
+        return size
+
+    def _append(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._file.flush()
+        now = time.monotonic()
+        if now - self._synced_at >= JOURNAL_SYNC_INTERVAL:
+            os.fsync(self._file.fileno())
+            self._synced_at = now
+
+    def get(self, unit: str, model_type: Type) -> Optional[Any]:
+        """
+        Returns a unit's result logged by the run being resumed, parsed into model_type (a list of it for lists).
+        """
+        data = self._units.get(unit)
+        if data is None:
+            return None
+        decoder = get_decoder(model_type)
+        with self._lock:
+            self.resumed += 1
+        return [decoder(item) for item in data] if isinstance(data, list) else decoder(data)
+
+    def record(self, unit: str, result: Any):
+        if result is None:
+            return
+        data = [asdict(item) for item in result] if isinstance(result, list) else asdict(result)
+        with self._lock:
+            self._units[unit] = data
+            self._append({'unit': unit, 'data': data})
+
+    def close(self, completed: bool):
+        """
+        Closes the journal. A completed run removes it, there is nothing left to resume.
+        """
+        with self._lock:
+            os.fsync(self._file.fileno())
+            self._file.close()
+        if self.resumed:
+            logging.info(f"Resumed {self.resumed} units from {self.path} instead of fetching them.")
+        if completed:
+            os.remove(self.path)
+        elif self._units:
+            logging.error(f"The export stopped early, run it again with --resume to continue from {self.path}.")
+
+# Journal of the running export, None when journaling is disabled (see open_journal)
+run_journal: ContextVar[Optional[RunJournal]] = ContextVar('run_journal', default=None)
+
+@contextmanager
+def open_journal(path: str, settings: Dict[str, Any], resume: bool = False) -> Iterator[Optional[RunJournal]]:
+    """
+    Journals the units of the export run inside the block to path, resuming its earlier run when resume is set.
+    The journal is removed when the block finishes without an error and kept for --resume otherwise.
+    """
+    if not path:
+        yield None
+        return
+
+    journal = RunJournal(path, settings, resume)
+    token = run_journal.set(journal)
+    completed = False
+    try:
+        yield journal
+        completed = True
+    finally:
+        run_journal.reset(token)
+        journal.close(completed)
+
+def journaled(unit: str, model_type: Type, fetch_fn: Callable[..., Optional[T]], *args: Any) -> Optional[T]:
+    """
+    Returns fetch_fn(*args), from the run journal when the unit was finished by the run being resumed.
+    """
+    journal = run_journal.get()
+    if journal is None:
+        return fetch_fn(*args)
+
+    result = journal.get(unit, model_type)
+    if result is None:
+        result = fetch_fn(*args)
+        journal.record(unit, result)
+    return result
+
+def journaled_by_id(kind: str, model_type: Type, fetch_fn: Callable[[str], Optional[T]]) -> Callable[[str], Optional[T]]:
+    """
+    Wraps a per-title fetch function (such as fetch_show_ratings) so every call is journaled as the unit kind:id.
+    """
+    return lambda item_id: journaled(f"{kind}:{item_id}", model_type, fetch_fn, item_id)
+
+async def journaled_async(unit: str, model_type: Type, fetch_fn: Callable[..., Awaitable[Optional[T]]], *args: Any) -> Optional[T]:
+    """
+    Async version of journaled.
+    """
+    journal = run_journal.get()
+    if journal is None:
+        return await fetch_fn(*args)
+
+    result = journal.get(unit, model_type)
+    if result is None:
+        result = await fetch_fn(*args)
+        journal.record(unit, result)
+    return result
@@ -0,0 +1,192 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List
+import json
+import re
+import threading
+import time
+
+from scripts.writers import atomic_path
+
+# Upper bounds in seconds of the request latency histogram buckets, the last bucket is +Inf
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+@dataclass
+class EndpointMetrics:
+    requests: int = 0  # HTTP requests sent, retries included
+    status_codes: Dict[int, int] = field(default_factory=dict)
+    latency_buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    latency_sum: float = 0.0
+    latency_max: float = 0.0
+    bytes_received: int = 0
+    retries: int = 0  # Requests retried after a 429, a 5xx or a connection error
+    rate_limited_seconds: float = 0.0  # Time spent waiting for the rate limiter and retry backoff, summed over concurrent callers
+    cache_hits: int = 0  # Served from the response cache without a request
+    coalesced: int = 0  # Shared the result of the same request in flight or made earlier in the run
+
+    def observe(self, status_code: int, seconds: float, size: int):
+        self.requests += 1
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+        self.latency_buckets[next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))] += 1
+        self.latency_sum += seconds
+        self.latency_max = max(self.latency_max, seconds)
+        self.bytes_received += size
+
+    def summary(self) -> Dict[str, Any]:
+        bounds = [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+        return {
+            'requests': self.requests,
+            'status_codes': {str(status): count for status, count in sorted(self.status_codes.items())},
+            'latency_seconds': {
+                'buckets': dict(zip(bounds, self.latency_buckets)),
+                'mean': round(self.latency_sum / self.requests, 6) if self.requests else None,
+                'max': round(self.latency_max, 6),
+                'sum': round(self.latency_sum, 6)
+            },
+            'bytes_received': self.bytes_received,
+            'retries': self.retries,
+            'rate_limited_seconds': round(self.rate_limited_seconds, 3),
+            'cache_hits': self.cache_hits,
+            'coalesced': self.coalesced
+        }
+
+class Metrics:
+    """
+    Request metrics per endpoint template and wall time per pipeline stage, shared by every thread and
+    the async client. Written out at the end of a run with write_json and write_prometheus.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.endpoints: Dict[str, EndpointMetrics] = {}
+            self.stages: Dict[str, float] = {}
+            self.started_at = time.time()
+
+    def _endpoint(self, endpoint: str) -> EndpointMetrics:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = EndpointMetrics()
+        return self.endpoints[endpoint]
+
+    def record_request(self, endpoint: str, status_code: int, seconds: float, size: int):
+        with self._lock:
+            self._endpoint(endpoint).observe(status_code, seconds, size)
+
+    def record_retry(self, endpoint: str):
+        with self._lock:
+            self._endpoint(endpoint).retries += 1
+
+    def record_rate_limit_wait(self, endpoint: str, seconds: float):
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._endpoint(endpoint).rate_limited_seconds += seconds
+
+    def record_cache_hit(self, endpoint: str):
+        with self._lock:
+            self._endpoint(endpoint).cache_hits += 1
+
+    def record_coalesced(self, endpoint: str):
+        with self._lock:
+            self._endpoint(endpoint).coalesced += 1
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Adds the wall time of the block to the named pipeline stage. Stages running concurrently
+        (the async pipeline) each count their full time.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {endpoint: metrics.summary() for endpoint, metrics in sorted(self.endpoints.items())}
+            stages = {name: round(seconds, 3) for name, seconds in self.stages.items()}
+            elapsed = time.time() - self.started_at
+
+        return {
+            'duration_seconds': round(elapsed, 3),
+            'totals': {
+                key: sum(endpoint[key] for endpoint in endpoints.values())
+                for key in ('requests', 'bytes_received', 'retries', 'cache_hits', 'coalesced')
+            },
+            'endpoints': endpoints,
+            'stages': stages
+        }
+
+    def write_json(self, path: str):
+        with atomic_path(path) as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as json_file:
+                json.dump(self.summary(), json_file, indent=2)
+
+    def write_prometheus(self, path: str):
+        """
+        Writes the metrics in the Prometheus text format, for the node exporter's textfile collector.
+        The file is replaced atomically so the collector never reads half of it.
+        """
+        with atomic_path(path) as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as prometheus_file:
+                prometheus_file.write(self.prometheus_text())
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            return render_prometheus(self.endpoints, self.stages)
+
+def render_prometheus(endpoint_metrics: Dict[str, EndpointMetrics], stage_seconds: Dict[str, float]) -> str:
+    endpoints = sorted(endpoint_metrics.items())
+    stages = sorted(stage_seconds.items())
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    family('trakt_requests_total', 'counter', 'HTTP requests sent to the Trakt API, retries included.')
+    for endpoint, metrics in endpoints:
+        for status_code, count in sorted(metrics.status_codes.items()):
+            lines.append(f'trakt_requests_total{{endpoint="{escape_label(endpoint)}",status="{status_code}"}} {count}')
+
+    family('trakt_request_duration_seconds', 'histogram', 'Trakt API request latency.')
+    for endpoint, metrics in endpoints:
+        label = f'endpoint="{escape_label(endpoint)}"'
+        cumulative = 0
+        for bound, count in zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], metrics.latency_buckets):
+            cumulative += count
+            lines.append(f'trakt_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'trakt_request_duration_seconds_sum{{{label}}} {format_number(metrics.latency_sum)}')
+        lines.append(f'trakt_request_duration_seconds_count{{{label}}} {metrics.requests}')
+
+    for name, attribute, kind, help_text in (
+        ('trakt_response_bytes_total', 'bytes_received', 'counter', 'Response body bytes received from the Trakt API.'),
+        ('trakt_request_retries_total', 'retries', 'counter', 'Requests retried after a 429, a 5xx or a connection error.'),
+        ('trakt_rate_limited_seconds_total', 'rate_limited_seconds', 'counter', 'Seconds spent waiting for the rate limiter and retry backoff, summed over concurrent callers.'),
+        ('trakt_cache_hits_total', 'cache_hits', 'counter', 'Responses served from the response cache without a request.'),
+        ('trakt_coalesced_requests_total', 'coalesced', 'counter', 'Requests that shared the result of an identical request in flight or made earlier in the run.')
+    ):
+        family(name, kind, help_text)
+        for endpoint, metrics in endpoints:
+            lines.append(f'{name}{{endpoint="{escape_label(endpoint)}"}} {format_number(getattr(metrics, attribute))}')
+
+    family('trakt_stage_duration_seconds', 'gauge', 'Wall time of each export stage in the last run.')
+    for name, seconds in stages:
+        lines.append(f'trakt_stage_duration_seconds{{stage="{escape_label(name)}"}} {format_number(seconds)}')
+
+    return '\n'.join(lines) + '\n'
+
+def escape_label(value: str) -> str:
+    return re.sub(r'(["\\])', r'\\\1', value).replace('\n', '\\n')
+
+def format_number(value: float) -> str:
+    return repr(round(value, 6)) if isinstance(value, float) else str(value)
+
+# Shared by scripts.api, scripts.api_async and the pipelines
+metrics = Metrics()
@@ -1,5 +1,5 @@
 from typing import Dict, List, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 @dataclass
 class ShowIds:
@@ -52,6 +52,8 @@ class Show:
     title: str
     year: int
     ids: ShowIds
+    rating: Optional[float] = None  # Only included with ?extended=full
+    votes: Optional[int] = None
 
 @dataclass
 class ShowDetails:
@@ -84,7 +86,7 @@ class WatchedShow:
     last_updated_at: Optional[str]  # ISO 8601 timestamp
     reset_at: Optional[str]  # Can be null, so Optional
     show: Show
-    seasons: List[Season]
+    seasons: List[Season] = field(default_factory=list)  # Empty when fetched with extended=noseasons
 
 @dataclass
 class WatchlistShow:
@@ -133,6 +135,8 @@ class Movie:
     title: str
     year: int
     ids: MovieIds
+    rating: Optional[float] = None  # Only included with ?extended=full
+    votes: Optional[int] = None
 
 @dataclass
 class WatchedMovie:
@@ -148,4 +152,21 @@ class WatchlistMovie:
     listed_at: str  # ISO 8601 timestamp (e.g., "2014-09-01T09:10:11.000Z")
     notes: Optional[str]
     type: str  # This will be "movie" based on the response
-    movie: Movie
\ No newline at end of file
+    movie: Movie
+
+@dataclass
+class LastActivities:
+    all: str  # ISO 8601 timestamp of the most recent activity of any kind
+    movies: Dict[str, Optional[str]]  # e.g., {"watched_at": "...", "watchlisted_at": "..."}
+    episodes: Dict[str, Optional[str]]
+    shows: Dict[str, Optional[str]]
+
+@dataclass
+class HistoryItem:
+    id: int  # History id, unique per play
+    watched_at: str  # ISO 8601 timestamp
+    action: str  # scrobble, checkin or watch
+    type: str  # episode or movie
+    episode: Optional[EpisodeSummary] = None  # Only for episodes, with the show in show
+    show: Optional[Show] = None
+    movie: Optional[Movie] = None  # Only for movies
@@ -1,14 +1,49 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
+# Fields after the first three belong to an optional column group, only exported when the group is enabled
+# (TRAKT_EXPORT_RICH_FIELDS, TRAKT_PROGRESS_ANALYTICS). The default CSVs keep their original three columns
+RICH = {'group': 'rich'}
+
+# release_date holds the year, the columnar exports store it as an integer instead of a string
+YEAR = {'columnar_type': int}
+
+# ISO 8601 timestamps, stored as UTC timestamps by the columnar exports
+TIMESTAMP = {'group': 'rich', 'columnar_type': 'timestamp'}
+
+# Computed from the show's watch progress by scripts/analytics.py
+PROGRESS = {'group': 'progress'}
+
 @dataclass
 class ShowCSV:
     title: str
-    release_date: Optional[str]  # Optional, in case the release date is not available
+    release_date: Optional[str] = field(metadata=YEAR)  # Optional, in case the release date is not available
     rating: Optional[float]  # Optional, in case the rating is not available
+    votes: Optional[int] = field(default=None, metadata=RICH)
+    trakt_id: Optional[int] = field(default=None, metadata=RICH)
+    slug: Optional[str] = field(default=None, metadata=RICH)
+    imdb: Optional[str] = field(default=None, metadata=RICH)
+    tmdb: Optional[int] = field(default=None, metadata=RICH)
+    tvdb: Optional[int] = field(default=None, metadata=RICH)
+    plays: Optional[int] = field(default=None, metadata=RICH)  # Watched episodes, empty for watchlist shows
+    last_watched_at: Optional[str] = field(default=None, metadata=TIMESTAMP)
+    listed_at: Optional[str] = field(default=None, metadata=TIMESTAMP)  # When the show was added to the watchlist
+    completion_ratio: Optional[float] = field(default=None, metadata=PROGRESS)  # Watched share of the aired episodes
+    episodes_remaining: Optional[int] = field(default=None, metadata=PROGRESS)
+    next_episode: Optional[str] = field(default=None, metadata=PROGRESS)  # e.g. S02E05
+    days_since_last_watched: Optional[float] = field(default=None, metadata=PROGRESS)
+    estimated_finish_date: Optional[str] = field(default=None, metadata={'group': 'progress', 'columnar_type': 'date'})  # At the pace the show has been watched so far
 
 @dataclass
 class MovieCSV:
     title: str
-    release_date: Optional[str]  # Optional, in case the release date is not available
+    release_date: Optional[str] = field(metadata=YEAR)  # Optional, in case the release date is not available
     rating: Optional[float]  # Optional, in case the rating is not available
+    votes: Optional[int] = field(default=None, metadata=RICH)
+    trakt_id: Optional[int] = field(default=None, metadata=RICH)
+    slug: Optional[str] = field(default=None, metadata=RICH)
+    imdb: Optional[str] = field(default=None, metadata=RICH)
+    tmdb: Optional[int] = field(default=None, metadata=RICH)
+    plays: Optional[int] = field(default=None, metadata=RICH)
+    last_watched_at: Optional[str] = field(default=None, metadata=TIMESTAMP)
+    listed_at: Optional[str] = field(default=None, metadata=TIMESTAMP)  # When the movie was added to the watchlist
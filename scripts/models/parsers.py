@@ -0,0 +1,94 @@
+from dataclasses import MISSING, fields, is_dataclass
+from typing import Any, Callable, Dict, List, Union, get_args, get_origin, get_type_hints
+import threading
+
+Decoder = Callable[[Any], Any]
+
+# One decoder per type, built on first use and shared by every caller afterwards
+_decoders: Dict[Any, Decoder] = {}
+_decoders_lock = threading.RLock()  # Re-entrant, building a decoder builds the decoders of its fields
+
+def identity(value: Any) -> Any:
+    return value
+
+def get_decoder(tp: Any) -> Decoder:
+    """
+    Returns the cached decode function turning JSON data (dicts, lists and scalars) into values of type tp.
+    """
+    decoder = _decoders.get(tp)
+    if decoder is None:
+        with _decoders_lock:
+            decoder = _decoders.get(tp)
+            if decoder is None:
+                decoder = build_decoder(tp)
+                _decoders[tp] = decoder
+    return decoder
+
+def build_decoder(tp: Any) -> Decoder:
+    """
+    Builds the decode function for a type: dataclasses, Optional[X], List[X] and plain JSON types.
+    """
+    origin = get_origin(tp)
+
+    if origin is Union:
+        members = [arg for arg in get_args(tp) if arg is not type(None)]
+        if len(members) != 1:
+            return identity
+        inner = get_decoder(members[0])
+        if inner is identity:
+            return identity
+        return lambda value: None if value is None else inner(value)
+
+    if origin in (list, List):
+        args = get_args(tp)
+        item = get_decoder(args[0]) if args else identity
+        if item is identity:
+            return identity
+        return lambda value: None if value is None else [item(element) for element in value]
+
+    if is_dataclass(tp):
+        return build_dataclass_decoder(tp)
+
+    return identity
+
+def build_dataclass_decoder(model_type: type) -> Decoder:
+    """
+    Generates a decode function specialised to one dataclass. Field lookups and nested decoders are resolved
+    once here instead of on every object. Unknown keys are dropped, missing Optional fields default to None
+    and a missing required field raises TypeError like calling the dataclass would.
+    """
+    hints = get_type_hints(model_type)
+    namespace: Dict[str, Any] = {'model_type': model_type}
+    arguments = []
+
+    for field in fields(model_type):
+        tp = hints[field.name]
+        decoder = get_decoder(tp)
+        optional = get_origin(tp) is Union and type(None) in get_args(tp)
+
+        if field.default_factory is not MISSING:
+            namespace[f'factory_{field.name}'] = field.default_factory
+            value = f"(data[{field.name!r}] if {field.name!r} in data else factory_{field.name}())"
+        elif field.default is not MISSING or optional:
+            namespace[f'default_{field.name}'] = None if field.default is MISSING else field.default
+            value = f"data.get({field.name!r}, default_{field.name})"
+        else:
+            value = f"data[{field.name!r}]"
+
+        if decoder is not identity:
+            namespace[f'decode_{field.name}'] = decoder
+            value = f"decode_{field.name}({value})"
+
+        arguments.append(f"{field.name}={value}")
+
+    source = (
+        f"def decode_{model_type.__name__}(data):\n"
+        f"    if data.__class__ is not dict:\n"
+        f"        return data\n"
+        f"    try:\n"
+        f"        return model_type({', '.join(arguments)})\n"
+        f"    except KeyError as e:\n"
+        f"        raise TypeError(f'{model_type.__name__} is missing required field {{e}}') from None\n"
+    )
+    exec(source, namespace)
+    return namespace[f'decode_{model_type.__name__}']
@@ -0,0 +1,87 @@
+from typing import Mapping
+import json
+import logging
+import random
+import threading
+import time
+
+class RateLimiter:
+    """
+    Token bucket shared by every caller, threads and event loops alike.
+
+    Callers reserve a token before each request and wait for the returned number of seconds.
+    The bucket is sized just under Trakt's limit and is corrected from the X-Ratelimit and
+    Retry-After headers of each response.
+    """
+
+    def __init__(self, limit: int, period: float, headroom: float):
+        self.headroom = headroom
+        self._lock = threading.Lock()
+        self._configure(limit, period)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+
+    def _configure(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self.capacity = max(1.0, limit * self.headroom)
+        self.rate = self.capacity / period  # Tokens added per second
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns the seconds the caller has to wait before sending its request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(0.0, self._paused_until - now)
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    def pause(self, seconds: float):
+        """
+        Stops every caller from sending requests for the given number of seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            self._paused_until = max(self._paused_until, now + seconds)
+
+    def update(self, headers: Mapping[str, str]):
+        """
+        Adjusts the bucket to the limit and remaining calls reported in Trakt's X-Ratelimit header.
+        """
+        header = headers.get('X-Ratelimit')
+        if not header:
+            return
+
+        try:
+            rate_limit = json.loads(header)
+            limit = int(rate_limit['limit'])
+            period = float(rate_limit['period'])
+            remaining = int(rate_limit['remaining'])
+        except (ValueError, KeyError, TypeError) as e:
+            logging.debug(f"Ignoring unreadable X-Ratelimit header {header}: {e}")
+            return
+
+        with self._lock:
+            if limit != self.limit or period != self.period:
+                logging.info(f"Trakt rate limit is {limit} calls per {period} seconds")
+                self._configure(limit, period)
+            self._refill(time.monotonic())
+            # Never allow more calls than the server says are left, minus the headroom
+            self._tokens = min(self._tokens, remaining - (limit - self.capacity))
+
+def retry_backoff(attempt: int, base: float, cap: float) -> float:
+    """
+    Returns a jittered exponential backoff delay in seconds for the given retry attempt (0 based).
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
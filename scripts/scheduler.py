@@ -0,0 +1,204 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, Tuple, TypeVar
+import contextvars
+import logging
+import queue
+import threading
+import time
+
+from scripts.metrics import metrics
+
+T = TypeVar('T')
+
+_CLOSED = object()
+
+class Channel(Generic[T]):
+    """
+    Streams items from the stages writing to it (its producers) to the stage iterating over it, while they run.
+    The scheduler closes the channel once every producer has finished, which ends the iteration.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._queue: 'queue.Queue[Any]' = queue.Queue()
+        self._producers = 0
+        self._lock = threading.Lock()
+
+    def add_producer(self):
+        with self._lock:
+            self._producers += 1
+
+    def put(self, item: T):
+        self._queue.put(item)
+
+    def close(self):
+        """
+        Called by the scheduler when one of the producers finished.
+        """
+        with self._lock:
+            self._producers -= 1
+            if self._producers == 0:
+                self._queue.put(_CLOSED)
+
+    def __iter__(self) -> Iterator[T]:
+        while True:
+            item = self._queue.get()
+            if item is _CLOSED:
+                return
+            yield item
+
+@dataclass
+class Stage:
+    """
+    A unit of the pipeline. run is called with the results of the stages in after, once they have all finished.
+    Stages listed in streams_from are not waited for, the stage consumes a channel they write to while they run.
+    """
+    name: str
+    run: Callable[[Dict[str, Any]], Any]
+    after: Tuple[str, ...] = ()
+    streams_from: Tuple[str, ...] = ()
+    outputs: Tuple[Channel, ...] = ()  # Channels this stage writes to, closed by the scheduler when it finishes
+
+@dataclass
+class StageTiming:
+    started: float  # Seconds since the pipeline started
+    finished: float
+
+    @property
+    def seconds(self) -> float:
+        return self.finished - self.started
+
+@dataclass
+class PipelineRun:
+    results: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, StageTiming] = field(default_factory=dict)
+    critical_path: List[str] = field(default_factory=list)
+
+class StageScheduler:
+    """
+    Runs a DAG of stages, each on its own thread as soon as the stages it depends on have finished,
+    so independent branches (the shows and the movies) run concurrently. Stages connected by a Channel
+    run at the same time, the consumer working on the first items while the producer is still going.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names have to be unique")
+        for stage in stages:
+            unknown = [name for name in stage.after + stage.streams_from if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages {unknown}")
+        self.order = self.topological_order()
+
+    def topological_order(self) -> List[str]:
+        order: List[str] = []
+        visiting = set()
+
+        def visit(name: str):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage {name} is part of a dependency cycle")
+            visiting.add(name)
+            stage = self.stages[name]
+            for dependency in stage.after + stage.streams_from:
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def run(self) -> PipelineRun:
+        """
+        Runs every stage and returns their results and timings. If a stage fails, the stages depending on it
+        are skipped, the running ones are waited for and the first error is raised.
+        """
+        pipeline = PipelineRun()
+        for stage in self.stages.values():
+            for channel in stage.outputs:
+                channel.add_producer()
+
+        start = time.perf_counter()
+        pending = list(self.order)
+        running: Dict[Future, str] = {}
+        error: Optional[BaseException] = None
+
+        def run_stage(stage: Stage, inputs: Dict[str, Any]) -> Any:
+            started = time.perf_counter() - start
+            try:
+                with metrics.stage(stage.name):
+                    return stage.run(inputs)
+            finally:
+                pipeline.timings[stage.name] = StageTiming(started, time.perf_counter() - start)
+                for channel in stage.outputs:
+                    channel.close()
+
+        with ThreadPoolExecutor(max_workers=len(self.stages), thread_name_prefix='stage') as executor:
+            while pending or running:
+                if error is None:
+                    for name in [name for name in pending if all(dependency in pipeline.results for dependency in self.stages[name].after)]:
+                        pending.remove(name)
+                        stage = self.stages[name]
+                        inputs = {dependency: pipeline.results[dependency] for dependency in stage.after}
+                        # Each stage runs in a copy of the caller's context (the account, the run journal)
+                        context = contextvars.copy_context()
+                        running[executor.submit(context.run, run_stage, stage, inputs)] = name
+                else:
+                    # Skipped stages never produce, so the stages consuming their channels are not left waiting
+                    for name in pending:
+                        for channel in self.stages[name].outputs:
+                            channel.close()
+                    pending = []
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        pipeline.results[name] = future.result()
+                    except BaseException as e:
+                        logging.error(f"Pipeline stage {name} failed: {e}")
+                        error = error or e
+
+        if error is not None:
+            raise error
+
+        pipeline.critical_path = self.critical_path(pipeline.timings)
+        return pipeline
+
+    def critical_path(self, timings: Dict[str, StageTiming]) -> List[str]:
+        """
+        Returns the chain of stages that decided the pipeline's wall time: starting from the stage that finished
+        last, each step goes back to the dependency (waited for or streamed from) that finished last.
+        """
+        if not timings:
+            return []
+        name = max(timings, key=lambda stage_name: timings[stage_name].finished)
+        path = [name]
+        while True:
+            stage = self.stages[name]
+            dependencies = [dependency for dependency in stage.after + stage.streams_from if dependency in timings]
+            if not dependencies:
+                break
+            name = max(dependencies, key=lambda dependency: timings[dependency].finished)
+            path.append(name)
+        return list(reversed(path))
+
+def format_report(pipeline: PipelineRun) -> str:
+    """
+    Formats the per-stage timings, in start order, and the critical path of a pipeline run.
+    """
+    lines = [f"{'stage':<20} {'start':>8} {'end':>8} {'seconds':>8}"]
+    for name, timing in sorted(pipeline.timings.items(), key=lambda item: (item[1].started, item[0])):
+        lines.append(f"{name:<20} {timing.started:8.3f} {timing.finished:8.3f} {timing.seconds:8.3f}")
+
+    if pipeline.critical_path:
+        total = pipeline.timings[pipeline.critical_path[-1]].finished
+        steps = ' -> '.join(f"{name} ({pipeline.timings[name].seconds:.3f}s)" for name in pipeline.critical_path)
+        lines.append(f"critical path ({total:.3f}s): {steps}")
+    return '\n'.join(lines)
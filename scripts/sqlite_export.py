@@ -0,0 +1,219 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Sequence, Union
+import sqlite3
+
+from scripts.models.models_api import ShowProgress
+from scripts.models.models_csv import MovieCSV, ShowCSV
+from scripts.writers import to_float, to_int
+
+# Bumped whenever a table changes, older export databases are rebuilt from scratch
+SCHEMA_VERSION = 1
+
+# Seconds a process waits for another process to finish writing before giving up
+BUSY_TIMEOUT = 30
+
+# Rows written per transaction, so a large library neither holds the write lock for long nor commits row by row
+BATCH_SIZE = 500
+
+TABLES = ['shows', 'movies', 'ratings', 'watch_state', 'progress']
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS shows (
+        trakt_id INTEGER PRIMARY KEY,
+        slug TEXT,
+        title TEXT,
+        year INTEGER,
+        imdb TEXT,
+        tmdb INTEGER,
+        tvdb INTEGER,
+        updated_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS movies (
+        trakt_id INTEGER PRIMARY KEY,
+        slug TEXT,
+        title TEXT,
+        year INTEGER,
+        imdb TEXT,
+        tmdb INTEGER,
+        updated_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ratings (
+        kind TEXT NOT NULL,  -- show or movie
+        trakt_id INTEGER NOT NULL,
+        rating REAL,
+        votes INTEGER,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (kind, trakt_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS watch_state (
+        list TEXT NOT NULL,  -- The export the title is in: watchlist_shows, watched_shows, watched_movies or watchlist_movies
+        trakt_id INTEGER NOT NULL,
+        plays INTEGER,
+        last_watched_at TEXT,
+        listed_at TEXT,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (list, trakt_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS progress (
+        trakt_id INTEGER PRIMARY KEY,
+        aired INTEGER,
+        completed INTEGER,
+        last_watched_at TEXT,
+        reset_at TEXT,
+        next_season INTEGER,
+        next_episode INTEGER,
+        updated_at TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS shows_year ON shows (year)",
+    "CREATE INDEX IF NOT EXISTS movies_year ON movies (year)",
+    "CREATE INDEX IF NOT EXISTS ratings_rating ON ratings (kind, rating)",
+    "CREATE INDEX IF NOT EXISTS watch_state_last_watched_at ON watch_state (last_watched_at)",
+    "CREATE INDEX IF NOT EXISTS progress_last_watched_at ON progress (last_watched_at)"
+]
+
+@dataclass
+class ExportStats:
+    written: int = 0  # Rows inserted or changed
+    unchanged: int = 0  # Rows already stored with the same values, left untouched
+    deleted: int = 0  # Titles no longer in a list
+
+    def __str__(self) -> str:
+        return f"written={self.written} unchanged={self.unchanged} deleted={self.deleted}"
+
+class SqliteExport:
+    """
+    Indexed SQLite export of the titles, ratings, watch state and show progress, keyed by Trakt id.
+
+    Every run upserts the rows of the CSV exports, but only rows whose values changed are rewritten, so the
+    database can be queried (and copied or synced) instead of reparsing four CSVs. Titles and ratings are kept
+    once they have been exported. A list's watch state only holds the titles that were in the list on the last run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stats = ExportStats()
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        with self._transaction():
+            if self._connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                for table in TABLES:
+                    self._connection.execute(f"DROP TABLE IF EXISTS {table}")
+                self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            for statement in SCHEMA:
+                self._connection.execute(statement)
+
+    def __enter__(self) -> 'SqliteExport':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """
+        Runs the block as one write transaction, see CatalogStore._transaction.
+        """
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def upsert(self, table: str, keys: Sequence[str], rows: List[Dict[str, Any]]):
+        """
+        Inserts the rows, or updates the stored ones that differ, in transactions of BATCH_SIZE rows.
+        updated_at is only moved for rows that changed.
+        """
+        if not rows:
+            return
+
+        columns = list(rows[0])
+        values = [column for column in columns if column not in keys]
+        changed = ' OR '.join(f"{column} IS NOT excluded.{column}" for column in values)
+        statement = f"""
+            INSERT INTO {table} ({', '.join(columns)}, updated_at) VALUES ({', '.join('?' * len(columns))}, ?)
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {', '.join(f"{column} = excluded.{column}" for column in values + ['updated_at'])}
+            WHERE {changed}
+        """
+        updated_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            with self._transaction():
+                before = self._connection.total_changes
+                self._connection.executemany(statement, [[row[column] for column in columns] + [updated_at] for row in batch])
+                written = self._connection.total_changes - before
+            self.stats.written += written
+            self.stats.unchanged += len(batch) - written
+
+    def save_rows(self, name: str, rows: List[Union[ShowCSV, MovieCSV]]):
+        """
+        Upserts the titles, ratings and watch state of one export (e.g. watched_shows), and removes the watch state
+        of titles that are no longer in it.
+        """
+        kind = 'show' if 'shows' in name else 'movie'
+        rows = [row for row in rows if row.trakt_id is not None]
+
+        titles = []
+        for row in rows:
+            title = {'trakt_id': row.trakt_id, 'slug': row.slug, 'title': row.title, 'year': to_int(row.release_date), 'imdb': row.imdb, 'tmdb': row.tmdb}
+            if kind == 'show':
+                title['tvdb'] = row.tvdb
+            titles.append(title)
+        self.upsert(f"{kind}s", ['trakt_id'], titles)
+
+        self.upsert('ratings', ['kind', 'trakt_id'], [
+            {'kind': kind, 'trakt_id': row.trakt_id, 'rating': to_float(row.rating), 'votes': row.votes}
+            for row in rows if to_float(row.rating) is not None
+        ])
+
+        self.upsert('watch_state', ['list', 'trakt_id'], [
+            {'list': name, 'trakt_id': row.trakt_id, 'plays': row.plays, 'last_watched_at': row.last_watched_at, 'listed_at': row.listed_at}
+            for row in rows
+        ])
+
+        current = {row.trakt_id for row in rows}
+        stored = {trakt_id for trakt_id, in self._connection.execute("SELECT trakt_id FROM watch_state WHERE list = ?", (name,))}
+        removed = sorted(stored - current)
+        for start in range(0, len(removed), BATCH_SIZE):
+            with self._transaction():
+                self._connection.executemany("DELETE FROM watch_state WHERE list = ? AND trakt_id = ?", [(name, trakt_id) for trakt_id in removed[start:start + BATCH_SIZE]])
+        self.stats.deleted += len(removed)
+
+    def save_progress(self, progress: Dict[int, ShowProgress]):
+        """
+        Upserts the watch progress of shows, keyed by the show's Trakt id.
+        """
+        self.upsert('progress', ['trakt_id'], [
+            {
+                'trakt_id': trakt_id,
+                'aired': show_progress.aired,
+                'completed': show_progress.completed,
+                'last_watched_at': show_progress.last_watched_at,
+                'reset_at': show_progress.reset_at,
+                'next_season': show_progress.next_episode.season if show_progress.next_episode else None,
+                'next_episode': show_progress.next_episode.number if show_progress.next_episode else None
+            }
+            for trakt_id, show_progress in progress.items()
+        ])
+
+    def query(self, sql: str, parameters: Sequence[Any] = ()) -> List[tuple]:
+        return self._connection.execute(sql, parameters).fetchall()
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,2 @@
+# Starts the stub Trakt server and points TRAKT_API_URL at it before pytest imports any export module
+import scripts.tests.stub_api  # noqa: F401
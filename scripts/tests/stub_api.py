@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+from typing import Iterator, Optional
+import os
+import threading
+
+from scripts.benchmarks.library import SyntheticLibrary
+from scripts.benchmarks.stub_server import StubTraktServer
+
+# Serves a small synthetic library on a background thread and points the export at it. Has to be imported
+# before the export modules, they read TRAKT_API_URL at import time (see conftest.py)
+SHOWS = 12
+MOVIES = 30
+
+server = StubTraktServer(SyntheticLibrary(SHOWS, MOVIES))
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+os.environ.update(
+    TRAKT_API_URL=server.url,
+    TRAKT_CLIENT_ID='test',
+    TRAKT_ACCESS_TOKEN='test',
+    TRAKT_CACHE='0',  # Tests that need the response cache open their own, see stub_api
+    TRAKT_CATALOG='0'
+)
+
+@contextmanager
+def stub_api(rate_limit_every: int = 0, error_every: int = 0, cache_path: Optional[str] = None) -> Iterator[StubTraktServer]:
+    """
+    Configures the stub server and resets its counters for one test. The export gets a fresh request coalescer
+    and rate limiter, no retry backoff, and a response cache at cache_path when one is given.
+    """
+    from scripts import api, transport
+    from scripts.cache import ResponseCache
+    from scripts.coalescing import RequestCoalescer
+    from scripts.rate_limit import RateLimiter
+
+    server.rate_limit_every = rate_limit_every
+    server.error_every = error_every
+    server.retry_after = 0
+    server.requests = server.rate_limited = 0
+    server.status_counts = {}
+
+    saved = {name: getattr(api, name) for name in ('RETRY_BACKOFF_BASE', 'CACHE_ENABLED', '_response_cache', '_request_coalescer', 'rate_limiter')}
+    saved_server_backoff = transport.SERVER_RETRY_BACKOFF_BASE
+    api.RETRY_BACKOFF_BASE = transport.SERVER_RETRY_BACKOFF_BASE = 0.0
+    api._request_coalescer = RequestCoalescer(api.MEMO_MAX_ENTRIES)
+    # A 429 empties the bucket, one that refills within a second keeps the retries quick
+    api.rate_limiter = RateLimiter(limit=1000, period=1.0, headroom=1.0)
+    api.CACHE_ENABLED = cache_path is not None
+    api._response_cache = ResponseCache(cache_path, api.CACHE_MAX_BYTES) if cache_path else None
+    try:
+        yield server
+    finally:
+        if api._response_cache:
+            api._response_cache.close()
+        for name, value in saved.items():
+            setattr(api, name, value)
+        transport.SERVER_RETRY_BACKOFF_BASE = saved_server_backoff
+        server.rate_limit_every = server.error_every = 0
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from scripts.tests.stub_api import MOVIES, stub_api
+from scripts import api, api_async
+from scripts.benchmarks.library import SyntheticLibrary
+from scripts.models.models_api import HistoryItem, Ratings, WatchedMovie
+from scripts.rate_limit import RateLimiter
+from scripts.transport import send
+from scripts.urls import MOVIE_RATINGS_URL, SYNC_HISTORY_URL, WATCHED_MOVIES_URL
+
+def ratings_url(index: int) -> str:
+    return MOVIE_RATINGS_URL.format(movie_id=SyntheticLibrary.movie_slug(index))
+
+def test_rate_limiter_buckets():
+    limiter = RateLimiter(limit=10, period=1.0, headroom=1.0)
+    assert [limiter.reserve() for _ in range(10)] == [0.0] * 10
+    assert 0.05 < limiter.reserve() <= 0.1  # The 11th call waits for the next token
+
+    limiter = RateLimiter(limit=10, period=1.0, headroom=1.0)
+    limiter.pause(2.0)
+    assert limiter.reserve() > 1.9
+
+    limiter = RateLimiter(limit=10, period=1.0, headroom=1.0)
+    limiter.update({'X-Ratelimit': '{"name": "UNAUTHED_API_GET_LIMIT", "period": 1, "limit": 10, "remaining": 0}'})
+    assert limiter.reserve() > 0  # The server says nothing is left
+
+def test_requests_are_paced():
+    with stub_api() as server:
+        api.rate_limiter = RateLimiter(limit=5, period=0.5, headroom=1.0)
+        start = time.perf_counter()
+        statuses = [api.get_with_retries(ratings_url(0), api.get_headers()).status_code for _ in range(15)]
+        # 5 requests go out at once, the other 10 at the bucket's 10 per second
+        assert time.perf_counter() - start >= 0.9
+        assert statuses == [200] * 15 and server.requests == 15
+
+def test_rate_limited_requests_are_retried():
+    with stub_api(rate_limit_every=2) as server:
+        assert api.get_with_retries(ratings_url(0), api.get_headers()).status_code == 200
+        assert api.get_with_retries(ratings_url(1), api.get_headers()).status_code == 200
+        assert (server.requests, server.rate_limited) == (3, 1)
+
+    with stub_api(rate_limit_every=1) as server:
+        assert api.get_with_retries(ratings_url(0), api.get_headers()).status_code == 429
+        assert server.requests == api.MAX_RETRIES + 1
+        assert api.fetch_trakt_data(ratings_url(0), Ratings) is None
+
+def test_server_errors_are_retried():
+    with stub_api(error_every=2) as server:
+        assert api.get_with_retries(ratings_url(0), api.get_headers()).status_code == 200
+        assert api.get_with_retries(ratings_url(1), api.get_headers()).status_code == 200
+        assert server.status_counts == {200: 2, 503: 1}
+
+    with stub_api(error_every=1) as server:
+        assert api.get_with_retries(ratings_url(0), api.get_headers()).status_code == 503
+        assert send('GET', ratings_url(0)).status_code == 503
+        assert server.requests == 2 * (api.SERVER_RETRIES + 1)
+
+def test_pages_are_iterated():
+    with stub_api() as server:
+        pages = list(api.iter_numbered_pages(WATCHED_MOVIES_URL, WatchedMovie, limit=7))
+        movies = [movie for _, _, items in pages for movie in items]
+        assert [(page, page_count) for page, page_count, _ in pages] == [(page, len(pages)) for page in range(1, len(pages) + 1)]
+        assert len(pages) > 1 and server.requests == len(pages)
+        assert [movie.movie.ids.slug for movie in movies] == [movie.movie.ids.slug for movie in api.fetch_watched_movies()]
+        assert 0 < len(movies) <= MOVIES
+
+        resumed = list(api.iter_numbered_pages(WATCHED_MOVIES_URL, WatchedMovie, limit=7, first_page=len(pages)))
+        assert [page for page, _, _ in resumed] == [len(pages)]
+
+def test_stale_responses_are_revalidated():
+    with tempfile.TemporaryDirectory() as directory:
+        with stub_api(cache_path=os.path.join(directory, 'cache.sqlite')) as server:
+            first = api.fetch_watched_movies()
+            api.expire_cached_response(api.get_list_url(WATCHED_MOVIES_URL))
+            second = api.fetch_watched_movies()
+
+            assert second == first
+            assert server.status_counts == {200: 1, 304: 1}
+            assert api.get_response_cache().stats.revalidated == 1
+
+def test_history_pages_are_not_cached():
+    with tempfile.TemporaryDirectory() as directory:
+        with stub_api(cache_path=os.path.join(directory, 'cache.sqlite')):
+            assert len(list(api.iter_numbered_pages(SYNC_HISTORY_URL, HistoryItem, limit=20))) > 1
+            api.fetch_watched_movies()
+            assert api.get_response_cache().stats.stores == 1  # Only the watched movies
+
+def test_only_per_title_responses_are_memoized():
+    with stub_api() as server:
+        api.fetch_watched_movies()
+        api.fetch_watched_movies()
+        assert server.requests == 2  # Lists are only shared while in flight
+
+        api.fetch_trakt_data(ratings_url(0), Ratings)
+        api.fetch_trakt_data(ratings_url(0), Ratings)
+        assert server.requests == 3
+
+def test_async_client_matches_the_sync_client():
+    async def fetch_all():
+        try:
+            pages = [page async for page in api_async.iter_numbered_pages(WATCHED_MOVIES_URL, WatchedMovie, limit=7)]
+            history = [page async for page in api_async.iter_history_pages(limit=20)]
+            return pages, history, await api_async.fetch_last_activities(), await api_async.fetch_watched_movies()
+        finally:
+            await api_async.close_session()
+
+    with tempfile.TemporaryDirectory() as directory:
+        with stub_api(cache_path=os.path.join(directory, 'cache.sqlite')):
+            pages, history, activities, watched_movies = asyncio.run(fetch_all())
+            assert pages == list(api.iter_numbered_pages(WATCHED_MOVIES_URL, WatchedMovie, limit=7))
+            assert history == list(api.iter_history_pages(limit=20)) and len(history) > 1
+            assert activities == api.fetch_last_activities() is not None
+            assert watched_movies == api.fetch_watched_movies()
+            assert api.get_response_cache().stats.hits == 1 + len(pages)  # The sync client reads what the async one cached
+
+def test_cache_failures_fall_back_to_the_api():
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError('database is locked')
+
+    with tempfile.TemporaryDirectory() as directory:
+        with stub_api(cache_path=os.path.join(directory, 'cache.sqlite')) as server:
+            cache = api.get_response_cache()
+            cache.put = locked
+            assert len(api.fetch_watched_movies()) > 0  # Fetched, but could not be cached
+
+            cache.get = locked
+            assert api.fetch_trakt_data(ratings_url(0), Ratings) is not None
+            assert server.requests == 2
+
+if __name__ == "__main__":
+    test_rate_limiter_buckets()
+    test_requests_are_paced()
+    test_rate_limited_requests_are_retried()
+    test_server_errors_are_retried()
+    test_pages_are_iterated()
+    test_stale_responses_are_revalidated()
+    test_history_pages_are_not_cached()
+    test_only_per_title_responses_are_memoized()
+    test_async_client_matches_the_sync_client()
+    test_cache_failures_fall_back_to_the_api()
+    print("api client: ok")
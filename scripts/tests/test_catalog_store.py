@@ -0,0 +1,46 @@
+from multiprocessing import Pool
+import os
+import tempfile
+
+from scripts.catalog import CatalogStore
+
+def write_and_read(args):
+    """
+    Worker: stores its own ratings for every title and reads back all of them, like several accounts exporting at once.
+    """
+    path, worker, titles = args
+    catalog = CatalogStore(path)
+    for title in range(titles):
+        catalog.put('show_ratings', f"show-{title}", {'rating': title, 'votes': worker, 'distribution': {}})
+        entry = catalog.get('show_ratings', f"show-{title}")
+        assert entry is not None and entry.data['rating'] == title
+    catalog.close()
+    return worker
+
+def test_concurrent_processes():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'catalog.sqlite')
+        with Pool(4) as pool:
+            workers = pool.map(write_and_read, [(path, worker, 200) for worker in range(8)])
+        assert sorted(workers) == list(range(8))
+
+        catalog = CatalogStore(path)
+        assert all(catalog.get('show_ratings', f"show-{title}") is not None for title in range(200))
+        catalog.close()
+
+def test_newest_fetch_wins():
+    with tempfile.TemporaryDirectory() as directory:
+        catalog = CatalogStore(os.path.join(directory, 'catalog.sqlite'))
+        catalog.put('movie_ratings', 'tron-legacy-2010', {'rating': 7.0}, fetched_at=200.0)
+        catalog.put('movie_ratings', 'tron-legacy-2010', {'rating': 6.0}, fetched_at=100.0)
+        entry = catalog.get('movie_ratings', 'tron-legacy-2010')
+        assert entry.data == {'rating': 7.0} and entry.fetched_at == 200.0
+        assert catalog.get_fresh('movie_ratings', 'tron-legacy-2010', ttl=60) is None
+        assert catalog.get_fresh('movie_ratings', 'missing', ttl=60) is None
+        assert (catalog.stats.stale, catalog.stats.misses) == (1, 1)
+        catalog.close()
+
+if __name__ == "__main__":
+    test_concurrent_processes()
+    test_newest_fetch_wins()
+    print("catalog store: ok")
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.coalescing import RequestCoalescer
+
+def test_concurrent_requests_share_one_fetch():
+    coalescer = RequestCoalescer(max_entries=8)
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        assert release.wait(5)
+        return 'ratings'
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(coalescer.fetch, 'shows/1/ratings', fetch, lambda result: True) for _ in range(4)]
+        while coalescer.stats.fetched + coalescer.stats.joined < 4:
+            pass
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert calls == [1]
+    assert sorted(saved for _, saved in results) == [False, True, True, True]
+    assert coalescer.fetch('shows/1/ratings', fetch, lambda result: True) == ('ratings', True)  # Memoized
+    assert coalescer.stats.saved == 4
+
+def test_memo_is_bounded_and_skips_failures():
+    coalescer = RequestCoalescer(max_entries=2)
+    for key in ('a', 'b', 'c'):
+        coalescer.fetch(key, lambda: key, lambda result: True)
+    assert coalescer.stats.evictions == 1
+    assert coalescer.fetch('a', lambda: 'refetched', lambda result: True) == ('refetched', False)
+
+    coalescer.fetch('failed', lambda: None, lambda result: result is not None)
+    assert coalescer.fetch('failed', lambda: 'retried', lambda result: True) == ('retried', False)
+
+    coalescer.forget('failed')
+    assert coalescer.fetch('failed', lambda: 'expired', lambda result: True) == ('expired', False)
+
+def test_async_tasks_share_one_fetch():
+    coalescer = RequestCoalescer(max_entries=8)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'progress'
+
+    async def run():
+        return await asyncio.gather(*(coalescer.fetch_async('progress/1', fetch, lambda result: False) for _ in range(3)))
+
+    assert [result for result, _ in asyncio.run(run())] == ['progress'] * 3
+    assert calls == [1]
+    assert coalescer.stats.joined == 2 and coalescer.stats.memo_hits == 0
+
+if __name__ == "__main__":
+    test_concurrent_requests_share_one_fetch()
+    test_memo_is_bounded_and_skips_failures()
+    test_async_tasks_share_one_fetch()
+    print("request coalescing: ok")
@@ -0,0 +1,61 @@
+import csv
+import os
+import tempfile
+
+import pytest
+
+from scripts.models.models_csv import MovieCSV
+from scripts.writers import write_arrow, write_csv, write_parquet
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+def make_rows():
+    rows = [
+        MovieCSV(f"Movie {i}", str(1990 + i), None if i % 7 == 0 else round(5 + i % 10 / 2, 1), i * 10, i + 1, f"movie-{i}", None, 300 + i,
+                 plays=i % 3 or None, last_watched_at='2014-10-11T17:00:54.000Z' if i % 2 else None)
+        for i in range(45)
+    ]
+    rows.append(MovieCSV('Unknown year', 'None', '7.5'))
+    return rows
+
+def test_types_and_row_groups():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'movies.parquet')
+        write_parquet(make_rows(), path, groups=['rich'], row_group_size=10)
+        parquet_file = pq.ParquetFile(path)
+        assert parquet_file.num_row_groups == 5 and parquet_file.metadata.num_rows == 46
+
+        schema = parquet_file.schema_arrow
+        assert schema.field('release_date').type == pa.int64()
+        assert schema.field('rating').type == pa.float64()
+        assert schema.field('plays').type == pa.int64()
+        assert schema.field('last_watched_at').type == pa.timestamp('ms', tz='UTC')
+
+        table = parquet_file.read()
+        unknown = next(row for row in table.to_pylist() if row['title'] == 'Unknown year')
+        assert unknown['release_date'] is None and unknown['rating'] == 7.5 and unknown['plays'] is None
+
+def test_same_rows_as_csv():
+    rows = make_rows()
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'movies.csv')
+        arrow_path = os.path.join(directory, 'movies.arrow')
+        write_csv(rows, csv_path)
+        write_arrow(rows, arrow_path, row_group_size=16)
+
+        with open(csv_path, newline='', encoding='utf-8') as csv_file:
+            csv_rows = list(csv.reader(csv_file))
+        with pa.memory_map(arrow_path) as source:
+            reader = pa.ipc.open_file(source)
+            assert reader.num_record_batches == 3
+            table = reader.read_all()
+
+        # Without rich fields both have the original three columns, in the same order
+        assert csv_rows[0] == table.column_names == ['title', 'release_date', 'rating']
+        assert [row[0] for row in csv_rows[1:]] == table['title'].to_pylist()
+
+if __name__ == "__main__":
+    test_types_and_row_groups()
+    test_same_rows_as_csv()
+    print("columnar writers: ok")
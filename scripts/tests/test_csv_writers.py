@@ -0,0 +1,41 @@
+import os
+import random
+import tempfile
+
+from scripts.models.models_csv import MovieCSV, ShowCSV
+from scripts.writers import write_csv, write_csv_pandas
+
+def make_cases():
+    """
+    Row sets covering the rating coercion and ordering corner cases of the pandas writer,
+    with the optional column groups they are written with.
+    """
+    random.seed(0)
+    titles = ['Breaking Bad', 'Parks, and Recreation', 'Say "Hodor"', 'Ünïcödé', 'Multi\nline', '']
+    yield 'floats', [ShowCSV(f"Show {i}", str(2000 + i), round(random.uniform(1, 10), 5)) for i in range(50)], ()
+    yield 'ties and missing', [MovieCSV(f"Movie {i}", str(1990 + i), random.choice([None, 7.5, 8.0, 9.25])) for i in range(60)], ()
+    yield 'awkward titles', [ShowCSV(title, None if i % 2 else 'None', 8.0 + i) for i, title in enumerate(titles)], ()
+    yield 'all missing', [MovieCSV(f"Movie {i}", '2001', None) for i in range(5)], ()
+    yield 'integers', [MovieCSV(f"Movie {i}", '2001', i % 4) for i in range(20)], ()
+    yield 'mixed types', [MovieCSV('a', '1', 8), MovieCSV('b', '1', '7.5'), MovieCSV('c', '1', 'n/a'), MovieCSV('d', '1', float('nan')), MovieCSV('e', '1', 1e16)], ()
+    yield 'rich fields', [
+        ShowCSV(f"Show {i}", '2010', 8.5 - i, votes=None if i % 3 else 1200 + i, trakt_id=i, slug=f"show-{i}", imdb=None,
+                tmdb=None if i % 2 else 100 + i, tvdb=i or None, plays=i * 3 or None, last_watched_at='2024-05-01T20:00:00.000Z',
+                completion_ratio=None if i % 4 else 0.25, episodes_remaining=None if i % 2 else i, next_episode='S01E02',
+                days_since_last_watched=1.5, estimated_finish_date='2026-01-01')
+        for i in range(8)
+    ], ('rich', 'progress')
+
+def test_writers_are_byte_identical():
+    with tempfile.TemporaryDirectory() as directory:
+        for name, rows, groups in make_cases():
+            stdlib_path = os.path.join(directory, 'stdlib.csv')
+            pandas_path = os.path.join(directory, 'pandas.csv')
+            write_csv(rows, stdlib_path, groups)
+            write_csv_pandas(rows, pandas_path, groups)
+            with open(stdlib_path, 'rb') as stdlib_file, open(pandas_path, 'rb') as pandas_file:
+                assert stdlib_file.read() == pandas_file.read(), f"{name}: the CSV writers differ"
+
+if __name__ == "__main__":
+    test_writers_are_byte_identical()
+    print("csv writers: identical")
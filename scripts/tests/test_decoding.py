@@ -0,0 +1,59 @@
+from dataclasses import asdict
+import json
+import pickle
+
+from scripts.decoding import BACKENDS, DecodeBackend, load_backend
+from scripts.models.models_api import Ratings, Show, WatchedShow
+
+WATCHED_SHOWS = json.dumps([{
+    "plays": 2,
+    "last_watched_at": "2014-10-11T17:00:54.000Z",
+    "last_updated_at": "2014-10-11T17:00:54.000Z",
+    "show": {"title": "Show", "year": None, "ids": {"trakt": 1, "slug": "show", "tvrage": 24493}},  # tvrage is a number, no reset_at
+    "seasons": [{"number": 1, "episodes": [{"number": 1, "plays": 2, "last_watched_at": "2014-10-11T17:00:54.000Z"}]}]
+}]).encode()
+
+def get_backends():
+    backends = []
+    for backend_type in BACKENDS.values():
+        try:
+            backends.append(backend_type())
+        except ImportError:
+            pass
+    return backends
+
+def test_backends_decode_the_same():
+    expected = [asdict(item) for item in DecodeBackend().decode(WatchedShow, WATCHED_SHOWS)]
+    assert expected[0]['reset_at'] is None and expected[0]['show']['ids']['tvrage'] == 24493
+
+    for backend in get_backends():
+        for body in (WATCHED_SHOWS, WATCHED_SHOWS.decode()):
+            watched_shows = backend.decode(WatchedShow, body)
+            assert type(watched_shows[0]) is WatchedShow and type(watched_shows[0].show) is Show, backend.name
+            assert [asdict(item) for item in watched_shows] == expected, backend.name
+
+        ratings = backend.decode(Ratings, b'{"rating": 8.1, "votes": 10, "distribution": {"10": 4}}')
+        assert type(ratings) is Ratings and ratings == Ratings(8.1, 10, {"10": 4}), backend.name
+        assert pickle.loads(pickle.dumps(ratings)) == ratings, backend.name
+
+        assert backend.decode(WatchedShow, WATCHED_SHOWS) == DecodeBackend().decode(WatchedShow, WATCHED_SHOWS), backend.name
+
+def test_auto_prefers_the_fastest_backend():
+    expected = 'msgspec' if 'msgspec' in [backend.name for backend in get_backends()] else 'json'
+    assert load_backend('auto').name == expected
+    assert load_backend('orjson').name in ('orjson', expected)  # Only used when asked for
+
+def test_invalid_body_raises_like_json():
+    for backend in get_backends():
+        try:
+            backend.decode(Ratings, b'{"votes": 10}')
+        except TypeError:
+            pass
+        else:
+            raise AssertionError(f"{backend.name} accepted a response without a rating")
+
+if __name__ == "__main__":
+    test_backends_decode_the_same()
+    test_invalid_body_raises_like_json()
+    test_auto_prefers_the_fastest_backend()
+    print(f"decode backends ({', '.join(backend.name for backend in get_backends())}): ok")
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+# Cumulative import time budgets in microseconds, roughly five times what the modules take on a laptop.
+# The heavy dependencies alone blow them: pandas takes about 350ms to import, requests about 125ms.
+IMPORT_BUDGETS = {
+    'scripts.cli': 50_000,
+    'scripts.trakt': 300_000
+}
+
+# Only imported once a command needs them
+DEFERRED_MODULES = ('pandas', 'requests', 'aiohttp', 'dotenv')
+
+ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+
+def measure_import(module: str):
+    """
+    Imports module in a fresh interpreter and returns its cumulative import time in microseconds
+    and the deferred modules that were imported along with it.
+    """
+    code = f"import sys, {module}; print(','.join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    cumulative = None
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative = int(parts[1])
+    loaded = [name for name in result.stdout.strip().split(',') if name]
+    return cumulative, loaded
+
+def test_import_time():
+    for module, budget in IMPORT_BUDGETS.items():
+        cumulative, loaded = measure_import(module)
+        assert not loaded, f"importing {module} also imported {loaded}"
+        assert cumulative is not None and cumulative <= budget, f"importing {module} took {cumulative}us, the budget is {budget}us"
+
+if __name__ == "__main__":
+    for module, budget in IMPORT_BUDGETS.items():
+        cumulative, loaded = measure_import(module)
+        print(f"{module}: {cumulative / 1000:.1f}ms (budget {budget / 1000:.0f}ms), deferred modules imported: {loaded or 'none'}")
+    test_import_time()
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+from scripts.analytics import get_progress_columns
+from scripts.models.models_api import EpisodeProgress, EpisodeSummary, SeasonProgress, ShowProgress
+
+NOW = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+def make_progress(aired: int, watched_days: list) -> ShowProgress:
+    """
+    A single season show whose first episodes were watched on the given days of February 2024.
+    """
+    episodes = [
+        EpisodeProgress(number + 1, number < len(watched_days), f"2024-02-{watched_days[number]:02d}T12:00:00.000Z" if number < len(watched_days) else None)
+        for number in range(aired)
+    ]
+    completed = len(watched_days)
+    next_episode = EpisodeSummary(1, completed + 1, None, {'trakt': None}) if completed < aired else None
+    last_watched_at = episodes[completed - 1].last_watched_at if completed else None
+    return ShowProgress(aired, completed, last_watched_at, None, [SeasonProgress(1, 'Season 1', aired, completed, episodes)], [], next_episode, None)
+
+def test_progress_columns():
+    columns = get_progress_columns({
+        1: make_progress(10, [1, 3, 5, 7, 9, 11]),  # 6 episodes in 10 days, 4 to go
+        2: make_progress(4, [20, 21, 22, 23]),  # Finished
+        3: make_progress(8, [29]),  # Too few episodes for a pace
+        4: make_progress(0, [])
+    }, NOW)
+
+    assert columns[1] == {
+        'completion_ratio': 0.6,
+        'episodes_remaining': 4,
+        'next_episode': 'S01E07',
+        'days_since_last_watched': 18.5,
+        'estimated_finish_date': '2024-03-07'
+    }
+    assert columns[2]['completion_ratio'] == 1.0 and columns[2]['next_episode'] is None and columns[2]['estimated_finish_date'] is None
+    assert columns[3]['estimated_finish_date'] is None and columns[3]['episodes_remaining'] == 7
+    assert columns[4]['completion_ratio'] is None and columns[4]['days_since_last_watched'] is None
+
+if __name__ == "__main__":
+    test_progress_columns()
+    print("progress analytics: ok")
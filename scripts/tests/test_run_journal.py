@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+from scripts.journal import journaled, open_journal
+from scripts.models.models_api import Ratings
+
+SETTINGS = {'api_url': 'http://localhost', 'account': 'test'}
+
+fetched = []
+
+def fetch_rating(slug: str):
+    fetched.append(slug)
+    return None if slug == 'missing' else Ratings(8.5, len(slug), {'10': 1})
+
+def test_resume_skips_finished_units():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'journal.jsonl')
+
+        try:
+            with open_journal(path, SETTINGS):
+                for slug in ('first', 'missing', 'second'):
+                    journaled(f"ratings:{slug}", Ratings, fetch_rating, slug)
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+        assert os.path.exists(path)
+
+        # A line cut short by the interrupted run is dropped
+        with open(path, 'a', encoding='utf-8') as journal_file:
+            journal_file.write('{"unit":"ratings:third","da')
+
+        fetched.clear()
+        with open_journal(path, SETTINGS, resume=True) as journal:
+            results = [journaled(f"ratings:{slug}", Ratings, fetch_rating, slug) for slug in ('first', 'missing', 'second', 'third')]
+            assert journal.resumed == 2
+        assert fetched == ['missing', 'third']  # Failed and unfinished units are fetched again
+        assert [result.votes if result else None for result in results] == [5, None, 6, 5]
+        assert not os.path.exists(path)  # A completed run removes its journal
+
+def test_other_settings_start_over():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'journal.jsonl')
+        try:
+            with open_journal(path, SETTINGS):
+                journaled('ratings:first', Ratings, fetch_rating, 'first')
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+
+        fetched.clear()
+        with open_journal(path, dict(SETTINGS, account='other'), resume=True) as journal:
+            journaled('ratings:first', Ratings, fetch_rating, 'first')
+            assert journal.resumed == 0
+        assert fetched == ['first']
+
+if __name__ == "__main__":
+    test_resume_skips_finished_units()
+    test_other_settings_start_over()
+    print("run journal: ok")
@@ -0,0 +1,66 @@
+import threading
+
+from scripts.scheduler import Channel, Stage, StageScheduler
+
+def test_streams_between_stages():
+    items: Channel[int] = Channel('items')
+    first_item_consumed = threading.Event()
+
+    def produce(inputs):
+        items.put(inputs['source'])
+        # Only returns once the consumer has started on the first item
+        assert first_item_consumed.wait(5)
+        items.put(inputs['source'] + 1)
+        return 'produced'
+
+    def consume(inputs):
+        consumed = []
+        for item in items:
+            consumed.append(item)
+            first_item_consumed.set()
+        return consumed
+
+    pipeline = StageScheduler([
+        Stage('source', lambda inputs: 1),
+        Stage('produce', produce, after=('source',), outputs=(items,)),
+        Stage('consume', consume, streams_from=('produce',)),
+        Stage('write', lambda inputs: (inputs['produce'], inputs['consume']), after=('produce', 'consume')),
+        Stage('independent', lambda inputs: 'independent')
+    ]).run()
+
+    assert pipeline.results['write'] == ('produced', [1, 2])
+    assert pipeline.timings['independent'].started < pipeline.timings['produce'].finished  # Branches run concurrently
+    assert pipeline.critical_path == ['source', 'produce', 'consume', 'write']
+
+def test_failed_stage_skips_dependents():
+    items: Channel[int] = Channel('items')
+    ran = []
+
+    def fail(inputs):
+        raise RuntimeError('list fetch failed')
+
+    try:
+        StageScheduler([
+            Stage('fetch', fail),
+            Stage('classify', lambda inputs: ran.append('classify'), after=('fetch',), outputs=(items,)),
+            Stage('enrich', lambda inputs: list(items), streams_from=('classify',))  # Must not wait forever
+        ]).run()
+    except RuntimeError as e:
+        assert str(e) == 'list fetch failed'
+    else:
+        raise AssertionError('the failure was not raised')
+    assert ran == []
+
+def test_rejects_cycles():
+    try:
+        StageScheduler([Stage('a', lambda inputs: None, after=('b',)), Stage('b', lambda inputs: None, after=('a',))])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('the cycle was accepted')
+
+if __name__ == "__main__":
+    test_streams_between_stages()
+    test_failed_stage_skips_dependents()
+    test_rejects_cycles()
+    print("stage scheduler: ok")
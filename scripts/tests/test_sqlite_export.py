@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+from scripts.models.models_csv import MovieCSV
+from scripts.sqlite_export import SqliteExport
+
+def make_rows(ratings):
+    return [
+        MovieCSV(f"Movie {i}", str(2000 + i), rating, 100 + i, i + 1, f"movie-{i}", None, 300 + i, plays=1, last_watched_at='2014-10-11T17:00:54.000Z')
+        for i, rating in enumerate(ratings)
+    ]
+
+def test_only_changed_rows_are_written():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'export.sqlite')
+        with SqliteExport(path) as export:
+            export.save_rows('watched_movies', make_rows([7.5, 8.0, None, 6.25]))
+            # 4 movies, 3 ratings and 4 watch states
+            assert (export.stats.written, export.stats.unchanged) == (11, 0)
+
+        with SqliteExport(path) as export:
+            # Movie 1 was rerated and movie 3 is no longer watched
+            export.save_rows('watched_movies', make_rows([7.5, 8.5, None]))
+            assert (export.stats.written, export.stats.unchanged, export.stats.deleted) == (1, 7, 1)
+
+            assert export.query("SELECT rating FROM ratings WHERE kind = 'movie' AND trakt_id = 2") == [(8.5,)]
+            assert export.query("SELECT trakt_id FROM watch_state WHERE list = 'watched_movies' ORDER BY trakt_id") == [(1,), (2,), (3,)]
+            assert export.query("SELECT year FROM movies WHERE trakt_id = 4") == [(2003,)]
+
+def test_indexes():
+    with tempfile.TemporaryDirectory() as directory:
+        with SqliteExport(os.path.join(directory, 'export.sqlite')) as export:
+            indexes = {name for name, in export.query("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+            assert {'shows_year', 'movies_year', 'ratings_rating', 'watch_state_last_watched_at', 'progress_last_watched_at'} <= indexes
+
+if __name__ == "__main__":
+    test_only_changed_rows_are_written()
+    test_indexes()
+    print("sqlite export: ok")
@@ -1,75 +1,241 @@
-from dataclasses import asdict
-from typing import Any, List, Optional
-from dotenv import load_dotenv
-import pandas as pd
+if __name__ == "__main__":
+    # python -m scripts.trakt, kept from before the CLI. Hands over to it before the rest of this module runs, the
+    # CLI loads the .env file first and imports this module once, so there is a single copy of its state
+    import sys
+    from scripts.cli import main
+    sys.exit(main(['all']))
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, TypeVar, Union
+import contextvars
 import logging
+import os
+import threading
 
+from scripts.journal import JOURNAL_PATH, journaled, journaled_by_id, open_journal
+from scripts.metrics import metrics
+from scripts.scheduler import Channel, PipelineRun, Stage, StageScheduler, format_report
+from scripts.sqlite_export import SqliteExport
 from scripts.models.models_csv import MovieCSV, ShowCSV
-from scripts.models.models_api import Movie, Show, ShowProgress, WatchedShow
-from scripts.util import combine_unique_shows, get_movies_from_watched_movies, get_movies_from_watchlist_movies, get_shows_from_watched_shows
+from scripts.models.models_api import Movie, Ratings, Show, ShowProgress, WatchedMovie, WatchedShow, WatchlistMovie, WatchlistShow
+from scripts.writers import write_arrow, write_csv, write_csv_pandas, write_parquet
+from scripts.util import combine_unique_shows, get_list_fields, get_movies_from_watched_movies, get_movies_from_watchlist_movies, get_shows_from_watched_shows
+from scripts.api import fetch_watched_shows, fetch_watchlist_shows, fetch_watched_movies, fetch_watchlist_movies
+from scripts.api import fetch_show_ratings, fetch_movie_ratings, fetch_show_progress, get_catalog_store, get_request_coalescer, get_response_cache
+from scripts.api import INLINE_RATINGS, WATCHED_SHOWS_SEASONS, get_account_key
+from scripts.urls import API_URL
 
-load_dotenv()
+# Number of worker threads used to fetch per-title data (ratings) concurrently
+MAX_WORKERS = int(os.getenv('TRAKT_MAX_WORKERS', 8))
 
-# Set up logging
-logging.basicConfig(
-    filename='trakt_api.log',
-    level=logging.DEBUG,
-    format='%(asctime)s %(levelname)s:%(message)s'
-)
+# CSV writer: 'stdlib' streams rows with the csv module, 'pandas' uses the original DataFrame writer
+CSV_BACKEND = os.getenv('TRAKT_CSV_BACKEND', 'stdlib')
 
-# Import specific fetch functions from api.py
-from scripts.api import fetch_watched_shows, fetch_watchlist_shows, fetch_watched_movies, fetch_watchlist_movies
-from scripts.api import fetch_show_ratings, fetch_movie_ratings, fetch_show_progress
+# Comma separated export formats: csv, parquet (.parquet), arrow (Arrow IPC, .arrow) and sqlite (one database for every export,
+# see SQLITE_EXPORT_PATH). The columnar formats need pyarrow
+EXPORT_FORMATS = [export_format.strip() for export_format in os.getenv('TRAKT_EXPORT_FORMATS', 'csv').split(',') if export_format.strip()]
+
+# Adds the votes, ids, plays, last_watched_at and listed_at columns to every export format
+EXPORT_RICH_FIELDS = os.getenv('TRAKT_EXPORT_RICH_FIELDS', '0') == '1'
+
+# Adds completion_ratio, episodes_remaining, next_episode, days_since_last_watched and estimated_finish_date
+# columns, computed from the watched shows' progress (scripts/analytics.py), to the show exports
+PROGRESS_ANALYTICS = os.getenv('TRAKT_PROGRESS_ANALYTICS', '0') == '1'
+
+# Optional column groups of the export rows (see scripts/models/models_csv.py) that are exported
+EXPORT_GROUPS = ['rich'] * EXPORT_RICH_FIELDS + ['progress'] * PROGRESS_ANALYTICS
+
+# Rows per Parquet row group and Arrow record batch
+ROW_GROUP_SIZE = int(os.getenv('TRAKT_ROW_GROUP_SIZE', 10_000))
+
+# Database the sqlite export format upserts into, in the output directory
+SQLITE_EXPORT_PATH = os.getenv('TRAKT_SQLITE_EXPORT_PATH', 'trakt_export.sqlite')
+
+# Where the request and stage metrics of a run are written, the Prometheus textfile only when a path is set
+METRICS_PATH = os.getenv('TRAKT_METRICS_PATH', 'trakt_metrics.json')
+PROMETHEUS_PATH = os.getenv('TRAKT_PROMETHEUS_PATH', '')
+
+# Directory the CSVs are written to, set per account by the batch export (scripts/batch.py)
+output_dir: ContextVar[str] = ContextVar('output_dir', default='')
+
+T = TypeVar('T')
+
+@dataclass
+class ShowClassification:
+    in_progress: List[WatchedShow] = field(default_factory=list)
+    completed: List[WatchedShow] = field(default_factory=list)
+    unknown: List[WatchedShow] = field(default_factory=list)  # Shows whose progress could not be fetched
+    progress: Dict[str, ShowProgress] = field(default_factory=dict)  # Keyed by show slug
+
+def fetch_concurrently(fetch_fn: Callable[[str], Optional[T]], ids: List[str]) -> List[Optional[T]]:
+    """
+    Calls fetch_fn for every id on a bounded worker pool and returns the results in the same order as ids.
+    """
+    if MAX_WORKERS <= 1 or len(ids) <= 1:
+        return [fetch_fn(item_id) for item_id in ids]
 
-def save_to_csv(data: List[Any], filename: str):
+    # Worker threads do not inherit context variables, each call runs in a copy of the caller's context
+    # so a batch export keeps using its own account
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(ids))) as executor:
+        return list(executor.map(lambda item_id: context.copy().run(fetch_fn, item_id), ids))
+
+def save_to_csv(data: List[Any], filename: str, backend: str = CSV_BACKEND):
     # Validate if data is empty
     if not data:
         logging.warning(f"No data to save for {filename}. Skipping CSV generation.")
         return
 
+    filename = os.path.join(output_dir.get(), filename)
     try:
-        # Convert list of dataclass objects to list of dictionaries
-        data_dicts = [asdict(item) for item in data]
+        if backend == 'pandas':
+            write_csv_pandas(data, filename, EXPORT_GROUPS)
+        else:
+            write_csv(data, filename, EXPORT_GROUPS)
+        logging.info(f"Data saved to {filename}")
 
-        # Create a DataFrame from the list of dictionaries
-        df = pd.DataFrame(data_dicts)
+    except Exception as e:
+        logging.error(f"Failed to save data to {filename}: {e}")
 
-        # Check if 'rating' column exists and sort by it if it does
-        if 'rating' in df.columns:
-            # Convert the 'rating' column to numeric (float) if it's not already
-            df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
+def save_export(data: List[Any], name: str, formats: List[str] = EXPORT_FORMATS):
+    """
+    Saves the rows of one export (e.g. watched_shows) in every configured format, as name.csv, name.parquet and name.arrow.
+    """
+    for export_format in formats:
+        if export_format == 'csv':
+            save_to_csv(data, f"{name}.csv")
+            continue
+        if export_format == 'sqlite':
+            save_to_sqlite(data, name)
+            continue
 
-            # Sort the DataFrame by the 'rating' column in descending order (largest to smallest)
-            df = df.sort_values(by='rating', ascending=False)
+        filename = os.path.join(output_dir.get(), f"{name}.{export_format}")
+        if not data:
+            logging.warning(f"No data to save for {filename}. Skipping {export_format} generation.")
+            continue
+        try:
+            if export_format == 'parquet':
+                write_parquet(data, filename, EXPORT_GROUPS, ROW_GROUP_SIZE)
+            elif export_format == 'arrow':
+                write_arrow(data, filename, EXPORT_GROUPS, ROW_GROUP_SIZE)
+            else:
+                logging.error(f"Unknown export format {export_format}, expected csv, parquet or arrow.")
+                continue
+            logging.info(f"Data saved to {filename}")
+
+        except Exception as e:
+            logging.error(f"Failed to save data to {filename}: {e}")
+
+def save_to_sqlite(data: List[Any], name: str):
+    """
+    Upserts the rows of one export into the SQLite export database.
+    """
+    filename = os.path.join(output_dir.get(), SQLITE_EXPORT_PATH)
+    # A list that failed to fetch is empty too, skip it instead of removing every title from the database
+    if not data:
+        logging.warning(f"No data to save for {name}. Skipping {filename} update.")
+        return
 
-        # Save the DataFrame to CSV with headers based on field names
-        df.to_csv(filename, index=False)
-        logging.info(f"Data saved to {filename}")
+    try:
+        with SqliteExport(filename) as export:
+            export.save_rows(name, data)
+        logging.info(f"Data for {name} saved to {filename}: {export.stats}")
 
     except Exception as e:
-        logging.error(f"Failed to save data to {filename}: {e}")
+        logging.error(f"Failed to save data for {name} to {filename}: {e}")
+
+def get_progress_by_trakt_id(watched_shows: List[WatchedShow], classification: ShowClassification) -> Dict[int, ShowProgress]:
+    trakt_ids = {watched_show.show.ids.slug: watched_show.show.ids.trakt for watched_show in watched_shows}
+    return {trakt_ids[slug]: progress for slug, progress in classification.progress.items() if slug in trakt_ids}
+
+def add_progress_analytics(list_fields: Dict[int, Dict[str, Any]], watched_shows: List[WatchedShow], classification: ShowClassification):
+    """
+    Adds the progress analytics columns of the classified shows to their list fields, when they are exported.
+    """
+    if not PROGRESS_ANALYTICS:
+        return
 
-def process_shows_data(shows: List[Show]):
+    from scripts.analytics import get_progress_columns
+
+    with metrics.stage('progress_analytics'):
+        for trakt_id, columns in get_progress_columns(get_progress_by_trakt_id(watched_shows, classification)).items():
+            list_fields.setdefault(trakt_id, {}).update(columns)
+
+def save_show_progress(watched_shows: List[WatchedShow], classification: ShowClassification):
+    """
+    Upserts the progress fetched while classifying the watched shows into the SQLite export database, when it is one of the export formats.
+    """
+    if 'sqlite' not in EXPORT_FORMATS or not classification.progress:
+        return
+
+    filename = os.path.join(output_dir.get(), SQLITE_EXPORT_PATH)
+    try:
+        with SqliteExport(filename) as export:
+            export.save_progress(get_progress_by_trakt_id(watched_shows, classification))
+        logging.info(f"Show progress saved to {filename}: {export.stats}")
+
+    except Exception as e:
+        logging.error(f"Failed to save show progress to {filename}: {e}")
+
+def get_inline_ratings(item: Union[Show, Movie]) -> Optional[Ratings]:
+    """
+    Returns the rating a show or movie was listed with (?extended=full), or None if it has to be fetched.
+    The rating distribution is not part of the list responses and is left empty.
+    """
+    if item.rating is None:
+        return None
+    return Ratings(item.rating, item.votes or 0, {})
+
+def get_titles_needing_ratings(items: List[Union[Show, Movie]]) -> List[str]:
+    """
+    Returns the slugs of the shows or movies listed without a rating.
+    """
+    return [item.ids.slug for item in items if item.rating is None]
+
+def merge_ratings(items: List[Union[Show, Movie]], fetched_ratings: List[Optional[Ratings]]) -> List[Optional[Ratings]]:
+    """
+    Combines the inline ratings with the ratings fetched for the titles from get_titles_needing_ratings (in that order),
+    returning the ratings of every item in the same order as items.
+    """
+    fetched = iter(fetched_ratings)
+    return [get_inline_ratings(item) if item.rating is not None else next(fetched) for item in items]
+
+def process_shows_data(shows: List[Show], list_fields: Optional[Dict[int, Dict[str, Any]]] = None):
+    # Use the ratings the shows were listed with and fetch the rest on the worker pool
+    fetched_ratings = fetch_concurrently(journaled_by_id('ratings:show', Ratings, fetch_show_ratings), get_titles_needing_ratings(shows))
+    all_ratings = merge_ratings(shows, fetched_ratings)
+
+    return build_show_rows(shows, all_ratings, list_fields)
+
+def build_show_rows(shows: List[Show], all_ratings: List[Optional[Ratings]], list_fields: Optional[Dict[int, Dict[str, Any]]] = None) -> List[ShowCSV]:
+    """
+    Builds the CSV rows for shows from their already fetched ratings (in the same order as shows).
+    list_fields holds the plays, last_watched_at and listed_at of the shows by Trakt id, see get_list_fields.
+    """
+    list_fields = list_fields or {}
     processed_data: List[ShowCSV] = []
 
-    for show in shows:
+    for show, ratings in zip(shows, all_ratings):
         try:
             title = show.title
-            show_id = show.ids.slug
 
             # Use the show year as the release date
             release_date = str(show.year)
 
-            # Fetch the rating using the proper function
-            ratings = fetch_show_ratings(show_id)
             rating = None
+            votes = None
 
             if not ratings:
                 logging.warning(f"Data might be incomplete for {title}: Release Date={release_date}")
             else:
                 rating = ratings.rating
+                votes = ratings.votes
 
-            processed_data.append(ShowCSV(title, release_date, rating))
+            ids = show.ids
+            processed_data.append(ShowCSV(title, release_date, rating, votes, ids.trakt, ids.slug, ids.imdb, ids.tmdb, ids.tvdb,
+                                          **list_fields.get(ids.trakt, {})))
 
         except KeyError as e:
             logging.error(f"KeyError for show: {str(e)}")
@@ -77,27 +243,40 @@ def process_shows_data(shows: List[Show]):
 
     return processed_data
 
-def process_movies_data(movies: List[Movie]):
+def process_movies_data(movies: List[Movie], list_fields: Optional[Dict[int, Dict[str, Any]]] = None):
+    # Use the ratings the movies were listed with and fetch the rest on the worker pool
+    fetched_ratings = fetch_concurrently(journaled_by_id('ratings:movie', Ratings, fetch_movie_ratings), get_titles_needing_ratings(movies))
+    all_ratings = merge_ratings(movies, fetched_ratings)
+
+    return build_movie_rows(movies, all_ratings, list_fields)
+
+def build_movie_rows(movies: List[Movie], all_ratings: List[Optional[Ratings]], list_fields: Optional[Dict[int, Dict[str, Any]]] = None) -> List[MovieCSV]:
+    """
+    Builds the CSV rows for movies from their already fetched ratings (in the same order as movies).
+    list_fields holds the plays, last_watched_at and listed_at of the movies by Trakt id, see get_list_fields.
+    """
+    list_fields = list_fields or {}
     processed_data: List[MovieCSV] = []
 
-    for movie in movies:
+    for movie, ratings in zip(movies, all_ratings):
         try:
             title = movie.title
-            movie_id = movie.ids.slug
 
             # Use the movie year as the release date
             release_date = str(movie.year)
 
-            # Fetch the rating using the proper function
-            ratings = fetch_movie_ratings(movie_id)
             rating = None
+            votes = None
 
             if not ratings:
                 logging.warning(f"Data might be incomplete for {title}: Release Date={release_date}")
             else:
                 rating = ratings.rating
+                votes = ratings.votes
 
-            processed_data.append(MovieCSV(title, release_date, rating))
+            ids = movie.ids
+            processed_data.append(MovieCSV(title, release_date, rating, votes, ids.trakt, ids.slug, ids.imdb, ids.tmdb,
+                                           **list_fields.get(ids.trakt, {})))
 
         except KeyError as e:
             logging.error(f"KeyError for movie: {str(e)}")
@@ -105,69 +284,289 @@ def process_movies_data(movies: List[Movie]):
 
     return processed_data
 
-def fetch_in_progress_shows(watched_shows: Optional[List[WatchedShow]]):
-    in_progress_shows: Optional[List[WatchedShow]] = []
+def classify_shows(watched_shows: Optional[List[WatchedShow]]) -> ShowClassification:
+    """
+    Fetches the progress of every watched show once and splits the shows into in-progress,
+    completed and unknown (no progress available) buckets in a single pass.
 
+    :param watched_shows: List of WatchedShow objects.
+    :return: ShowClassification holding the buckets and the fetched progress keyed by show slug.
+    """
     if watched_shows is None:
-        return in_progress_shows
-    
-    for watched_show in watched_shows:
-        show_id = watched_show.show.ids.slug
-        
-        # Fetch progress for the show
-        progress: Optional[ShowProgress] = fetch_show_progress(show_id)
-        
-        if progress and progress.completed < progress.aired:
-            in_progress_shows.append(watched_show)
-    
-    return in_progress_shows
-
-def fetch_completed_shows(watched_shows: Optional[List[WatchedShow]]):
-    completed_shows: Optional[List[WatchedShow]] = []
-
-    if watched_shows is None:
-        return completed_shows
-    
-    for watched_show in watched_shows:
-        show_id = watched_show.show.ids.slug
-        
-        # Fetch progress for the show
-        progress = fetch_show_progress(show_id)
-        
-        # Only add shows that are completed (i.e., all episodes watched)
-        if progress and progress.completed == progress.aired:
-            completed_shows.append(watched_show)
-    
-    return completed_shows
-
-if __name__ == "__main__":
-    # Fetch watched and watchlist shows
-    watched_shows = fetch_watched_shows()
-    watchlist_shows = fetch_watchlist_shows()
+        return ShowClassification()
 
-    # Fetch in-progress shows by filtering out completed ones
-    in_progress_shows = fetch_in_progress_shows(watched_shows)
+    show_ids = [watched_show.show.ids.slug for watched_show in watched_shows]
+    all_progress = fetch_concurrently(journaled_by_id('progress', ShowProgress, fetch_show_progress), show_ids)
 
-    # Fetch completed shows
-    completed_shows = fetch_completed_shows(watched_shows)
+    return build_show_classification(watched_shows, all_progress)
 
-    # Combine in-progress shows with watchlist shows
-    combined_shows = combine_unique_shows(in_progress_shows, watchlist_shows)
+def build_show_classification(watched_shows: List[WatchedShow], all_progress: List[Optional[ShowProgress]]) -> ShowClassification:
+    """
+    Splits watched shows into buckets from their already fetched progress (in the same order as watched_shows).
+    """
+    classification = ShowClassification()
 
-    # Process and save the combined list of in-progress and watchlist shows
-    processed_shows = process_shows_data(combined_shows)
-    save_to_csv(processed_shows, 'watchlist_shows.csv')
+    for watched_show, progress in zip(watched_shows, all_progress):
+        if progress:
+            classification.progress[watched_show.show.ids.slug] = progress
 
-    # Process and save completed shows to a separate CSV file
-    processed_completed_shows = process_shows_data(get_shows_from_watched_shows(completed_shows))
-    save_to_csv(processed_completed_shows, 'watched_shows.csv')
-
-    # Fetch and process watched and watchlist movies
-    watched_movies = fetch_watched_movies()
-    watchlist_movies = fetch_watchlist_movies()
-
-    processed_watched_movies = process_movies_data(get_movies_from_watched_movies(watched_movies))
-    processed_watchlist_movies = process_movies_data(get_movies_from_watchlist_movies(watchlist_movies))
+        if progress and progress.completed < progress.aired:
+            classification.in_progress.append(watched_show)
+        elif progress and progress.completed == progress.aired:
+            # Only shows with all aired episodes watched count as completed
+            classification.completed.append(watched_show)
+        else:
+            classification.unknown.append(watched_show)
+
+    return classification
+
+# Kept for callers of the old per-bucket functions. Callers needing both buckets should call classify_shows once
+# and pass the classification to both, otherwise every show's progress is fetched twice
+def fetch_in_progress_shows(watched_shows: Optional[List[WatchedShow]], classification: Optional[ShowClassification] = None):
+    return (classification or classify_shows(watched_shows)).in_progress
+
+def fetch_completed_shows(watched_shows: Optional[List[WatchedShow]], classification: Optional[ShowClassification] = None):
+    return (classification or classify_shows(watched_shows)).completed
+
+def get_ratings_by_slug(items: List[Union[Show, Movie]], fetched_ratings: Dict[str, Optional[Ratings]]) -> List[Optional[Ratings]]:
+    """
+    Returns the ratings of every item, in the same order as items, from the inline ratings and the fetched ones keyed by slug.
+    """
+    return merge_ratings(items, [fetched_ratings.get(slug) for slug in get_titles_needing_ratings(items)])
+
+def fetch_ratings_by_slug(fetch_fn: Callable[[str], Optional[Ratings]], items: List[Union[Show, Movie]]) -> Dict[str, Optional[Ratings]]:
+    """
+    Fetches the ratings of the items listed without one on the worker pool, keyed by slug.
+    """
+    slugs = list(dict.fromkeys(get_titles_needing_ratings(items)))
+    return dict(zip(slugs, fetch_concurrently(fetch_fn, slugs)))
+
+def get_exported_shows(watchlist_shows: Optional[List[WatchlistShow]], classification: ShowClassification) -> Tuple[List[Show], List[Show]]:
+    """
+    Returns the shows of watchlist_shows.csv (in-progress and watchlist shows) and of watched_shows.csv (completed shows).
+    """
+    return combine_unique_shows(classification.in_progress, watchlist_shows), get_shows_from_watched_shows(classification.completed)
+
+def save_shows(watched_shows: Optional[List[WatchedShow]], watchlist_shows: Optional[List[WatchlistShow]],
+               classification: ShowClassification, fetched_ratings: Dict[str, Optional[Ratings]]):
+    """
+    Builds and saves the show exports from the lists, their classification and the ratings fetched for them.
+    Shared by the sequential export and the pipeline's write_shows stage.
+    """
+    combined_shows, completed_shows = get_exported_shows(watchlist_shows, classification)
+    list_fields = get_list_fields(watched_shows, watchlist_shows)
+    add_progress_analytics(list_fields, watched_shows, classification)
+
+    save_export(build_show_rows(combined_shows, get_ratings_by_slug(combined_shows, fetched_ratings), list_fields), 'watchlist_shows')
+    save_export(build_show_rows(completed_shows, get_ratings_by_slug(completed_shows, fetched_ratings), list_fields), 'watched_shows')
+    save_show_progress(watched_shows, classification)
+
+def save_movies(watched_movies: Optional[List[WatchedMovie]], watchlist_movies: Optional[List[WatchlistMovie]], fetched_ratings: Dict[str, Optional[Ratings]]):
+    """
+    Builds and saves the movie exports from the lists and the ratings fetched for them.
+    Shared by the sequential export and the pipeline's write_movies stage.
+    """
+    list_fields = get_list_fields(watched_movies, watchlist_movies)
+    for movies, name in ((get_movies_from_watched_movies(watched_movies), 'watched_movies'), (get_movies_from_watchlist_movies(watchlist_movies), 'watchlist_movies')):
+        save_export(build_movie_rows(movies, get_ratings_by_slug(movies, fetched_ratings), list_fields), name)
+
+def export_shows():
+    # Fetch watched and watchlist shows
+    with metrics.stage('fetch_lists'):
+        watched_shows = journaled('list:watched_shows', WatchedShow, fetch_watched_shows)
+        watchlist_shows = journaled('list:watchlist_shows', WatchlistShow, fetch_watchlist_shows)
+
+    # Split watched shows into in-progress and completed, fetching each show's progress once
+    with metrics.stage('classify_shows'):
+        classification = classify_shows(watched_shows)
+
+    # Fetch the ratings of the in-progress, watchlist and completed shows that were listed without one
+    with metrics.stage('ratings'):
+        combined_shows, completed_shows = get_exported_shows(watchlist_shows, classification)
+        fetched_ratings = fetch_ratings_by_slug(journaled_by_id('ratings:show', Ratings, fetch_show_ratings), combined_shows + completed_shows)
+
+    with metrics.stage('write_csv'):
+        save_shows(watched_shows, watchlist_shows, classification, fetched_ratings)
+
+def export_movies():
+    # Fetch watched and watchlist movies
+    with metrics.stage('fetch_lists'):
+        watched_movies = journaled('list:watched_movies', WatchedMovie, fetch_watched_movies)
+        watchlist_movies = journaled('list:watchlist_movies', WatchlistMovie, fetch_watchlist_movies)
+
+    with metrics.stage('ratings'):
+        movies = get_movies_from_watched_movies(watched_movies) + get_movies_from_watchlist_movies(watchlist_movies)
+        fetched_ratings = fetch_ratings_by_slug(journaled_by_id('ratings:movie', Ratings, fetch_movie_ratings), movies)
+
+    with metrics.stage('write_csv'):
+        save_movies(watched_movies, watchlist_movies, fetched_ratings)
+
+def report_run():
+    """
+    Logs the cache, catalog and coalescing stats and request totals of the run and writes its metrics summary (and Prometheus textfile).
+    """
+    cache = get_response_cache()
+    if cache:
+        logging.info(f"Response cache stats: {cache.stats}")
+    catalog = get_catalog_store()
+    if catalog:
+        logging.info(f"Catalog stats: {catalog.stats}")
+    logging.info(f"Coalescing stats: {get_request_coalescer().stats}")
+
+    summary = metrics.summary()
+    logging.info(f"Requests: {summary['totals']}, stages: {summary['stages']}")
 
-    save_to_csv(processed_watched_movies, 'watched_movies.csv')
-    save_to_csv(processed_watchlist_movies, 'watchlist_movies.csv')
+    try:
+        if METRICS_PATH:
+            metrics.write_json(METRICS_PATH)
+        if PROMETHEUS_PATH:
+            metrics.write_prometheus(PROMETHEUS_PATH)
+    except OSError as e:
+        logging.error(f"Failed to write metrics: {e}")
+
+def get_journal_path() -> str:
+    """
+    Returns the run journal's path in the output directory, empty when journaling is disabled.
+    """
+    return os.path.join(output_dir.get(), JOURNAL_PATH) if JOURNAL_PATH else ''
+
+def get_journal_settings() -> Dict[str, Any]:
+    """
+    Returns what the journaled responses depend on. A journal written with other settings, or for another account, is not resumed.
+    """
+    return {
+        'api_url': API_URL,
+        'account': get_account_key(),
+        'inline_ratings': INLINE_RATINGS,
+        'watched_shows_seasons': WATCHED_SHOWS_SEASONS
+    }
+
+def fetch_streamed(executor: ThreadPoolExecutor, fetch_fn: Callable[[str], Optional[T]], ids: Iterable[str],
+                   on_result: Optional[Callable[[str, Optional[T]], None]] = None) -> Dict[str, Optional[T]]:
+    """
+    Calls fetch_fn on the worker pool for every distinct id as soon as it arrives (ids can be a Channel still
+    being filled by another stage) and returns the results keyed by id once all of them have finished.
+    on_result is called with every id and its result as soon as it is fetched.
+
+    At most MAX_WORKERS calls are queued or running at a time. Every stage submits to the same pool, so one
+    stage's calls never pile up in front of another's: a show's rating is fetched right after its progress,
+    not once the progress of every other show has been.
+    """
+    context = contextvars.copy_context()
+    window = threading.BoundedSemaphore(max(1, MAX_WORKERS))
+    futures: Dict[str, Future] = {}
+
+    def fetch(item_id: str) -> Optional[T]:
+        try:
+            result = context.copy().run(fetch_fn, item_id)
+            if on_result is not None:
+                on_result(item_id, result)
+            return result
+        finally:
+            window.release()
+
+    for item_id in ids:
+        if item_id not in futures:
+            window.acquire()
+            futures[item_id] = executor.submit(fetch, item_id)
+    return {item_id: future.result() for item_id, future in futures.items()}
+
+def build_show_stages(executor: ThreadPoolExecutor) -> List[Stage]:
+    """
+    The show branch of the export pipeline. The watched and watchlist lists are fetched at the same time.
+    Classifying a show streams it to the ratings stage as soon as its progress arrives, and the watchlist
+    streams its shows when it is fetched, so ratings are fetched while the progress of other shows still is.
+    """
+    show_ratings: Channel[str] = Channel('show_ratings')
+
+    def fetch_watched(inputs: Dict[str, Any]) -> Optional[List[WatchedShow]]:
+        return journaled('list:watched_shows', WatchedShow, fetch_watched_shows)
+
+    def fetch_watchlist(inputs: Dict[str, Any]) -> Optional[List[WatchlistShow]]:
+        watchlist_shows = journaled('list:watchlist_shows', WatchlistShow, fetch_watchlist_shows)
+        for slug in get_titles_needing_ratings([watchlist_show.show for watchlist_show in watchlist_shows or []]):
+            show_ratings.put(slug)
+        return watchlist_shows
+
+    def classify(inputs: Dict[str, Any]) -> ShowClassification:
+        watched_shows = inputs['watched_shows']
+        if watched_shows is None:
+            return ShowClassification()
+
+        shows_by_slug = {watched_show.show.ids.slug: watched_show.show for watched_show in watched_shows}
+
+        def classified(slug: str, progress: Optional[ShowProgress]):
+            # Shows without progress (unknown) are in neither export, so their ratings are not needed
+            if progress and shows_by_slug[slug].rating is None:
+                show_ratings.put(slug)
+
+        fetch_progress = journaled_by_id('progress', ShowProgress, fetch_show_progress)
+        progress_by_slug = fetch_streamed(executor, fetch_progress, shows_by_slug, classified)
+        return build_show_classification(watched_shows, [progress_by_slug[watched_show.show.ids.slug] for watched_show in watched_shows])
+
+    def fetch_ratings(inputs: Dict[str, Any]) -> Dict[str, Optional[Ratings]]:
+        return fetch_streamed(executor, journaled_by_id('ratings:show', Ratings, fetch_show_ratings), show_ratings)
+
+    def write(inputs: Dict[str, Any]):
+        save_shows(inputs['watched_shows'], inputs['watchlist_shows'], inputs['classify_shows'], inputs['show_ratings'])
+
+    return [
+        Stage('watched_shows', fetch_watched),
+        Stage('watchlist_shows', fetch_watchlist, outputs=(show_ratings,)),
+        Stage('classify_shows', classify, after=('watched_shows',), outputs=(show_ratings,)),
+        Stage('show_ratings', fetch_ratings, streams_from=('watchlist_shows', 'classify_shows')),
+        Stage('write_shows', write, after=('watched_shows', 'watchlist_shows', 'classify_shows', 'show_ratings'))
+    ]
+
+def build_movie_stages(executor: ThreadPoolExecutor) -> List[Stage]:
+    """
+    The movie branch of the export pipeline, independent of the shows. Both lists stream the movies they
+    need ratings for to the ratings stage as soon as they are fetched.
+    """
+    movie_ratings: Channel[str] = Channel('movie_ratings')
+
+    def fetch_list(unit: str, model_type: Type, fetch_fn: Callable[[], Optional[List[Any]]]) -> Callable[[Dict[str, Any]], Any]:
+        def fetch(inputs: Dict[str, Any]) -> Optional[List[Any]]:
+            entries = journaled(unit, model_type, fetch_fn)
+            for slug in get_titles_needing_ratings([entry.movie for entry in entries or []]):
+                movie_ratings.put(slug)
+            return entries
+        return fetch
+
+    def fetch_ratings(inputs: Dict[str, Any]) -> Dict[str, Optional[Ratings]]:
+        return fetch_streamed(executor, journaled_by_id('ratings:movie', Ratings, fetch_movie_ratings), movie_ratings)
+
+    def write(inputs: Dict[str, Any]):
+        save_movies(inputs['watched_movies'], inputs['watchlist_movies'], inputs['movie_ratings'])
+
+    return [
+        Stage('watched_movies', fetch_list('list:watched_movies', WatchedMovie, fetch_watched_movies), outputs=(movie_ratings,)),
+        Stage('watchlist_movies', fetch_list('list:watchlist_movies', WatchlistMovie, fetch_watchlist_movies), outputs=(movie_ratings,)),
+        Stage('movie_ratings', fetch_ratings, streams_from=('watched_movies', 'watchlist_movies')),
+        Stage('write_movies', write, after=('watched_movies', 'watchlist_movies', 'movie_ratings'))
+    ]
+
+def run_pipeline(shows: bool = True, movies: bool = True) -> PipelineRun:
+    """
+    Runs the export as a DAG of stages (list fetch -> classify -> ratings -> write, see build_show_stages and
+    build_movie_stages), with the show and movie branches running concurrently. Every request goes through
+    one pool of MAX_WORKERS threads, so the branches share the concurrency the sequential export had.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, MAX_WORKERS)) as executor:
+        stages = (build_show_stages(executor) if shows else []) + (build_movie_stages(executor) if movies else [])
+        pipeline = StageScheduler(stages).run()
+
+    logging.info(f"Pipeline stages:\n{format_report(pipeline)}")
+    return pipeline
+
+def run_export(shows: bool = True, movies: bool = True, resume: bool = False, print_timings: bool = False):
+    """
+    Runs the export, journaling every finished unit of work so that a run that stops early can be resumed.
+    With print_timings the per-stage timings and the critical path of the pipeline are printed.
+    """
+    with open_journal(get_journal_path(), get_journal_settings(), resume):
+        pipeline = run_pipeline(shows, movies)
+
+    report_run()
+    if print_timings:
+        print(format_report(pipeline))
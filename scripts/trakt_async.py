@@ -0,0 +1,88 @@
+from typing import Any, Dict, List, Optional
+import asyncio
+
+from scripts.trakt import ShowClassification, add_progress_analytics, build_movie_rows, build_show_classification, build_show_rows, get_journal_path, get_journal_settings, get_titles_needing_ratings, merge_ratings, report_run, save_export, save_show_progress
+from scripts.journal import journaled_async, open_journal
+from scripts.metrics import metrics
+from scripts.models.models_csv import MovieCSV, ShowCSV
+from scripts.models.models_api import Movie, Ratings, Show, ShowProgress, WatchedMovie, WatchedShow, WatchlistMovie, WatchlistShow
+from scripts.util import combine_unique_shows, get_list_fields, get_movies_from_watched_movies, get_movies_from_watchlist_movies, get_shows_from_watched_shows
+
+from scripts.api_async import fetch_watched_shows, fetch_watchlist_shows, fetch_watched_movies, fetch_watchlist_movies
+from scripts.api_async import fetch_show_ratings, fetch_movie_ratings, fetch_show_progress, close_session
+
+async def process_shows_data(shows: List[Show], list_fields: Optional[Dict[int, Dict[str, Any]]] = None) -> List[ShowCSV]:
+    # Every missing rating is requested at once, the session semaphore bounds how many are in flight
+    fetched_ratings = await asyncio.gather(*(journaled_async(f"ratings:show:{slug}", Ratings, fetch_show_ratings, slug) for slug in get_titles_needing_ratings(shows)))
+
+    return build_show_rows(shows, merge_ratings(shows, fetched_ratings), list_fields)
+
+async def process_movies_data(movies: List[Movie], list_fields: Optional[Dict[int, Dict[str, Any]]] = None) -> List[MovieCSV]:
+    fetched_ratings = await asyncio.gather(*(journaled_async(f"ratings:movie:{slug}", Ratings, fetch_movie_ratings, slug) for slug in get_titles_needing_ratings(movies)))
+
+    return build_movie_rows(movies, merge_ratings(movies, fetched_ratings), list_fields)
+
+async def classify_shows(watched_shows: Optional[List[WatchedShow]]) -> ShowClassification:
+    """
+    Async version of scripts.trakt.classify_shows, fetching every show's progress on the event loop.
+    """
+    if watched_shows is None:
+        return ShowClassification()
+
+    slugs = [watched_show.show.ids.slug for watched_show in watched_shows]
+    all_progress = await asyncio.gather(*(journaled_async(f"progress:{slug}", ShowProgress, fetch_show_progress, slug) for slug in slugs))
+
+    return build_show_classification(watched_shows, all_progress)
+
+async def export_shows():
+    with metrics.stage('fetch_lists'):
+        watched_shows, watchlist_shows = await asyncio.gather(
+            journaled_async('list:watched_shows', WatchedShow, fetch_watched_shows),
+            journaled_async('list:watchlist_shows', WatchlistShow, fetch_watchlist_shows)
+        )
+
+    with metrics.stage('classify_shows'):
+        classification = await classify_shows(watched_shows)
+    combined_shows = combine_unique_shows(classification.in_progress, watchlist_shows)
+    list_fields = get_list_fields(watched_shows, watchlist_shows)
+    add_progress_analytics(list_fields, watched_shows, classification)
+
+    with metrics.stage('ratings'):
+        processed_shows, processed_completed_shows = await asyncio.gather(
+            process_shows_data(combined_shows, list_fields),
+            process_shows_data(get_shows_from_watched_shows(classification.completed), list_fields)
+        )
+
+    with metrics.stage('write_csv'):
+        save_export(processed_shows, 'watchlist_shows')
+        save_export(processed_completed_shows, 'watched_shows')
+        save_show_progress(watched_shows, classification)
+
+async def export_movies():
+    with metrics.stage('fetch_lists'):
+        watched_movies, watchlist_movies = await asyncio.gather(
+            journaled_async('list:watched_movies', WatchedMovie, fetch_watched_movies),
+            journaled_async('list:watchlist_movies', WatchlistMovie, fetch_watchlist_movies)
+        )
+
+    list_fields = get_list_fields(watched_movies, watchlist_movies)
+
+    with metrics.stage('ratings'):
+        processed_watched_movies, processed_watchlist_movies = await asyncio.gather(
+            process_movies_data(get_movies_from_watched_movies(watched_movies), list_fields),
+            process_movies_data(get_movies_from_watchlist_movies(watchlist_movies), list_fields)
+        )
+
+    with metrics.stage('write_csv'):
+        save_export(processed_watched_movies, 'watched_movies')
+        save_export(processed_watchlist_movies, 'watchlist_movies')
+
+async def main(shows: bool = True, movies: bool = True, resume: bool = False):
+    try:
+        with open_journal(get_journal_path(), get_journal_settings(), resume):
+            # The show and movie exports do not depend on each other, so they share the event loop
+            await asyncio.gather(*([export_shows()] if shows else []), *([export_movies()] if movies else []))
+    finally:
+        await close_session()
+
+    report_run()
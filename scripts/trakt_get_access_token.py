@@ -1,18 +1,18 @@
 import os
-import requests
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+from scripts.transport import send
+from scripts.urls import OAUTH_TOKEN_URL
+
 # Replace these with your actual values
 CLIENT_ID = os.getenv('TRAKT_CLIENT_ID')
 CLIENT_SECRET = os.getenv('TRAKT_CLIENT_SECRET')
 REDIRECT_URI = os.getenv('TRAKT_REDIRECT_URI')
 CODE = os.getenv('TRAKT_AUTHORISATION_CODE')
 
-token_url = 'https://api.trakt.tv/oauth/token'
-
 data = {
     'code': CODE,
     'client_id': CLIENT_ID,
@@ -21,5 +21,7 @@ data = {
     'grant_type': 'authorization_code'
 }
 
-response = requests.post(token_url, data=data)
+# Sent over the same pooled transport as the export, with its timeouts. An authorization code can only be
+# exchanged once, so the request is only retried when it did not reach Trakt
+response = send('POST', OAUTH_TOKEN_URL, data=data)
 print(response.json())
@@ -0,0 +1,115 @@
+from typing import TYPE_CHECKING, Optional
+import logging
+import os
+import threading
+import time
+
+# requests is imported where it is used so importing this module stays cheap
+if TYPE_CHECKING:
+    import requests
+
+from scripts.rate_limit import retry_backoff
+
+# Seconds to wait for a connection, and for each read of the response once connected
+CONNECT_TIMEOUT = float(os.getenv('TRAKT_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('TRAKT_READ_TIMEOUT', 30))
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Kept-alive connections per host, enough for every worker thread of a batch export
+POOL_SIZE = int(os.getenv('TRAKT_POOL_SIZE', 32))
+
+# Number of times a request failing with a server error or a dropped connection is retried
+SERVER_RETRIES = int(os.getenv('TRAKT_SERVER_RETRIES', 3))
+SERVER_RETRY_BACKOFF_BASE = 1.0
+SERVER_RETRY_BACKOFF_CAP = 30.0
+
+# Server errors Trakt documents as temporary, 520-522 come from its Cloudflare front while the API is unreachable
+RETRY_STATUSES = frozenset({500, 502, 503, 504, 520, 521, 522})
+
+# Methods that are safe to send again after the server may have received them
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+_session: Optional['requests.Session'] = None
+_session_lock = threading.Lock()
+
+def create_session() -> 'requests.Session':
+    """
+    Creates a session with a connection pool sized for the worker threads, so requests reuse kept-alive
+    connections instead of opening (and TLS handshaking) a new one each, and ask for compressed responses.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # Retries are done by send and scripts.api.get_with_retries, which pace them with the rate limiter
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+    return session
+
+def get_session() -> 'requests.Session':
+    """
+    Returns the session shared by every thread, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+def close_session():
+    """
+    Closes the pooled connections of the shared session, a later request opens new ones.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+def get_retry_reason(method: str, response: Optional['requests.Response'] = None, error: Optional[Exception] = None) -> Optional[str]:
+    """
+    Returns why a request should be sent again, or None when its response or error is final.
+    Requests that are not idempotent are only retried when they cannot have reached the server.
+    """
+    from requests.exceptions import ConnectionError, ConnectTimeout, SSLError, Timeout
+
+    if error is not None:
+        if isinstance(error, ConnectTimeout):
+            return 'connect timeout'
+        if method.upper() not in IDEMPOTENT_METHODS or isinstance(error, SSLError):
+            return None
+        # ConnectionError covers refused and reset connections, Timeout a read that took longer than READ_TIMEOUT
+        if isinstance(error, (ConnectionError, Timeout)):
+            return type(error).__name__
+        return None
+
+    if response is not None and response.status_code in RETRY_STATUSES and method.upper() in IDEMPOTENT_METHODS:
+        return f"HTTP {response.status_code}"
+    return None
+
+def get_server_retry_backoff(attempt: int) -> float:
+    return retry_backoff(attempt, SERVER_RETRY_BACKOFF_BASE, SERVER_RETRY_BACKOFF_CAP)
+
+def send(method: str, url: str, **kwargs) -> 'requests.Response':
+    """
+    Sends a request over the shared session with the configured timeouts, retrying server errors and
+    dropped connections with jittered backoff. Returns the last response or raises the last error.
+    """
+    kwargs.setdefault('timeout', TIMEOUT)
+    for attempt in range(SERVER_RETRIES + 1):
+        try:
+            response = get_session().request(method, url, **kwargs)
+            reason = get_retry_reason(method, response=response)
+        except Exception as e:
+            reason = get_retry_reason(method, error=e)
+            if reason is None or attempt == SERVER_RETRIES:
+                raise
+        if reason is None or attempt == SERVER_RETRIES:
+            return response
+
+        backoff = get_server_retry_backoff(attempt)
+        logging.warning(f"{method} {url} failed ({reason}), retrying in {backoff:.1f} seconds...")
+        time.sleep(backoff)
@@ -1,6 +1,11 @@
 # Trakt API URLs
 
-WATCHED_PROGRESS_URL = 'https://api.trakt.tv/shows/{id}/progress/watched?hidden=false&specials=false&count_specials=true'
+import os
+
+# Overridable so the export can be pointed at a local stub server, see scripts/benchmarks/stub_server.py
+API_URL = os.getenv('TRAKT_API_URL', 'https://api.trakt.tv').rstrip('/')
+
+WATCHED_PROGRESS_URL = f'{API_URL}/shows/{{id}}/progress/watched?hidden=false&specials=false&count_specials=true'
 
 # Response format
 # {
@@ -92,9 +97,9 @@ WATCHED_PROGRESS_URL = 'https://api.trakt.tv/shows/{id}/progress/watched?hidden=
 #   }
 # }
 
-WATCHED_SHOWS_URL = 'https://api.trakt.tv/sync/watched/shows'
+WATCHED_SHOWS_URL = f'{API_URL}/sync/watched/shows'
 
-# Response format
+# Response format (with ?extended=noseasons the "seasons" array is left out)
 # [
 #   {
 #     "plays": 56,
@@ -195,7 +200,7 @@ WATCHED_SHOWS_URL = 'https://api.trakt.tv/sync/watched/shows'
 #   }
 # ]
 
-SHOW_RATINGS_URL = 'https://api.trakt.tv/shows/{id}/ratings'
+SHOW_RATINGS_URL = f'{API_URL}/shows/{{id}}/ratings'
 
 # Response format
 # {
@@ -215,7 +220,7 @@ SHOW_RATINGS_URL = 'https://api.trakt.tv/shows/{id}/ratings'
 #   }
 # }
 
-SHOW_DETAILS_URL = 'https://api.trakt.tv/shows/id'
+SHOW_DETAILS_URL = f'{API_URL}/shows/{{id}}'
 
 # Response format
 # {
@@ -230,11 +235,11 @@ SHOW_DETAILS_URL = 'https://api.trakt.tv/shows/id'
 #   }
 # }
 
-WATCHLIST_SHOWS_URL = 'https://api.trakt.tv/sync/watchlist/shows'
+WATCHLIST_SHOWS_URL = f'{API_URL}/sync/watchlist/shows'
 
 # Response format
 
-WATCHED_MOVIES_URL = 'https://api.trakt.tv/sync/watched/movies'
+WATCHED_MOVIES_URL = f'{API_URL}/sync/watched/movies'
 
 # Response format
 # [
@@ -270,7 +275,7 @@ WATCHED_MOVIES_URL = 'https://api.trakt.tv/sync/watched/movies'
 #   }
 # ]
 
-WATCHLIST_MOVIES_URL = 'https://api.trakt.tv/sync/watchlist/movies'
+WATCHLIST_MOVIES_URL = f'{API_URL}/sync/watchlist/movies'
 
 # Response format
 
@@ -311,7 +316,7 @@ WATCHLIST_MOVIES_URL = 'https://api.trakt.tv/sync/watchlist/movies'
 #   }
 # ]
 
-MOVIE_RATINGS_URL = 'https://api.trakt.tv/movies/{movie_id}/ratings'
+MOVIE_RATINGS_URL = f'{API_URL}/movies/{{movie_id}}/ratings'
 
 # Response format
 # {
@@ -329,4 +334,99 @@ MOVIE_RATINGS_URL = 'https://api.trakt.tv/movies/{movie_id}/ratings'
 #     "9": 662,
 #     "10": 1583
 #   }
-# }
\ No newline at end of file
+# }
+
+LAST_ACTIVITIES_URL = f'{API_URL}/sync/last_activities'
+
+# Response format (trimmed to the categories used by the incremental export)
+# {
+#   "all": "2014-11-20T07:01:32.000Z",
+#   "movies": {
+#     "watched_at": "2014-11-19T21:42:41.000Z",
+#     "collected_at": "2014-11-20T06:51:30.000Z",
+#     "rated_at": "2014-11-19T18:32:29.000Z",
+#     "watchlisted_at": "2014-11-19T21:42:41.000Z",
+#     "favorited_at": "2014-11-19T21:42:41.000Z",
+#     "recommendations_at": "2014-11-19T21:42:41.000Z",
+#     "commented_at": "2014-11-20T06:51:30.000Z",
+#     "paused_at": "2014-11-20T06:51:30.000Z",
+#     "hidden_at": "2016-08-20T06:51:30.000Z"
+#   },
+#   "episodes": {
+#     "watched_at": "2014-11-20T06:51:30.000Z",
+#     "collected_at": "2014-11-19T22:02:41.000Z",
+#     "rated_at": "2014-11-20T06:51:30.000Z",
+#     "watchlisted_at": "2014-11-20T06:51:30.000Z",
+#     "commented_at": "2014-11-20T06:51:30.000Z",
+#     "paused_at": "2014-11-20T06:51:30.000Z"
+#   },
+#   "shows": {
+#     "rated_at": "2014-11-19T19:50:58.000Z",
+#     "watchlisted_at": "2014-11-20T06:51:30.000Z",
+#     "favorited_at": "2014-11-20T06:51:30.000Z",
+#     "recommendations_at": "2014-11-20T06:51:30.000Z",
+#     "commented_at": "2014-11-20T06:51:30.000Z",
+#     "hidden_at": "2016-08-20T06:51:30.000Z"
+#   },
+#   "seasons": { ... },
+#   "comments": { ... },
+#   "lists": { ... },
+#   "watchlist": { ... },
+#   "favorites": { ... },
+#   "account": { ... },
+#   "saved_filters": { ... },
+#   "notes": { ... }
+# }
+
+SYNC_HISTORY_URL = f'{API_URL}/sync/history'
+
+# Response format (newest first, paginated with page and limit, filtered with start_at and end_at)
+# [
+#   {
+#     "id": 1982346,
+#     "watched_at": "2014-03-31T09:28:53.000Z",
+#     "action": "scrobble",
+#     "type": "episode",
+#     "episode": {
+#       "season": 2,
+#       "number": 1,
+#       "title": "Winter Is Coming",
+#       "ids": {
+#         "trakt": 73640,
+#         "tvdb": 3254641,
+#         "imdb": "tt1480055",
+#         "tmdb": 63056
+#       }
+#     },
+#     "show": {
+#       "title": "Game of Thrones",
+#       "year": 2011,
+#       "ids": {
+#         "trakt": 353,
+#         "slug": "game-of-thrones",
+#         "tvdb": 121361,
+#         "imdb": "tt0944947",
+#         "tmdb": 1399,
+#         "tvrage": 24493
+#       }
+#     }
+#   },
+#   {
+#     "id": 1982347,
+#     "watched_at": "2014-03-31T09:28:53.000Z",
+#     "action": "checkin",
+#     "type": "movie",
+#     "movie": {
+#       "title": "The Dark Knight",
+#       "year": 2008,
+#       "ids": {
+#         "trakt": 6,
+#         "slug": "the-dark-knight-2008",
+#         "imdb": "tt0468569",
+#         "tmdb": 155
+#       }
+#     }
+#   }
+# ]
+
+OAUTH_TOKEN_URL = f'{API_URL}/oauth/token'  # POST, exchanges an authorization code for an access token (scripts/trakt_get_access_token.py)
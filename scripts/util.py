@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Any, Dict, List, Sequence, Union
 
 from scripts.models.models_api import Movie, Show, WatchedMovie, WatchedShow, WatchlistMovie, WatchlistShow
 
@@ -47,4 +47,22 @@ def combine_unique_shows(in_progress_shows: List[WatchedShow], watchlist_shows:
         if show.ids.trakt not in unique_shows:  # Ensure no duplicates
             unique_shows[show.ids.trakt] = show
 
-    return list(unique_shows.values())
\ No newline at end of file
+    return list(unique_shows.values())
+
+def get_list_fields(watched: Sequence[Union[WatchedShow, WatchedMovie]] = (),
+                    watchlist: Sequence[Union[WatchlistShow, WatchlistMovie]] = ()) -> Dict[int, Dict[str, Any]]:
+    """
+    Collects the per-title fields of the watched and watchlist entries (plays, last_watched_at, listed_at)
+    for the rich export columns, keyed by the title's Trakt id.
+    """
+    list_fields: Dict[int, Dict[str, Any]] = {}
+
+    for watched_entry in watched:
+        title = watched_entry.show if isinstance(watched_entry, WatchedShow) else watched_entry.movie
+        list_fields.setdefault(title.ids.trakt, {}).update(plays=watched_entry.plays, last_watched_at=watched_entry.last_watched_at)
+
+    for watchlist_entry in watchlist:
+        title = watchlist_entry.show if isinstance(watchlist_entry, WatchlistShow) else watchlist_entry.movie
+        list_fields.setdefault(title.ids.trakt, {}).update(listed_at=watchlist_entry.listed_at)
+
+    return list_fields
@@ -0,0 +1,253 @@
+from contextlib import contextmanager
+from dataclasses import Field, fields
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Collection, Iterator, List, Optional, Sequence, Tuple, Union
+import csv
+import math
+import os
+import tempfile
+import typing
+
+Number = Union[int, float]
+
+# Rows per Parquet row group and Arrow record batch, only this many rows are held in Arrow memory at a time
+ROW_GROUP_SIZE = 10_000
+
+@contextmanager
+def atomic_path(filename: str) -> Iterator[str]:
+    """
+    Yields a temporary path next to filename and moves it into place once the block succeeds,
+    so readers never see a partially written file. The temporary file is removed on failure.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(filename)}.", suffix='.tmp')
+    os.close(file_descriptor)
+    try:
+        yield temp_path
+        os.replace(temp_path, filename)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def to_number(value: Any) -> Optional[Number]:
+    """
+    Converts a rating the way pandas.to_numeric(errors='coerce') does, returning None where pandas gives NaN.
+    """
+    if value is None or isinstance(value, bool):
+        return None if value is None else int(value)
+    if isinstance(value, (int, float)):
+        return None if isinstance(value, float) and math.isnan(value) else value
+    if isinstance(value, str):
+        for parse in (int, float):
+            try:
+                number = parse(value)
+            except ValueError:
+                continue
+            return None if isinstance(number, float) and math.isnan(number) else number
+    return None
+
+def coerce_ratings(values: List[Any]) -> List[Optional[Number]]:
+    """
+    Coerces a rating column to numbers. Like a pandas column, it stays integer only when every value
+    is an integer and none are missing, otherwise every value becomes a float.
+    """
+    numbers = [to_number(value) for value in values]
+    if all(isinstance(number, int) for number in numbers):
+        return numbers
+    return [None if number is None else float(number) for number in numbers]
+
+def format_value(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return '' if math.isnan(value) else repr(value)
+    return str(value)
+
+def export_fields(data: List[Any], groups: Collection[str] = ()) -> List[Field]:
+    """
+    Returns the dataclass fields of the rows to export. Fields in an optional column group (their group metadata,
+    e.g. rich) are left out unless the group is in groups.
+    """
+    return [field for field in fields(data[0]) if field.metadata.get('group') in (None, *groups)]
+
+def order_by_rating(ratings: Sequence[Optional[Number]]) -> List[int]:
+    """
+    Returns the row indexes sorted by rating, largest first and missing last. Rows with equal ratings keep their order.
+    """
+    rated = sorted((index for index, rating in enumerate(ratings) if rating is not None), key=lambda index: ratings[index], reverse=True)
+    return rated + [index for index, rating in enumerate(ratings) if rating is None]
+
+def write_csv(data: List[Any], filename: str, groups: Collection[str] = ()):
+    """
+    Writes dataclass rows to a CSV with the standard library, sorted by rating (largest first, missing last)
+    when there is a rating column. The output is byte-identical to write_csv_pandas.
+    """
+    columns = [field.name for field in export_fields(data, groups)]
+    rows = [[getattr(item, column) for column in columns] for item in data]
+
+    if 'rating' in columns:
+        rating_index = columns.index('rating')
+        ratings = coerce_ratings([row[rating_index] for row in rows])
+        for row, rating in zip(rows, ratings):
+            row[rating_index] = rating
+
+        rows = [rows[index] for index in order_by_rating(ratings)]
+
+    with atomic_path(filename) as temp_path:
+        with open(temp_path, 'w', newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file, lineterminator=os.linesep)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow([format_value(value) for value in row])
+
+def write_csv_pandas(data: List[Any], filename: str, groups: Collection[str] = ()):
+    """
+    The original pandas based CSV writer, kept for comparison and as a fallback.
+    """
+    import pandas as pd
+
+    # Convert list of dataclass objects to list of dictionaries
+    columns = [field.name for field in export_fields(data, groups)]
+    data_dicts = [{column: getattr(item, column) for column in columns} for item in data]
+
+    # Create a DataFrame from the list of dictionaries
+    df = pd.DataFrame(data_dicts, columns=columns)
+
+    # Integer columns with missing values (votes) would be written as floats, the nullable Int64 dtype keeps them integers
+    for field in export_fields(data, groups):
+        if annotation_type(field) is int:
+            df[field.name] = df[field.name].astype('Int64')
+
+    # Check if 'rating' column exists and sort by it if it does
+    if 'rating' in df.columns:
+        # Convert the 'rating' column to numeric (float) if it's not already
+        df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
+
+        # Sort the DataFrame by the 'rating' column in descending order (largest to smallest),
+        # a stable sort keeps rows with equal ratings in their original order
+        df = df.sort_values(by='rating', ascending=False, kind='stable')
+
+    # Save the DataFrame to CSV with headers based on field names
+    with atomic_path(filename) as temp_path:
+        df.to_csv(temp_path, index=False)
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError("The parquet and arrow export formats need pyarrow, install it with: pip install pyarrow") from None
+    return pyarrow
+
+def annotation_type(field: Field) -> Any:
+    """
+    Returns the type annotation of a dataclass field without Optional.
+    """
+    annotation = field.type
+    if typing.get_origin(annotation) is Union:
+        annotation = next(argument for argument in typing.get_args(annotation) if argument is not type(None))
+    return annotation
+
+def column_type(field: Field) -> Any:
+    """
+    Returns the Python type of a column: the field's columnar_type metadata, or its annotation without Optional.
+    """
+    if 'columnar_type' in field.metadata:
+        return field.metadata['columnar_type']
+    return annotation_type(field)
+
+def to_int(value: Any) -> Optional[int]:
+    number = to_number(value)
+    return None if number is None or isinstance(number, float) and not number.is_integer() else int(number)
+
+def to_float(value: Any) -> Optional[float]:
+    number = to_number(value)
+    return None if number is None else float(number)
+
+def to_timestamp(value: Any) -> Optional[datetime]:
+    """
+    Parses an ISO 8601 timestamp as returned by Trakt (2014-10-11T17:00:54.000Z), None when it cannot be parsed.
+    """
+    if not value:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None else timestamp.astimezone(timezone.utc)
+
+def to_date(value: Any) -> Optional[date]:
+    """
+    Parses an ISO 8601 date (2024-05-01), None when it cannot be parsed.
+    """
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+def to_str(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+def arrow_column(field: Field) -> Tuple[Any, Callable[[Any], Any]]:
+    """
+    Returns the Arrow type of a column and the function converting its values. Every column is nullable.
+    """
+    pa = import_pyarrow()
+    kind = column_type(field)
+    if kind is int:
+        return pa.int64(), to_int
+    if kind is float:
+        return pa.float64(), to_float
+    if kind is bool:
+        return pa.bool_(), lambda value: None if value is None else bool(value)
+    if kind == 'timestamp':
+        return pa.timestamp('ms', tz='UTC'), to_timestamp
+    if kind == 'date':
+        return pa.date32(), to_date
+    return pa.string(), to_str
+
+def iter_arrow_batches(data: List[Any], groups: Collection[str], row_group_size: int) -> Iterator[Any]:
+    """
+    Yields the rows as Arrow record batches of at most row_group_size rows, sorted like the CSV (by rating,
+    largest first and missing last). Only one batch is converted at a time.
+    """
+    pa = import_pyarrow()
+    export = export_fields(data, groups)
+    columns = [(field.name,) + arrow_column(field) for field in export]
+    schema = pa.schema([pa.field(name, arrow_type, nullable=True) for name, arrow_type, _ in columns])
+
+    order: Sequence[int] = range(len(data))
+    if any(field.name == 'rating' for field in export):
+        order = order_by_rating([to_float(item.rating) for item in data])
+
+    for start in range(0, len(order), max(1, row_group_size)):
+        rows = [data[index] for index in order[start:start + row_group_size]]
+        yield pa.record_batch([pa.array([convert(getattr(row, name)) for row in rows], type=arrow_type) for name, arrow_type, convert in columns], schema=schema)
+
+def write_columnar(data: List[Any], filename: str, open_writer: Callable[[str, Any], Any], groups: Collection[str], row_group_size: int):
+    batches = iter_arrow_batches(data, groups, row_group_size)
+    with atomic_path(filename) as temp_path:
+        first = next(batches)
+        with open_writer(temp_path, first.schema) as writer:
+            writer.write_batch(first)
+            for batch in batches:
+                writer.write_batch(batch)
+
+def write_parquet(data: List[Any], filename: str, groups: Collection[str] = (), row_group_size: int = ROW_GROUP_SIZE):
+    """
+    Writes dataclass rows to a Parquet file with typed, nullable columns, one row group per row_group_size rows.
+    """
+    import_pyarrow()
+    import pyarrow.parquet as pq
+
+    write_columnar(data, filename, lambda path, schema: pq.ParquetWriter(path, schema, compression='zstd'), groups, row_group_size)
+
+def write_arrow(data: List[Any], filename: str, groups: Collection[str] = (), row_group_size: int = ROW_GROUP_SIZE):
+    """
+    Writes dataclass rows to an Arrow IPC file (Feather v2) with typed, nullable columns, one record batch per row_group_size rows.
+    """
+    pa = import_pyarrow()
+
+    write_columnar(data, filename, lambda path, schema: pa.ipc.new_file(path, schema), groups, row_group_size)